@@ -0,0 +1,59 @@
+"""
+Expression depth and XML emit time of long `or` / `+` chains, lowered
+left-deep (the default) and balanced (`Options.balance_chains`).
+
+    python -m benchmarks.bench_balance [--operands N ...]
+"""
+
+import argparse
+import io
+import time
+import vizzyscript as vz
+from vizzyscript import ir
+from vizzyscript import matchers as m
+import ast
+
+
+def program(n: int) -> str:
+    terms = [f"VAR.x < {i}" for i in range(n)]
+    return "\n".join(
+        [
+            "class VAR:",
+            "    x: float",
+            "    total: float",
+            "def check():",
+            f"    if {' or '.join(terms)}:",
+            f"        VAR.total = {' + '.join(f'VAR.x * {i}' for i in range(n))}",
+            'c = DatalessChannel("c")',
+            "c.receive(check)",
+        ]
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--operands", type=int, nargs="+", default=[100, 500, 900])
+    args = parser.parse_args()
+
+    for n in args.operands:
+        src = program(n)
+        [stmt] = ast.parse(src).body[1].body
+        for balanced in (False, True):
+            p = vz.Parser("bench", src, vz.Options(balance_chains=balanced))
+            thread = ir.ReceiveMessage("c", [m.match_statement(stmt)])
+            test_depth = ir.depth(p.optimise(thread).body[0].test)
+
+            start = time.perf_counter()
+            out = io.BytesIO()
+            p.write(out)
+            elapsed = time.perf_counter() - start
+
+            label = "balanced" if balanced else "left-deep"
+            print(
+                f"{n:>5} operands {label:>9}: depth {test_depth:>4}, "
+                f"emit {elapsed * 1e3:7.2f} ms, {len(out.getvalue()):>9,} bytes"
+            )
+
+
+if __name__ == "__main__":
+    main()
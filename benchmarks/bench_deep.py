@@ -0,0 +1,65 @@
+"""
+Stress test expression lowering on very deep, machine-generated expressions:
+an unrolled sum and a Horner-form polynomial, each well past the recursion
+limit.
+
+    python -m benchmarks.bench_deep [--nodes N]
+"""
+
+import argparse
+import ast
+import sys
+import time
+from vizzyscript import ir
+from vizzyscript import matchers as m
+from vizzyscript.ir.lower import lower_expr
+from .bench_dispatch import legacy_match_expr
+
+
+def unrolled_sum(n_nodes: int) -> ast.expr:
+    """VAR.x0 + VAR.x1 + ... as a left-deep tree of `n_nodes` BinOps"""
+    expr: ast.expr = ast.Attribute(ast.Name("VAR"), "x0")
+    for i in range(1, n_nodes + 1):
+        expr = ast.BinOp(expr, ast.Add(), ast.Attribute(ast.Name("VAR"), f"x{i}"))
+    return expr
+
+
+def polynomial(n_nodes: int) -> ast.expr:
+    """(((c0 * t + c1) * t + c2) * t ...) with `n_nodes` BinOps"""
+    expr: ast.expr = ast.Constant(1.5)
+    for i in range(n_nodes // 2):
+        expr = ast.BinOp(expr, ast.Mult(), ast.Name("t"))
+        expr = ast.BinOp(expr, ast.Add(), ast.Constant(i % 7 - 3))
+    return expr
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--nodes", type=int, default=100_000)
+    args = parser.parse_args()
+
+    for name, build in [("unrolled sum", unrolled_sum), ("polynomial", polynomial)]:
+        expr = build(args.nodes)
+
+        start = time.perf_counter()
+        root = m.match_expr(expr)
+        matched = time.perf_counter()
+        lower_expr(root)
+        lowered = time.perf_counter()
+
+        n = sum(1 for _ in ir.walk(root))
+        elapsed = lowered - start
+        print(f"{name:>13}: {n:,} nodes in {elapsed * 1e3:.1f} ms", end="")
+        print(f" ({n / elapsed:,.0f} nodes/s, ", end="")
+        print(f"{(lowered - matched) / elapsed:.0%} in lowering to XML)")
+
+        try:
+            legacy_match_expr(expr)
+            print(f"{'':>13}  recursive lowering also succeeded")
+        except RecursionError:
+            limit = sys.getrecursionlimit()
+            print(f"{'':>13}  recursive lowering: RecursionError (limit {limit})")
+
+
+if __name__ == "__main__":
+    main()
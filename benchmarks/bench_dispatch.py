@@ -0,0 +1,113 @@
+"""
+Compare the type-keyed matcher registry with the sequential structural
+pattern match it replaced, on large random expression trees.
+
+    python -m benchmarks.bench_dispatch [--nodes N] [--repeat R]
+"""
+
+import argparse
+import ast
+import random
+import timeit
+from vizzyscript import matchers as m
+from vizzyscript.xml_gen import (
+    ActivationGroup,
+    BinaryOp,
+    BoolOp,
+    Comparison,
+    Constant,
+    Element,
+    Not,
+    Variable,
+    Vector,
+)
+
+
+def legacy_match_expr(expr: ast.expr) -> Element:
+    """The pre-registry `match_expr`, kept here as the benchmark baseline"""
+    match expr:
+        case ast.Attribute(value=ast.Name(id="VAR"), attr=name):
+            return Variable(name)
+        case ast.Name(id=ag) if ag in m.FIXED_AGS:
+            return ActivationGroup.fixed(int(ag.lstrip("AG")))
+        case ast.Name(id=name):
+            return Variable(name, is_local=True)
+        case ast.Call(func=ast.Name(id="AG"), args=[n]):
+            return ActivationGroup(legacy_match_expr(n))
+        case ast.Call(func=ast.Name(id="Vec"), args=[x, y, z]):
+            return Vector(*map(legacy_match_expr, (x, y, z)))
+        case ast.Constant(value=bool() as val):
+            return Constant.from_bool(val)
+        case ast.Constant(value=int() | float() as val):
+            return Constant.from_number(val)
+        case ast.Constant(value=str() as val):
+            return Constant.from_text(val)
+        case ast.BinOp(left=left, op=op, right=right):
+            operands = (legacy_match_expr(left), legacy_match_expr(right))
+            match op:
+                case ast.Add():
+                    return BinaryOp.add(*operands)
+                case ast.Sub():
+                    return BinaryOp.sub(*operands)
+                case ast.Mult():
+                    return BinaryOp.mul(*operands)
+                case ast.Div():
+                    return BinaryOp.div(*operands)
+                case ast.Mod():
+                    return BinaryOp.mod(*operands)
+        case ast.Compare(left=left, ops=[ast.Lt()], comparators=[right]):
+            return Comparison.lt(legacy_match_expr(left), legacy_match_expr(right))
+        case ast.BoolOp(op=ast.And(), values=[left, right]):
+            return BoolOp.and_(legacy_match_expr(left), legacy_match_expr(right))
+        case ast.UnaryOp(op=ast.Not(), operand=operand):
+            return Not(legacy_match_expr(operand))
+    raise SyntaxError(ast.dump(expr))
+
+
+def random_expr(rng: random.Random, n_nodes: int) -> ast.expr:
+    """A roughly balanced random expression tree with `n_nodes` operators"""
+    if n_nodes <= 0:
+        match rng.randrange(3):
+            case 0:
+                return ast.Attribute(ast.Name("VAR"), f"v{rng.randrange(50)}")
+            case 1:
+                return ast.Name(f"local{rng.randrange(50)}")
+            case _:
+                return ast.Constant(rng.randrange(1000))
+
+    left = rng.randrange(n_nodes)
+    lhs = random_expr(rng, left)
+    rhs = random_expr(rng, n_nodes - left - 1)
+    match rng.randrange(4):
+        case 0:
+            return ast.Compare(lhs, [ast.Lt()], [rhs])
+        case 1:
+            return ast.BoolOp(ast.And(), [lhs, rhs])
+        case _:
+            return ast.BinOp(lhs, rng.choice([ast.Add(), ast.Mult()]), rhs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--nodes", type=int, default=20_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    expr = random_expr(random.Random(args.seed), args.nodes)
+
+    results = {}
+    for name, fn in [
+        ("sequential match", legacy_match_expr),
+        ("registry", m.match_expr),
+    ]:
+        best = min(timeit.repeat(lambda: fn(expr), number=1, repeat=args.repeat))
+        results[name] = best
+        print(f"{name:>18}: {best * 1e3:8.2f} ms ({args.nodes / best:,.0f} nodes/s)")
+
+    speedup = results["sequential match"] / results["registry"]
+    print(f"{'speedup':>18}: {speedup:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+"""
+Compare the memory held by a lowered expression as Vizzy IR and as the
+equivalent `xml_gen` element tree.
+
+    python -m benchmarks.bench_ir_memory [--nodes N]
+"""
+
+import argparse
+import random
+import tracemalloc
+from vizzyscript import matchers as m
+from vizzyscript.ir.lower import lower_expr
+from .bench_dispatch import random_expr
+
+
+def measure(build):
+    tracemalloc.start()
+    result = build()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--nodes", type=int, default=50_000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    expr = random_expr(random.Random(args.seed), args.nodes)
+    root, ir_size = measure(lambda: m.match_expr(expr))
+    _, xml_size = measure(lambda: lower_expr(root))
+
+    print(f"{'IR':>8}: {ir_size / 2**20:8.2f} MiB")
+    print(f"{'xml_gen':>8}: {xml_size / 2**20:8.2f} MiB")
+    print(f"{'ratio':>8}: {xml_size / ir_size:8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
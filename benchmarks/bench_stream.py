@@ -0,0 +1,77 @@
+"""
+Peak memory of emitting a program with many `ReceiveMessage` threads, using
+`Parser.write` versus building the whole tree and calling `ET.tostring`.
+Memory held by the parsed source itself is excluded.
+
+    python -m benchmarks.bench_stream [--threads N ...]
+"""
+
+import argparse
+import io
+import time
+import tracemalloc
+import xml.etree.ElementTree as ET
+import vizzyscript as vz
+
+
+def many_handlers(n: int) -> str:
+    lines = ["class VAR:", "    x: float", "", 'tick = DatalessChannel("tick")']
+    for i in range(n):
+        lines += [
+            f"def handler{i}():",
+            f"    if VAR.x < {i}:",
+            f"        VAR.x = VAR.x * 2 + {i}",
+            f"tick.receive(handler{i})",
+        ]
+    return "\n".join(lines)
+
+
+def tree_then_tostring(p: vz.Parser):
+    p.generate()
+    ET.indent(p.root)
+    io.BytesIO().write(ET.tostring(p.root, encoding="utf-8", xml_declaration=True))
+
+
+class NullIO(io.RawIOBase):
+    def write(self, b):
+        return len(b)
+
+
+def streamed(p: vz.Parser):
+    p.write(NullIO())
+
+
+def measure(fn, src: str) -> tuple[float, int]:
+    """Time and peak memory of emitting, on top of the parsed program"""
+    tracemalloc.start()
+    p = vz.Parser("bench", src)
+    base, _ = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+
+    start = time.perf_counter()
+    fn(p)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak - base
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--threads", type=int, nargs="+", default=[100, 1000, 10000])
+    args = parser.parse_args()
+
+    for n in args.threads:
+        src = many_handlers(n)
+        for name, fn in [
+            ("tree + tostring", tree_then_tostring),
+            ("stream", streamed),
+        ]:
+            elapsed, peak = measure(fn, src)
+            print(
+                f"{n:>7} threads  {name:>16}: {elapsed:7.3f} s, peak {peak / 2**20:7.2f} MiB"
+            )
+
+
+if __name__ == "__main__":
+    main()
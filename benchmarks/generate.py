@@ -0,0 +1,122 @@
+"""
+Seeded generator of synthetic VizzyScript programs.
+
+    python -m benchmarks.generate --handlers 50 --statements 20 --seed 1
+"""
+
+import argparse
+import random
+from dataclasses import dataclass, field, fields
+
+ARITHMETIC = ["+", "-", "*", "/", "%"]
+COMPARISONS = ["==", "<", ">", "<=", ">="]
+
+
+@dataclass
+class Shape:
+    channels: int = 4
+    handlers: int = 16
+    fields: int = 8
+    # statements per handler, counting those nested in `if`
+    statements: int = 10
+    depth: int = 4
+    # relative frequency of each statement kind
+    mix: dict[str, float] = field(
+        default_factory=lambda: {"assign": 4, "aug_assign": 2, "if": 2, "ag_set": 1}
+    )
+
+
+class Generator:
+    def __init__(self, shape: Shape, seed: int) -> None:
+        self.shape = shape
+        self.rng = random.Random(seed)
+        self.kinds = list(shape.mix)
+        self.weights = [shape.mix[k] for k in self.kinds]
+
+    def field(self) -> str:
+        return f"VAR.f{self.rng.randrange(self.shape.fields)}"
+
+    def leaf(self) -> str:
+        if self.rng.random() < 0.6:
+            return self.field()
+        return str(self.rng.randint(1, 100))
+
+    def expr(self, depth: int) -> str:
+        if depth <= 1 or self.rng.random() < 0.15:
+            return self.leaf()
+        op = self.rng.choice(ARITHMETIC)
+        return f"({self.expr(depth - 1)} {op} {self.expr(depth - 1)})"
+
+    def test(self) -> str:
+        if self.rng.random() < 0.2:
+            return f"AG{self.rng.randint(1, 10)}"
+        op = self.rng.choice(COMPARISONS)
+        depth = max(1, self.shape.depth - 1)
+        return f"{self.expr(depth)} {op} {self.expr(depth)}"
+
+    def statements(self, n: int, indent: str) -> list[str]:
+        lines = []
+        while n > 0:
+            kind = self.rng.choices(self.kinds, self.weights)[0]
+            n -= 1
+            if kind == "if" and n == 0:
+                # no statements left for its body
+                kind = "assign"
+            match kind:
+                case "assign":
+                    lines.append(
+                        f"{indent}{self.field()} = {self.expr(self.shape.depth)}"
+                    )
+                case "aug_assign":
+                    op = self.rng.choice(ARITHMETIC)
+                    expr = self.expr(self.shape.depth - 1)
+                    lines.append(f"{indent}{self.field()} {op}= {expr}")
+                case "ag_set":
+                    on = self.rng.choice(["True", "False"])
+                    lines.append(f"{indent}AG.set({self.rng.randint(1, 10)}, {on})")
+                case "if":
+                    inner = min(n, self.rng.randint(1, 3))
+                    n -= inner
+                    lines.append(f"{indent}if {self.test()}:")
+                    lines += self.statements(inner, indent + "    ")
+        return lines
+
+    def program(self) -> str:
+        shape = self.shape
+        lines = ["from vizzy_api import *", "", "", "class VAR:"]
+        lines += [f"    f{i}: float" for i in range(shape.fields)]
+        lines.append("")
+        for c in range(shape.channels):
+            lines.append(f'channel{c} = DatalessChannel("message{c}")')
+
+        for h in range(shape.handlers):
+            lines += ["", "", f"def handler{h}():"]
+            lines += self.statements(shape.statements, "    ")
+
+        lines.append("")
+        for h in range(shape.handlers):
+            lines.append(f"channel{h % shape.channels}.receive(handler{h})")
+        return "\n".join(lines) + "\n"
+
+
+def generate(shape: Shape, seed: int = 0) -> str:
+    """A program of the given shape, identical for the same seed"""
+    return Generator(shape, seed).program()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    for f in fields(Shape):
+        if f.type is int:
+            parser.add_argument(f"--{f.name}", type=int, default=f.default)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    shape = Shape(
+        **{f.name: getattr(args, f.name) for f in fields(Shape) if f.type is int}
+    )
+    print(generate(shape, args.seed), end="")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+Compile generated programs of increasing size and compare parse, lower and
+emit throughput and peak memory with the stored baseline.
+
+    python -m benchmarks.suite            # compare with baseline.json
+    python -m benchmarks.suite --save     # record a new baseline
+
+Throughputs are compared relative to the speed of a fixed pure-Python
+workload measured in the same run, so a baseline recorded on one machine
+still applies on a faster or slower one. Exits with status 1 if any
+relative throughput falls below `1 / TOLERANCE` of the baseline or any peak
+memory grows past `TOLERANCE` times it.
+"""
+
+import argparse
+import ast
+import json
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+import vizzyscript as vz
+from .generate import Shape, generate
+from .bench_stream import NullIO
+
+BASELINE = Path(__file__).with_name("baseline.json")
+TOLERANCE = 1.25
+REPEATS = 5
+
+SHAPES = {
+    "small": Shape(channels=2, handlers=8, fields=4, statements=8, depth=3),
+    "medium": Shape(channels=8, handlers=64, fields=16, statements=16, depth=5),
+    "large": Shape(channels=16, handlers=128, fields=32, statements=16, depth=6),
+    "deep": Shape(channels=1, handlers=8, fields=8, statements=8, depth=10),
+}
+
+
+def reference_rate() -> float:
+    """
+    AST nodes per second visited by `ast.NodeVisitor` over a fixed program,
+    the best of `REPEATS` runs: the interpreter speed the compiler's own
+    throughput is divided by
+    """
+    tree = ast.parse(generate(SHAPES["medium"], seed=1))
+    nodes = sum(1 for _ in ast.walk(tree))
+    best = float("inf")
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        ast.NodeVisitor().visit(tree)
+        best = min(best, time.perf_counter() - start)
+    return nodes / best
+
+
+def compile_once(src: str) -> vz.Stats:
+    stats = vz.Stats()
+    vz.Parser("bench", src, stats=stats).write(NullIO())
+    return stats
+
+
+def peak_memory(src: str) -> int:
+    tracemalloc.start()
+    compile_once(src)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def run(name: str, shape: Shape, reference: float) -> dict:
+    src = generate(shape, seed=0)
+    # best of several runs, as the least disturbed by the rest of the system
+    best = min(
+        (compile_once(src) for _ in range(REPEATS)), key=lambda s: s.phases.total()
+    )
+    nodes = best.elements.total()
+    parse = best.phases["parse"] + best.phases["remove_global"]
+    lower = best.phases["match"] + best.phases["optimise"] + best.phases["lower"]
+
+    result = {
+        "source_bytes": len(src.encode()),
+        "nodes": nodes,
+        "parse_bytes_per_s": len(src.encode()) / parse,
+        "lower_nodes_per_s": nodes / lower,
+        "emit_nodes_per_s": nodes / best.phases["emit"],
+        "peak_bytes": peak_memory(src),
+    }
+    for key in ("parse_bytes_per_s", "lower_nodes_per_s", "emit_nodes_per_s"):
+        result[key.replace("_per_s", "_relative")] = result[key] / reference
+    return result
+
+
+def regressions(name: str, result: dict, baseline: dict) -> list[str]:
+    found = []
+    for key, value in result.items():
+        old = baseline.get(key)
+        if old is None:
+            continue
+        # absolute throughputs depend on the machine, so are not compared
+        if key.endswith("_relative") and value * TOLERANCE < old:
+            found.append(f"{name}: {key} {value:.4f} < {old:.4f}")
+        elif key == "peak_bytes" and value > old * TOLERANCE:
+            found.append(f"{name}: {key} {value:,} > {old:,}")
+    return found
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--save", action="store_true", help="overwrite the baseline")
+    parser.add_argument("shapes", nargs="*", help=f"any of {', '.join(SHAPES)}")
+    args = parser.parse_args(argv)
+    unknown = set(args.shapes) - SHAPES.keys()
+    if unknown:
+        parser.error(f"unknown shapes: {', '.join(sorted(unknown))}")
+
+    baseline = json.loads(BASELINE.read_text()) if BASELINE.exists() else {}
+    results = {}
+    failures = []
+    reference = reference_rate()
+    print(f"reference: {reference:,.0f} AST nodes/s")
+    for name in args.shapes or SHAPES:
+        result = results[name] = run(name, SHAPES[name], reference)
+        print(
+            f"{name:>8}: {result['nodes']:>8,} nodes  "
+            f"parse {result['parse_bytes_per_s'] / 2**20:7.2f} MiB/s  "
+            f"lower {result['lower_nodes_per_s']:>10,.0f} nodes/s  "
+            f"emit {result['emit_nodes_per_s']:>10,.0f} nodes/s  "
+            f"peak {result['peak_bytes'] / 2**20:7.2f} MiB"
+        )
+        failures += regressions(name, result, baseline.get(name, {}))
+
+    if args.save:
+        BASELINE.write_text(json.dumps({**baseline, **results}, indent=2) + "\n")
+        return 0
+
+    for failure in failures:
+        print(f"regression: {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
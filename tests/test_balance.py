@@ -0,0 +1,32 @@
+import ast
+from collections import Counter
+from vizzyscript import ir
+from vizzyscript import matchers as m
+from vizzyscript import xml_gen as gen
+from vizzyscript.passes import balance_thread
+
+
+def test_balance_associative_chains():
+    src = "VAR.x = a + b + c + d + e - (f * g * h * i)"
+    thread = ir.ReceiveMessage("msg", [m.match_statement(ast.parse(src).body[0])])
+    report: Counter[str] = Counter()
+    [stmt] = balance_thread(thread, report).body
+
+    a, b, c, d, e, f, g, h, i = (ir.Variable(n, is_local=True) for n in "abcdefghi")
+    add, mul = ir.BinaryOp.add, ir.BinaryOp.mul
+    assert stmt.expr == ir.BinaryOp.sub(
+        add(add(add(a, b), add(c, d)), e), mul(mul(f, g), mul(h, i))
+    )
+    assert report["balance.chains"] == 2
+    assert ir.depth(stmt.expr) == 5
+
+
+def test_xml_gen_reduce():
+    operands = [gen.Constant.from_number(n) for n in range(5)]
+    left_deep = gen.BoolOp.reduce("or_", operands)
+    balanced = gen.BoolOp.reduce("or_", operands, balanced=True)
+    assert [c.get("number") for c in left_deep.iter("Constant")] == list("01234")
+    assert [c.get("number") for c in balanced.iter("Constant")] == list("01234")
+    assert left_deep[0][0][0].get("style") == "op-or"
+    assert balanced[0].get("style") == balanced[0][0].get("style") == "op-or"
+    assert balanced[1].tag == "Constant"
@@ -0,0 +1,78 @@
+import io
+import vizzyscript as vz
+
+SRC = """
+class VAR:
+    x: float
+
+def first():
+    VAR.x = VAR.x + 1
+
+def second():
+    VAR.x = VAR.x * 2
+
+c = DatalessChannel("c")
+c.receive(first)
+c.receive(second)
+"""
+
+
+def compile(src: str, cache: vz.CompilationCache) -> tuple[bytes, vz.Parser]:
+    p = vz.Parser("cached", src, cache=cache)
+    out = io.BytesIO()
+    p.write(out)
+    return out.getvalue(), p
+
+
+def test_cache_rebuilds_changed_threads_only(tmp_path):
+    cache = vz.CompilationCache(tmp_path)
+    cold, _ = compile(SRC, cache)
+    warm, p = compile(SRC, cache)
+
+    assert warm == cold
+    assert (cache.hits, cache.misses) == (2, 2)
+    assert p.report["cache.hits"] == 2
+
+    _, p = compile(SRC.replace("* 2", "* 3"), cache)
+    assert (p.report["cache.hits"], p.report["cache.misses"]) == (1, 1)
+
+    # the symbol context is part of the key
+    _, p = compile(SRC.replace("x: float", "x: float\n    y: float"), cache)
+    assert p.report["cache.misses"] == 2
+
+
+def test_cache_hits_report_the_same_optimisations(tmp_path):
+    options = vz.Options(fold_constants=True, cse=True)
+    src = SRC.replace("* 2", "* (1 + 1) + VAR.x * (1 + 1)")
+    reports = []
+    for _ in range(2):
+        p = vz.Parser("cached", src, options, cache=vz.CompilationCache(tmp_path))
+        p.write(io.BytesIO())
+        reports.append({k: v for k, v in p.report.items() if "cache" not in k})
+    assert reports[0] == reports[1] and reports[0]["fold.nodes_removed"] > 0
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    cache = vz.CompilationCache(tmp_path, max_bytes=10)
+    for key in "abc":
+        cache.put(key, b"12345")
+    assert list(cache.entries) == ["b", "c"]
+    assert cache.get("a") is None
+
+    cache.get("b")
+    cache.put("d", b"12345")
+    assert sorted(p.stem for p in tmp_path.iterdir()) == ["b", "d"]
+    assert vz.CompilationCache(tmp_path).size == 10
+
+
+def test_caches_sharing_a_directory_stay_bounded(tmp_path):
+    a = vz.CompilationCache(tmp_path, max_bytes=1000)
+    b = vz.CompilationCache(tmp_path, max_bytes=1000)
+    for i in range(30):
+        # each reads the entries the other writes
+        a.put(f"a{i}", bytes(100))
+        b.get(f"a{i}")
+        b.put(f"b{i}", bytes(100))
+        a.get(f"b{i}")
+    assert sum(p.stat().st_size for p in tmp_path.iterdir()) <= 1000
+    assert 0 <= a.size <= 1000 and 0 <= b.size <= 1000
@@ -0,0 +1,55 @@
+import inspect
+from pathlib import Path
+import vizzyscript as vz
+import vizzyscript.__main__ as cli
+from vizzyscript.__main__ import main
+from . import program
+
+
+def test_compile_directory(tmp_path: Path, capsys):
+    src = tmp_path / "src"
+    (src / "nested").mkdir(parents=True)
+    (src / "a.py").write_text(inspect.getsource(program))
+    (src / "nested" / "b.py").write_text(inspect.getsource(program))
+    (src / "broken.py").write_text("def f(:\n")
+    (src / "deep.py").write_text("x = " + "-" * 100_000 + "1\n")
+
+    out = tmp_path / "out"
+    assert main([str(src), "-o", str(out), "-j", "2", "--fold-constants"]) == 1
+
+    a, b = (out / "a.xml").read_bytes(), (out / "nested" / "b.xml").read_bytes()
+    assert a.replace(b'name="a"', b'name="b"') == b
+    assert b'<Constant vector="(1, 2, 3)" />' in a
+
+    assert not (out / "broken.xml").exists()
+    out, err = capsys.readouterr()
+    assert "broken.py: SyntaxError" in err
+    assert "deep.py: MemoryError" in err
+    assert "compiled 2/4 files" in out
+
+
+def test_cache_is_opened_once_per_process(tmp_path: Path, monkeypatch):
+    for name in "abc":
+        (tmp_path / f"{name}.py").write_text(inspect.getsource(program))
+    opened = []
+
+    class Cache(vz.CompilationCache):
+        def __init__(self, path):
+            opened.append(path)
+            super().__init__(path)
+
+    monkeypatch.setattr(cli, "CompilationCache", Cache)
+    cache = tmp_path / "cache"
+    argv = [
+        str(tmp_path),
+        "-o",
+        str(tmp_path / "out"),
+        "-j",
+        "1",
+        "--cache",
+        str(cache),
+    ]
+    # every job, and every build in the same process, shares one cache
+    assert main(argv) == 0
+    assert main(argv) == 0
+    assert opened == [cache]
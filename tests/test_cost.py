@@ -0,0 +1,74 @@
+import io
+import pytest
+import vizzyscript as vz
+from vizzyscript.cost import BudgetExceeded
+
+SRC = """
+class VAR:
+    x: float
+
+def heavy():
+    VAR.x = VAR.x + 1
+    if VAR.x > 3:
+        VAR.x = VAR.x * 2 + 1
+
+def light():
+    AG1 = True
+
+c = DatalessChannel("c")
+c.receive(heavy)
+c.receive(light)
+"""
+
+
+def test_costs_per_thread_and_trigger():
+    p = vz.Parser("cost", SRC)
+    p.write(io.BytesIO())
+
+    # 4 for the first statement, 3 for the test, 5 for the body
+    heavy = p.costs.threads["c"]["heavy"]
+    assert (heavy.worst, heavy.typical) == (12, 9.5)
+    assert p.costs.trigger("c").worst == 13
+
+
+def test_budget_fails_compilation():
+    p = vz.Parser("cost", SRC, vz.Options(cost_budget=12))
+    with pytest.raises(BudgetExceeded, match="up to 13 instructions"):
+        p.write(io.BytesIO())
+
+
+HELPER = """
+class VAR:
+    x: float
+
+def big():
+{body}
+
+def h():
+    big()
+    big()
+
+c = DatalessChannel("c")
+c.receive(h)
+"""
+
+
+def test_custom_instructions_are_charged_per_call():
+    src = HELPER.format(body="    VAR.x = VAR.x + 1\n" * 50)
+    p = vz.Parser("cost", src, vz.Options(inline_threshold=8))
+    p.write(io.BytesIO())
+    # 4 for each assignment in the body, and 1 for each call
+    assert p.costs.call("big").worst == 200
+    assert p.costs.trigger("c").worst == 2 * (1 + 200)
+
+    p = vz.Parser("cost", src, vz.Options(inline_threshold=8, cost_budget=20))
+    with pytest.raises(BudgetExceeded):
+        p.write(io.BytesIO())
+
+
+def test_recursive_custom_instructions_are_bounded():
+    src = HELPER.format(body="    VAR.x = VAR.x + 1\n    if VAR.x < 5:\n        big()")
+    p = vz.Parser("cost", src)
+    p.write(io.BytesIO())
+    # 4 for the assignment, 3 for the test and 1 for the recursive call
+    assert p.costs.call("big").worst == 10 * 8
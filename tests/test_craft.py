@@ -0,0 +1,82 @@
+import xml.etree.ElementTree as ET
+import pytest
+from vizzyscript import craft
+
+SRC = """
+class VAR:
+    x: float
+
+def h():
+    VAR.x = 1
+
+c = DatalessChannel("c")
+c.receive(h)
+"""
+
+CRAFT = """<?xml version="1.0" encoding="utf-8"?>
+<Craft name="Test">
+  <Assembly>
+    <Parts>
+      <Part id="0" partType="CommandPod1" />
+      <Part id="1" partType="FlightComputer">
+        <FlightProgram>
+          <Program name="Old">
+            <Variables />
+          </Program>
+        </FlightProgram>
+      </Part>
+      <Part id="2" partType="FlightComputer">
+        <FlightProgram>
+          <Program name="Other" />
+        </FlightProgram>
+      </Part>
+    </Parts>
+  </Assembly>
+</Craft>
+"""
+
+
+def test_inject_keeps_the_rest_of_the_craft(tmp_path):
+    path = tmp_path / "craft.xml"
+    path.write_text(CRAFT)
+    program = craft.compile_program("New", SRC)
+
+    start, end = craft.program_span(CRAFT.encode(), "1")
+    assert craft.inject(path, program, "1") == end - start
+
+    data = path.read_bytes()
+    assert data[:start] == CRAFT.encode()[:start]
+    assert data.endswith(CRAFT.encode()[end:])
+    parts = ET.fromstring(data).find("Assembly/Parts")
+    assert parts[1].find("FlightProgram/Program").get("name") == "New"
+    assert parts[2].find("FlightProgram/Program").get("name") == "Other"
+    # indented to the depth of the element it replaced
+    assert b"\n            <Variables>" in data
+
+
+def test_inject_all_reports_failures(tmp_path):
+    for name in ("a", "b"):
+        (tmp_path / f"{name}.xml").write_text(CRAFT)
+    (tmp_path / "c.xml").write_text("<Craft />")
+    program = craft.compile_program("New", SRC)
+
+    results = craft.inject_all(craft.find_crafts([tmp_path]), program, "2", jobs=2)
+    assert [r.error is None for r in results] == [True, True, False]
+    assert b'<Program name="New">' in (tmp_path / "a.xml").read_bytes()
+
+    with pytest.raises(ValueError):
+        craft.program_span(CRAFT.encode(), "0")
+
+
+def test_failed_inject_leaves_the_craft(tmp_path, monkeypatch):
+    path = tmp_path / "craft.xml"
+    path.write_text(CRAFT)
+
+    def fail(*args):
+        raise RuntimeError("copy failed")
+
+    monkeypatch.setattr(craft.shutil, "copymode", fail)
+    result = craft.inject_file(path, craft.compile_program("New", SRC), "1")
+    assert result.error == "RuntimeError: copy failed"
+    assert [p.name for p in tmp_path.iterdir()] == ["craft.xml"]
+    assert path.read_text() == CRAFT
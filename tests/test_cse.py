@@ -0,0 +1,53 @@
+import ast
+from collections import Counter
+from vizzyscript import ir
+from vizzyscript import matchers as m
+from vizzyscript.passes import eliminate_common_subexpressions
+
+
+def cse(src: str) -> tuple[list[ir.Stmt], Counter[str]]:
+    report: Counter[str] = Counter()
+    body = [m.match_statement(stmt) for stmt in ast.parse(src).body]
+    thread = ir.ReceiveMessage("msg", body)
+    return eliminate_common_subexpressions(thread, report).body, report
+
+
+a, b = ir.Variable("a"), ir.Variable("b")
+a_over_b = ir.BinaryOp.div(a, b)
+
+
+def temp(n: int) -> ir.Variable:
+    return ir.Variable(f"__cse_{n}", is_local=True)
+
+
+def test_repeated_subexpression_is_hoisted():
+    body, report = cse("VAR.a = VAR.a / VAR.b + VAR.a / VAR.b * 2")
+    assert body == [
+        ir.SetVariable("__cse_0", a_over_b, is_local=True),
+        ir.SetVariable(
+            "a",
+            ir.BinaryOp.add(
+                temp(0), ir.BinaryOp.mul(temp(0), ir.Constant.from_number(2))
+            ),
+        ),
+    ]
+    assert report == Counter({"cse.temporaries": 1, "cse.occurrences_replaced": 1})
+
+
+def test_temporaries_live_until_an_operand_is_written():
+    body, _ = cse(
+        "x = VAR.a / VAR.b\n"
+        "y = VAR.a / VAR.b\n"
+        "VAR.b = 1\n"
+        "z = VAR.a / VAR.b\n"
+        "if 1 <= VAR.a <= 2:\n"
+        "    w = VAR.a\n"
+    )
+    assert body[:3] == [
+        ir.SetVariable("__cse_0", a_over_b, is_local=True),
+        ir.SetVariable("x", temp(0), is_local=True),
+        ir.SetVariable("y", temp(0), is_local=True),
+    ]
+    assert body[4] == ir.SetVariable("z", a_over_b, is_local=True)
+    # single variable reads are not worth a temporary
+    assert type(body[5]) is ir.If
@@ -0,0 +1,116 @@
+import inspect
+import io
+import pytest
+import vizzyscript as vz
+from vizzyscript.decompile import decompile, main
+from . import program
+
+SRC = """
+class VAR:
+    x: float
+    v: Vec
+
+def helper(a, b):
+    VAR.x = a - (b - 1)
+    VAR.x = -2.5 * (a + b) % 3
+
+def h():
+    for i in range(4):
+        VAR.x = VAR.x + i
+    for j in range(VAR.x, 0, -2):
+        if not (VAR.x < j) == AG3:
+            pass
+    for _ in range(3):
+        helper(VAR.x, 2)
+    while VAR.x > 1 and (AG1 or AG(VAR.x)):
+        VAR.v = Vec(VAR.v.x, 1, 2).norm() * VectorMath.dot(VAR.v, VAR.v)
+    k = "text"
+
+def g():
+    VAR.x = VAR.v.length()
+
+do = DatalessChannel("do it")
+stop = DatalessChannel("stop")
+do.receive(h)
+stop.receive(g)
+"""
+
+OPTIONS = vz.Options(inline_threshold=0)
+
+
+def compile(src: str) -> bytes:
+    out = io.BytesIO()
+    vz.Parser("Round trip", src, OPTIONS).write(out)
+    return out.getvalue()
+
+
+@pytest.mark.parametrize("src", [SRC, inspect.getsource(program)])
+def test_round_trip(src):
+    xml = compile(src)
+    out = io.StringIO()
+    assert decompile(io.BytesIO(xml), out) == "Round trip"
+    assert compile(out.getvalue()) == xml
+
+
+def test_program_in_craft():
+    xml = compile(SRC).split(b"\n", 1)[1]
+    craft = b"<Craft><Parts><Part id='0'>" + xml + b"</Part></Parts></Craft>"
+    out = io.StringIO()
+    decompile(io.BytesIO(craft), out)
+    assert "do_it_channel = DatalessChannel('do it')" in out.getvalue()
+    assert "def helper(a, b):" in out.getvalue()
+
+
+def test_unsupported_blocks():
+    xml = b'<Program name="p"><Instructions><Event style="flight-start" />'
+    with pytest.raises(ValueError):
+        decompile(io.BytesIO(xml + b"</Instructions></Program>"), io.StringIO())
+
+
+def round_trip(src: str) -> str:
+    xml = compile(src)
+    out = io.StringIO()
+    decompile(io.BytesIO(xml), out)
+    assert compile(out.getvalue()) == xml
+    return out.getvalue()
+
+
+def test_deep_expressions():
+    chain = " + ".join(f"VAR.x * {i}" for i in range(1500))
+    nested = "not " * 300 + "AG1"
+    round_trip(
+        "class VAR:\n    x: float\n\n"
+        f"def h():\n    VAR.x = {chain}\n    AG.set(2, {nested})\n\n"
+        "c = DatalessChannel('c')\nc.receive(h)\n"
+    )
+
+
+def test_custom_instruction_names_are_kept():
+    # rather than given to the handler of "go"
+    src = """
+def on_go(n):
+    AG.set(n, True)
+
+def h():
+    on_go(1)
+
+go = DatalessChannel("go")
+go.receive(h)
+"""
+    assert "def on_go(n):" in round_trip(src)
+
+
+def test_malformed_programs_do_not_stop_the_batch(tmp_path, capsys):
+    (tmp_path / "good.xml").write_bytes(compile(SRC))
+    programs = {
+        "event": '<Event style="receive-msg" />',
+        "variable": '<Event style="flight-start" /><SetVariable><Variable />'
+        '<Constant number="1" /></SetVariable>',
+    }
+    for name, body in programs.items():
+        xml = f'<Program name="p"><Instructions>{body}</Instructions></Program>'
+        (tmp_path / f"{name}.xml").write_text(xml)
+
+    assert main([str(tmp_path), "-j", "1"]) == 1
+    assert "decompiled 1/3 files" in capsys.readouterr().out
+    assert sorted(p.name for p in tmp_path.glob("*.py")) == ["good.py"]
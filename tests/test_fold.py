@@ -0,0 +1,59 @@
+import ast
+from collections import Counter
+from vizzyscript import ir
+from vizzyscript import matchers as m
+from vizzyscript.passes import fold_thread
+
+
+def fold(src: str) -> tuple[list[ir.Stmt], Counter[str]]:
+    report: Counter[str] = Counter()
+    body = [m.match_statement(stmt) for stmt in ast.parse(src).body]
+    return fold_thread(ir.ReceiveMessage("msg", body), report).body, report
+
+
+def folded_value(expr: str) -> ir.Expr:
+    [stmt], _ = fold(f"VAR.x = {expr}")
+    return stmt.expr
+
+
+def test_fold_arithmetic_and_comparisons():
+    assert folded_value("1 + 2 * 3") == ir.Constant.from_number(7)
+    assert folded_value("(0 - 7) % 3") == ir.Constant.from_number(-1)
+    assert folded_value("2 < 3 <= 3") == ir.Constant.from_bool(True)
+    assert folded_value("1 != 1 or AG1") == ir.ActivationGroup.fixed(1)
+    # `False or x` is `x` only if `x` is a bool
+    assert type(folded_value("False or VAR.y")) is ir.BoolOp
+    assert folded_value("VAR.y and False") == ir.Constant.from_bool(False)
+    assert folded_value("Vec(1, 2 / 4, 3)") == ir.Constant.from_vector(1, 0.5, 3)
+    # a constant vector with a variable on the right is kept
+    v = ir.Constant.from_vector(1, 2, 3)
+    assert folded_value("Vec(1, 2, 3) + VAR.v").right == ir.Variable("v")
+    assert folded_value("Vec(1, 2, 3) * VAR.s").left == v
+    # no folding across a division by zero
+    assert type(folded_value("1 / 0")) is ir.BinaryOp
+    # nor with numbers too large for a float
+    assert type(folded_value(f"{10**400} + 1")) is ir.BinaryOp
+    # nor where the operation is not defined, as for an infinite dividend
+    assert type(folded_value("1e400 % 2")) is ir.BinaryOp
+
+
+def test_identities():
+    y = ir.Variable("y")
+    assert folded_value("VAR.y * 1 + 0") == y
+    assert folded_value("0 + 1 * VAR.y / 1") == y
+    assert folded_value("not not VAR.y") == y
+    assert folded_value("not (VAR.y < 2)") == ir.Comparison.gte(
+        y, ir.Constant.from_number(2)
+    )
+
+
+def test_constant_if_and_report():
+    body, report = fold(
+        "if 1 < 2:\n    VAR.x = 2 + 2\nif 2 < 1:\n    VAR.y = 1\nVAR.z = t * 1"
+    )
+    assert body == [
+        ir.SetVariable("x", ir.Constant.from_number(4)),
+        ir.SetVariable("z", ir.Variable("t", is_local=True)),
+    ]
+    # 1 < 2: 2, first If: 2, 2 + 2: 2, 2 < 1: 2, second If: 2 + 2, t * 1: 2
+    assert report["fold.nodes_removed"] == 14
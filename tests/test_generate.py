@@ -0,0 +1,26 @@
+import ast
+import io
+import vizzyscript as vz
+from benchmarks.generate import Shape, generate
+
+SHAPE = Shape(channels=3, handlers=7, fields=5, statements=9, depth=4)
+
+
+def test_same_seed_same_program():
+    assert generate(SHAPE, seed=3) == generate(SHAPE, seed=3)
+    assert generate(SHAPE, seed=3) != generate(SHAPE, seed=4)
+
+
+def test_programs_have_the_requested_shape():
+    for seed in range(20):
+        tree = ast.parse(generate(SHAPE, seed))
+        handlers = [s for s in tree.body if isinstance(s, ast.FunctionDef)]
+        assert len(handlers) == SHAPE.handlers
+        for f in handlers:
+            statements = sum(isinstance(n, ast.stmt) for n in ast.walk(f)) - 1
+            assert statements == SHAPE.statements
+
+    p = vz.Parser("generated", generate(SHAPE, seed=0))
+    p.write(io.BytesIO())
+    assert sum(p.stats.threads.values()) == SHAPE.handlers
+    assert len(p.program.variables) == SHAPE.fields
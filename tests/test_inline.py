@@ -0,0 +1,67 @@
+import pytest
+import vizzyscript as vz
+
+SRC = """
+class VAR:
+    x: float
+    unused: float
+
+def bump(by):
+    t = by * 2
+    VAR.x = VAR.x + t
+
+def big(n):
+    VAR.x = n
+    VAR.x = VAR.x + 1
+    VAR.x = VAR.x + 2
+
+def never():
+    VAR.unused = 1
+
+def handler():
+    t = 1
+    bump(t + 1)
+    big(t)
+
+c = DatalessChannel("c")
+c.receive(handler)
+"""
+
+
+def compile(src: str, options: vz.Options) -> tuple[list, vz.Parser]:
+    p = vz.Parser("inline", src, options)
+    return list(p.iter_threads()), p
+
+
+def test_small_helpers_inline_and_large_become_custom_instructions():
+    (thread, custom), p = compile(SRC, vz.Options(inline_threshold=2))
+
+    sets = [e[0].get("variableName") for e in thread.iter("SetVariable")]
+    assert sets == ["t", "__bump0_by", "__bump0_t", "x"]
+    call = thread.find("CallCustomInstruction")
+    assert call.get("call") == "big" and len(call) == 1
+
+    definition = custom[0]
+    assert definition.get("format") == "big |n|"
+    assert definition.get("callFormat") == "big (0)"
+    assert p.report["inline.calls"] == 1
+
+
+def test_unused_fields_and_functions_are_dropped():
+    _, p = compile(SRC, vz.Options(drop_unused=True))
+    assert [v.get("name") for v in p.root.find("Variables")] == ["x"]
+    assert (p.report["dead.functions"], p.report["dead.fields"]) == (1, 1)
+
+
+def test_recursive_helpers_stay_calls():
+    src = SRC.replace("    VAR.x = n\n", "    VAR.x = n\n    big(n - 1)\n")
+    (thread, custom), _ = compile(src, vz.Options(inline_threshold=100))
+    assert thread.find("CallCustomInstruction") is not None
+    assert custom.find("CallCustomInstruction").get("call") == "big"
+
+
+def test_unknown_calls_are_rejected():
+    with pytest.raises(SyntaxError, match="unknown function"):
+        compile(SRC.replace("big(t)", "huge(t)"), vz.Options())
+    # but not in helpers that are never run
+    compile(SRC.replace("VAR.unused = 1", "huge(1)"), vz.Options())
@@ -0,0 +1,113 @@
+import math
+import pytest
+import vizzyscript as vz
+from vizzyscript.interpret import Interpreter, LoopLimitExceeded
+
+SRC = """
+class VAR:
+    total: float
+    count: float
+    v: Vec
+    d: float
+
+def accumulate(k):
+    VAR.total = VAR.total + k * 2
+    VAR.count = VAR.count + 1
+    if VAR.count % 2 == 0:
+        AG.set(3, not AG3)
+
+def h():
+    for i in range(1, 5):
+        accumulate(i)
+    for _ in range(3):
+        VAR.total = VAR.total - 1
+    n = 0
+    while n < 4 and not AG9:
+        n = n + 1
+    VAR.v = Vec(n, VAR.total, 2) * 2 + Vec(1, 1, 1)
+    VAR.d = VectorMath.dot(VAR.v, Vec(1, 0, 0)) + Vec(3, 4, 0).length()
+    if AG3 or VAR.d > 100:
+        VAR.d = VAR.d / 0
+
+go = DatalessChannel("go")
+go.receive(h)
+"""
+
+OPTIMISED = vz.Options(
+    fold_constants=True,
+    cse=True,
+    balance_chains=True,
+    short_circuit_threshold=2,
+    inline_threshold=0,
+    unroll_threshold=8,
+    hoist_invariants=True,
+    vector_types=True,
+)
+
+
+def run(options: vz.Options) -> Interpreter:
+    vm = Interpreter.from_source(SRC, options)
+    vm.broadcast("go")
+    vm.broadcast("go")
+    return vm
+
+
+def test_broadcast():
+    vm = run(vz.Options())
+    assert vm.variables["count"] == 8
+    assert vm.variables["total"] == 2 * (20 - 3)
+    assert vm.variables["v"] == (9, 69, 5)
+    assert vm.variables["d"] == 14
+    assert vm.ags[3] is False
+
+
+def test_optimisations_preserve_behaviour():
+    expected, actual = run(vz.Options()), run(OPTIMISED)
+    assert actual.variables.keys() == expected.variables.keys()
+    for name, value in expected.variables.items():
+        assert actual.variables[name] == pytest.approx(value), name
+    assert dict(actual.ags) == dict(expected.ags)
+
+
+def test_loop_limit():
+    src = "def h():\n    while True:\n        pass\nc = DatalessChannel('c')\nc.receive(h)\n"
+    vm = Interpreter.from_source(src, loop_limit=100)
+    with pytest.raises(LoopLimitExceeded):
+        vm.broadcast("c")
+
+
+def test_bool_ops_give_bools():
+    src = """
+class VAR:
+    a: float
+    b: bool
+
+def h():
+    VAR.b = VAR.a and True
+    AG2 = VAR.a or False
+
+c = DatalessChannel("c")
+c.receive(h)
+"""
+    vm = Interpreter.from_source(src)
+    vm.broadcast("c")
+    assert vm.variables["b"] is False
+    assert vm.ags[2] is False
+
+
+def test_remainder_of_infinity_is_nan():
+    src = """
+class VAR:
+    x: float
+    y: float
+
+def h():
+    VAR.y = 1
+    VAR.x = VAR.y / 0 % 2
+
+c = DatalessChannel("c")
+c.receive(h)
+"""
+    vm = Interpreter.from_source(src)
+    vm.broadcast("c")
+    assert math.isnan(vm.variables["x"])
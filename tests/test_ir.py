@@ -0,0 +1,33 @@
+import ast
+import xml.etree.ElementTree as ET
+from vizzyscript import ir
+from vizzyscript import matchers as m
+from vizzyscript.ir.lower import lower_expr
+
+
+def test_transform_rebuilds_changed_nodes_only():
+    tree = m.match_expr(ast.parse("(x + 1) * VAR.y", mode="eval").body)
+
+    def rename(node: ir.Expr) -> ir.Expr:
+        if node == ir.Variable("x", is_local=True):
+            return ir.Variable("z", is_local=True)
+        return node
+
+    renamed = ir.transform(tree, rename)
+    assert renamed.left.left == ir.Variable("z", is_local=True)
+    assert renamed.right is tree.right
+    assert tree.left.left == ir.Variable("x", is_local=True)
+    assert len(list(ir.walk(renamed))) == 5
+
+
+def test_lower_expr():
+    tree = m.match_expr(ast.parse("not AG(VAR.n) or x != 1.5", mode="eval").body)
+    assert ET.tostring(lower_expr(tree)) == (
+        b'<BoolOp style="op-or" op="or">'
+        b'<Not style="op-not"><ActivationGroup style="activation-group">'
+        b'<Variable list="false" local="false" variableName="n" />'
+        b"</ActivationGroup></Not>"
+        b'<Not style="op-not"><Comparison style="op-eq" op="=">'
+        b'<Variable list="false" local="true" variableName="x" />'
+        b'<Constant number="1.5" /></Comparison></Not></BoolOp>'
+    )
@@ -0,0 +1,89 @@
+import pytest
+import vizzyscript as vz
+from vizzyscript.cost import estimate
+from vizzyscript.interpret import Interpreter
+
+SRC = """
+class VAR:
+    x: float
+    k: float
+
+def h():
+    for i in range(3):
+        VAR.x = VAR.x + i * 2
+    for j in range(0, 100, 5):
+        VAR.x = VAR.x + VAR.k * 3
+    for _ in range(10):
+        VAR.x *= 2
+    while VAR.x > 1:
+        VAR.x = VAR.x / (VAR.k + 1)
+
+c = DatalessChannel("c")
+c.receive(h)
+"""
+
+
+def thread(options: vz.Options = vz.Options()) -> tuple:
+    p = vz.Parser("loops", SRC, options)
+    (element,) = p.iter_threads()
+    return element, p
+
+
+def test_loops_lower_to_native_blocks():
+    element, _ = thread()
+    assert [e.tag for e in element][1:] == ["For", "For", "Repeat", "While"]
+
+    # Vizzy counts to an inclusive end
+    bounds = [c.get("number") for c in element[2][:3]]
+    assert bounds == ["0", "99", "5"]
+    assert estimate(element[2]).worst == 1 + 20 * 6
+
+
+def test_small_constant_loops_unroll():
+    element, p = thread(vz.Options(unroll_threshold=3, fold_constants=True))
+    assert [e.tag for e in element][1:5] == ["SetVariable"] * 3 + ["For"]
+    assert [c.get("number") for c in element.iter("Constant")][1:3] == ["2", "4"]
+    assert p.report["loops.unrolled"] == 1
+
+
+def test_invariants_are_hoisted_before_loops():
+    element, p = thread(vz.Options(hoist_invariants=True))
+    tags = [e.tag for e in element][1:]
+    assert tags == ["For", "SetVariable", "For", "Repeat", "SetVariable", "While"]
+
+    # VAR.k * 3 leaves the second loop; VAR.k + 1 leaves the while body
+    hoisted = element[2]
+    assert hoisted[0].get("variableName") == "__loop_0"
+    assert hoisted[1].get("op") == "*"
+    assert p.report["loops.hoisted"] == 2
+
+
+def test_unsupported_loops_are_rejected():
+    with pytest.raises(SyntaxError, match="range"):
+        vz.Parser("loops", SRC.replace("range(3)", "[1, 2]")).generate()
+
+
+def test_huge_loops_are_not_unrolled():
+    src = SRC.replace("range(3)", f"range({10**20})")
+    (element,) = vz.Parser("loops", src, vz.Options(unroll_threshold=8)).iter_threads()
+    assert element[1].tag == "For"
+
+
+def test_nested_unrolled_loops_keep_the_final_value():
+    src = """
+class VAR:
+    x: float
+    y: float
+
+def h():
+    for i in range(2):
+        for j in range(3):
+            VAR.x = i + j
+    VAR.y = i
+
+c = DatalessChannel("c")
+c.receive(h)
+"""
+    vm = Interpreter.from_source(src, vz.Options(unroll_threshold=10))
+    vm.broadcast("c")
+    assert (vm.variables["x"], vm.variables["y"]) == (3, 1)
@@ -0,0 +1,48 @@
+import ast
+import sys
+import pytest
+from vizzyscript import ir
+from vizzyscript import matchers as m
+from vizzyscript.matchers.registry import Registry
+
+
+def test_locals_are_not_activation_groups():
+    assert m.match_expr(ast.parse("speed", mode="eval").body) == ir.Variable(
+        "speed", is_local=True
+    )
+    assert m.match_expr(ast.parse("AG3", mode="eval").body) == ir.ActivationGroup.fixed(
+        3
+    )
+
+
+def test_registry_guards_before_fallback():
+    registry: Registry[str] = Registry("test syntax")
+    registry.register(ast.Name)(lambda node: "name")
+    registry.register(ast.Name, guard=lambda node: node.id == "x")(lambda node: "x")
+
+    assert registry.lower(ast.Name("x")) == "x"
+    assert registry.lower(ast.Name("y")) == "name"
+    with pytest.raises(SyntaxError, match="Unexpected test syntax"):
+        registry.lower(ast.Constant(1))
+
+
+def test_deep_expression_lowering():
+    depth = 10 * sys.getrecursionlimit()
+    expr: ast.expr = ast.Name("x")
+    for i in range(depth):
+        expr = ast.BinOp(expr, ast.Add(), ast.Constant(i))
+
+    node = m.match_expr(expr)
+    for _ in range(depth):
+        assert type(node) is ir.BinaryOp
+        node = node.left
+    assert node == ir.Variable("x", is_local=True)
+
+
+def test_chained_comparison_lowers_middle_operand_per_comparison():
+    node = m.match_expr(ast.parse("1 <= VAR.x < y", mode="eval").body)
+    assert node == ir.BoolOp.and_(
+        ir.Comparison.lte(ir.Constant.from_number(1), ir.Variable("x")),
+        ir.Comparison.lt(ir.Variable("x"), ir.Variable("y", is_local=True)),
+    )
+    assert node.left.right is not node.right.left
@@ -0,0 +1,68 @@
+import vizzyscript as vz
+
+SRC = """
+class VAR:
+    x: float
+
+def first():
+    t = VAR.x
+    VAR.x = t + 1
+
+def second():
+    VAR.x = VAR.x * 2
+
+def third():
+    t = 3
+    VAR.x = t
+
+c = DatalessChannel("c")
+c.receive(first)
+c.receive(second)
+c.receive(third)
+"""
+
+
+def threads(options: vz.Options) -> tuple[list, vz.Parser]:
+    p = vz.Parser("merge", SRC, options)
+    return list(p.iter_threads()), p
+
+
+def test_receivers_merge_unless_locals_clash():
+    separate, _ = threads(vz.Options())
+    merged, p = threads(vz.Options(merge_receivers=True))
+
+    # `third` reuses the local `t`, so it keeps its own thread
+    assert (len(separate), len(merged)) == (3, 2)
+    assert p.report["merge.threads_removed"] == 1
+    assert list(p.costs.threads["c"]) == ["first+second", "third"]
+
+    # the merged thread runs both bodies in order, after a single Event
+    tags = [e.tag for e in merged[0]]
+    assert tags == ["Event", "SetVariable", "SetVariable", "SetVariable"]
+
+
+def test_handlers_running_a_while_loop_keep_their_thread():
+    src = """
+class VAR:
+    x: float
+
+def spin():
+    while VAR.x < 1:
+        pass
+
+def first():
+    spin()
+
+def second():
+    VAR.x = 1
+
+c = DatalessChannel("c")
+c.receive(first)
+c.receive(second)
+"""
+    # whether `spin` is inlined or emitted as a custom instruction
+    for threshold in (8, 0):
+        options = vz.Options(merge_receivers=True, inline_threshold=threshold)
+        p = vz.Parser("merge", src, options)
+        list(p.iter_threads())
+        assert list(p.costs.threads["c"]) == ["first", "second"]
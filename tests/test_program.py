@@ -0,0 +1,65 @@
+import ast
+import pytest
+import vizzyscript as vz
+
+SRC = """
+class VAR:
+    speed: float
+    waypoints: list
+
+def first():
+    VAR.speed = 1
+
+def second():
+    VAR.speed = 2
+
+def unused():
+    VAR.speed = 3
+
+go = DatalessChannel("go")
+stop = DatalessChannel("stop")
+
+go.receive(first)
+go.receive(second)
+stop.receive(first)
+on_start(second)
+"""
+
+
+def test_collect_symbols():
+    program = vz.Program(ast.parse(SRC))
+    program.collect_symbols()
+
+    assert program.variables == ["speed"]
+    assert program.lists == ["waypoints"]
+    assert program.threads["go"].msg == "go"
+    assert [f.name for f in program.threads["go"].threads] == ["first", "second"]
+    # a function is only ever linked to the first trigger that receives it
+    assert program.threads["stop"].threads == []
+    assert program.threads["on_start"].threads == []
+    assert list(program.functions) == ["unused"]
+
+
+def test_parser_handles_deep_expressions():
+    terms = " + ".join(f"VAR.x * {i}" for i in range(2000))
+    src = f"def f():\n    VAR.x = {terms}\nc = DatalessChannel('c')\nc.receive(f)\n"
+    p = vz.Parser("deep", src, vz.Options(balance_chains=True))
+    p.generate()
+    assert len(list(p.root.iter("BinaryOp"))) == 2000 + 1999
+
+
+def test_lazy_threads():
+    p = vz.Parser("lazy", SRC)
+    go = list(p.threads("go"))
+    assert len(go) == 2 and all(t.tag == "Instructions" for t in go)
+    # nothing else was lowered
+    assert list(p.costs.threads) == ["go"]
+
+    assert list(p.threads("stop")) == []
+    with pytest.raises(ValueError):
+        p.thread("go")
+    with pytest.raises(KeyError):
+        p.threads("nowhere")
+
+    merged = vz.Parser("lazy", SRC, vz.Options(merge_receivers=True))
+    assert merged.thread("go")[0].get("event") == "ReceiveMessage"
@@ -0,0 +1,45 @@
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+from vizzyscript.server import CompileServer, compile_request
+from .test_cache import SRC
+
+
+def test_compile_request_reports_errors():
+    response = compile_request({"id": 1, "source": "def f(:\n"})
+    assert response["ok"] is False
+    assert response["error"]["type"] == "SyntaxError"
+    assert response["error"]["line"] == 1
+
+    response = compile_request({"id": 2, "source": SRC, "options": {"fast": True}})
+    assert response["error"]["message"] == "Unknown options: fast"
+
+    response = compile_request({"id": 3, "source": SRC, "options": [1]})
+    assert response["error"]["type"] == "ValueError"
+
+
+def test_server_keeps_builds_warm(tmp_path):
+    async def session():
+        path = tmp_path / "sock"
+        with ThreadPoolExecutor(2) as a, ThreadPoolExecutor(2) as b:
+            handle = CompileServer([a, b]).handle
+            server = await asyncio.start_unix_server(handle, path)
+            async with server:
+                reader, writer = await asyncio.open_unix_connection(path)
+
+                async def send(*sources):
+                    for i, src in enumerate(sources):
+                        request = {"id": i, "name": "warm", "source": src}
+                        writer.write(json.dumps(request).encode() + b"\n")
+                    return [json.loads(await reader.readline()) for _ in sources]
+
+                responses = await send(SRC)
+                # concurrent edits, each compiled against the previous build
+                responses += await send(*(SRC.replace("* 2", f"* {k}") for k in "34"))
+                writer.close()
+        return responses
+
+    first, *rest = asyncio.run(session())
+    assert first["ok"] and first["xml"].startswith("<?xml")
+    # the same build, whichever order the requests ran in
+    assert sorted(r["reused"] for r in rest) == [1, 1]
@@ -0,0 +1,39 @@
+import vizzyscript as vz
+
+SRC = """
+class VAR:
+    x: float
+    v: Vec
+
+def h():
+    if VAR.x > 0 and (VAR.v * VAR.x + Vec(1, 2, 3)) == VAR.v and AG1:
+        VAR.x = 1
+    if AG2 or VAR.x * VAR.x + VAR.x * 2 > 10:
+        VAR.x = 2
+    if AG3 and AG4:
+        VAR.x = 3
+
+c = DatalessChannel("c")
+c.receive(h)
+"""
+
+
+def test_expensive_operands_are_guarded():
+    p = vz.Parser("sc", SRC, vz.Options(short_circuit_threshold=4))
+    (thread,) = p.iter_threads()
+    tags = [e.tag for e in thread][1:]
+    assert tags == ["If", "SetVariable", "If", "If", "If"]
+
+    # and: the vector comparison (and AG1) only runs once VAR.x > 0
+    outer = thread[1]
+    assert outer[0].tag == "Comparison"
+    inner = outer[1][0]
+    assert inner.tag == "If" and inner[0].get("op") == "and"
+
+    # or: __sc_0 = AG2; if not __sc_0: __sc_0 = ...; if __sc_0: ...
+    assert thread[2][0].get("variableName") == "__sc_0"
+    assert thread[3][0].tag == "Not"
+
+    # cheap operands keep the plain operator
+    assert thread[5][0].get("op") == "and"
+    assert p.report["short_circuit.ifs"] == 2
@@ -0,0 +1,29 @@
+import io
+import json
+import vizzyscript as vz
+from vizzyscript.__main__ import main
+from .test_cache import SRC
+
+
+def test_stats_cover_every_phase():
+    seen = []
+    stats = vz.Stats(hooks=[lambda phase, seconds: seen.append(phase)])
+    p = vz.Parser("stats", SRC, vz.Options(cse=True), stats=stats)
+    p.write(io.BytesIO())
+
+    phases = ["parse", "remove_global", "collect_symbols", "match", "optimise"]
+    assert set(stats.phases) == {*phases, "lower", "emit"}
+    assert seen[:3] == phases[:3] and seen[-1] == "emit"
+    assert stats.threads == {"c": 2}
+    assert stats.elements["SetVariable"] == 2
+    assert stats.max_depth == 2
+
+    json.dumps(stats.as_dict())
+
+
+def test_cli_prints_stats_as_json(tmp_path, capsys):
+    (tmp_path / "a.py").write_text(SRC)
+    assert main([str(tmp_path), "--stats", "-j", "1"]) == 0
+    summary = json.loads(capsys.readouterr().out)
+    assert summary["files"] == 1 and summary["threads"] == {"c": 2}
+    assert "emit" in summary["phases"]
@@ -0,0 +1,55 @@
+import pytest
+import vizzyscript as vz
+
+SRC = """
+class VAR:
+    a: Vec
+    b: Vec
+    n: float
+
+def h():
+    p = VAR.a
+    VAR.b = p * VAR.b
+    VAR.b = Vec(p.x - VAR.a.x, p.y - VAR.a.y, p.z - VAR.a.z)
+    VAR.n = VectorMath.dot(p, VAR.b) + Vec(3, 4, 0).length()
+    VAR.n = Vec(VAR.n, 1, 2).x
+
+c = DatalessChannel("c")
+c.receive(h)
+"""
+
+
+def values(options: vz.Options, src: str = SRC) -> list:
+    (thread,) = vz.Parser("vectors", src, options).iter_threads()
+    return [stmt[1] for stmt in thread[1:]]
+
+
+def test_vector_operators_are_matched():
+    _, scale, rebuilt, dot, component = values(vz.Options())
+    assert scale.get("op") == "*"
+    assert rebuilt.tag == "Vector"
+    assert dot[0].get("style") == "vec-op-2" and dot[0].get("op") == "dot"
+    assert dot[1].get("style") == "vec-op-1" and dot[1].get("op") == "length"
+    assert component.get("op") == "x"
+
+
+def test_native_vector_ops():
+    p = vz.Parser("vectors", SRC, vz.Options(vector_types=True, fold_constants=True))
+    (thread,) = p.iter_threads()
+    _, scale, rebuilt, dot, component = [stmt[1] for stmt in thread[1:]]
+    assert scale.tag == "VectorOp" and scale.get("op") == "scale"
+    assert rebuilt.get("op") == "-"
+    assert [e.get("variableName") for e in rebuilt] == ["p", "a"]
+    assert dot[1].attrib == {"number": "5.0"}
+    assert component.get("variableName") == "n"
+    assert p.report["vectors.rewritten"] == 3
+
+
+@pytest.mark.parametrize(
+    "stmt", ["VAR.n = VAR.a + 1", "VAR.n = VAR.a", "VAR.b = 2 / VAR.a"]
+)
+def test_mixed_types_are_rejected(stmt):
+    src = SRC.replace("    p = VAR.a\n", f"    p = VAR.a\n    {stmt}\n")
+    with pytest.raises(SyntaxError):
+        values(vz.Options(vector_types=True), src)
+    values(vz.Options(), src)
@@ -0,0 +1,68 @@
+import io
+import pytest
+import vizzyscript as vz
+from vizzyscript import watch
+from vizzyscript.watch import IncrementalBuild
+from .test_cache import SRC
+
+
+def written(build: IncrementalBuild) -> bytes:
+    out = io.BytesIO()
+    build.write(out)
+    return out.getvalue()
+
+
+def full(src: str) -> bytes:
+    out = io.BytesIO()
+    vz.Parser("watched", src).write(out)
+    return out.getvalue()
+
+
+def test_incremental_build_relowers_changed_handlers_only():
+    build = IncrementalBuild("watched")
+    assert len(build.update(SRC).rebuilt) == 2
+    assert written(build) == full(SRC)
+
+    edited = SRC.replace("* 2", "* 3")
+    report = build.update(edited)
+    assert (report.rebuilt, report.reused) == (["second"], 1)
+    assert written(build) == full(edited)
+
+    # the symbol table affects every handler
+    edited = edited.replace("x: float", "x: float\n    y: float")
+    assert len(build.update(edited).rebuilt) == 2
+
+    edited = edited.replace("c.receive(second)", "")
+    report = build.update(edited)
+    assert (report.rebuilt, report.reused, report.removed) == ([], 1, 1)
+    assert written(build) == full(edited)
+
+
+def test_handlers_of_other_triggers_are_checked():
+    src = SRC + "\ndef started():\n    VAR.x = [1]\n\non_start(started)\n"
+    with pytest.raises(SyntaxError):
+        IncrementalBuild("watched").update(src)
+
+
+def test_watch_reports_errors_and_goes_on(tmp_path, monkeypatch, capsys):
+    files = []
+    for name in ("bad", "good"):
+        (tmp_path / f"{name}.py").write_text(SRC)
+        files.append((tmp_path / f"{name}.py", tmp_path / "out" / f"{name}.xml"))
+    # the output of `bad` cannot be replaced
+    (tmp_path / "out" / "bad.xml").mkdir(parents=True)
+
+    def interrupt(seconds):
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(watch.time, "sleep", interrupt)
+    watch.watch(files)
+
+    assert "bad.py: IsADirectoryError" in capsys.readouterr().err
+    assert (tmp_path / "out" / "good.xml").read_bytes() == full(SRC).replace(
+        b"watched", b"good"
+    )
+    assert sorted(p.name for p in (tmp_path / "out").iterdir()) == [
+        "bad.xml",
+        "good.xml",
+    ]
@@ -0,0 +1,59 @@
+import inspect
+import io
+import xml.etree.ElementTree as ET
+import vizzyscript as vz
+from vizzyscript import xml_gen as gen
+from . import program
+
+
+def strip_whitespace(xml: bytes) -> bytes:
+    root = ET.fromstring(xml)
+    for elem in root.iter():
+        elem.text = elem.text if elem.text and elem.text.strip() else None
+        elem.tail = None
+    return ET.tostring(root)
+
+
+def test_stream_matches_element_tree():
+    src = inspect.getsource(program)
+
+    p = vz.Parser("Testing VizzyScript", src)
+    p.generate()
+    ET.indent(p.root)
+    expected = ET.tostring(p.root, encoding="utf-8", xml_declaration=True)
+
+    pretty = io.BytesIO()
+    vz.Parser("Testing VizzyScript", src).write(pretty)
+    assert pretty.getvalue() == expected
+
+    minified = io.BytesIO()
+    vz.Parser("Testing VizzyScript", src).write(minified, space=None)
+    assert b"\n " not in minified.getvalue()
+    assert strip_whitespace(minified.getvalue()) == strip_whitespace(expected)
+
+
+def test_serialize_shared_subtree():
+    shared = gen.Variable("x")
+    tree = gen.BinaryOp.add(shared, gen.BinaryOp.mul(shared, shared))
+    assert "".join(gen.serialize(tree, None)) == ET.tostring(tree, "unicode")
+
+
+def test_shared_leaves():
+    src = inspect.getsource(program)
+
+    expected = io.BytesIO()
+    vz.Parser("Testing VizzyScript", src).write(expected)
+
+    p = vz.Parser("Testing VizzyScript", src, vz.Options(share_leaves=True))
+    shared = io.BytesIO()
+    p.write(shared)
+    assert shared.getvalue() == expected.getvalue()
+
+    reads = [
+        e
+        for thread in p.iter_threads()
+        for e in thread.iter("Variable")
+        if e.get("variableName") == "vector"
+    ]
+    # every read of VAR.vector is one element; assignment targets are not leaves
+    assert len({id(e) for e in reads}) < len(reads)
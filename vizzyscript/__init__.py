@@ -1,13 +1,24 @@
 import ast
+import json
+from collections import Counter
 from dataclasses import dataclass
-from typing import Self
+from typing import BinaryIO, Iterator, Self
+import xml.etree.ElementTree as ET
 from vizzy_api import triggers
+from . import ir
 from . import matchers as m
+from . import passes
 from . import xml_gen as gen
+from .cache import CompilationCache
+from .cost import CostReport
+from .inline import Inliner
+from .ir.lower import Leaves, lower_thread
+from .options import Options
+from .stats import Stats
 
-__all__ = ["Program", "Parser"]
+__all__ = ["Program", "Parser", "Options", "CompilationCache", "Stats"]
 
-normal_triggers = filter(lambda s: s.islower(), triggers.__all__)
+normal_triggers = [s for s in triggers.__all__ if s.islower()]
 
 
 @dataclass
@@ -23,6 +34,26 @@ class Function:
     def __str__(self) -> str:
         return f"locals: {self.params}\nunparsed:\n{ast.unparse(self.source)}"
 
+    def local_names(self) -> set[str]:
+        """Names the function reads or assigns as thread-local variables"""
+        # `AG`, `Vec`, `VAR` and `VectorMath` only appear as the base of a call
+        # or attribute; locals only as that of a vector component or method
+        bases = set()
+        names = set(self.params)
+        for node in ast.walk(self.source):
+            match node:
+                case ast.Attribute(value=ast.Name(id=name), attr=attr) if (
+                    name != "VAR" and attr in m.VECTOR_COMPONENTS | m.VECTOR_METHODS
+                ):
+                    pass
+                case ast.Call(func=ast.Name(id=name)) | ast.Attribute(
+                    value=ast.Name(id=name)
+                ):
+                    bases.add(name)
+                case ast.Name(id=name) if name not in m.FIXED_AGS:
+                    names.add(name)
+        return names - bases
+
     def __hash__(self) -> int:
         return hash(self.name)
 
@@ -46,24 +77,49 @@ class RemoveGlobal(ast.NodeTransformer):
     """
     Remove `global` statements needed to declare AGs
     """
+
     def visit_Global(self, node: ast.Global):
         return None
 
+    def generic_visit(self, node: ast.AST):
+        # `global` is a statement, so there is no need to descend into
+        # (arbitrarily deep) expressions
+        if isinstance(node, ast.expr):
+            return node
+        return super().generic_visit(node)
+
 
 class Program:
-    def __init__(self, tree: ast.AST) -> None:
+    def __init__(self, tree: ast.AST, *, globals_removed: bool = False) -> None:
         assert isinstance(tree, ast.Module)
-        self.tree: ast.Module = RemoveGlobal().visit(tree)
-        self.functions: set[Function] = set()
+        if not globals_removed:
+            tree = RemoveGlobal().visit(tree)
+        self.tree: ast.Module = tree
+        self.functions: dict[str, Function] = {}
         self.threads: dict[str, Target] = {
             trigger: Target([]) for trigger in normal_triggers
         }
         self.variables: list[str] = []
         self.lists: list[str] = []
+        # `VAR` field -> the name of its annotation, e.g. "Vec" or "float"
+        self.types: dict[str, str] = {}
+
+    def collect_symbols(self):
+        """
+        Build the symbol table in a single pass over the module body.
+
+        Channels, functions and `VAR` fields are indexed by name as they are
+        found. Trigger links are recorded during the same pass and resolved
+        afterwards, so each link is a dictionary lookup.
+        """
+        links: list[tuple[str, str]] = []
 
-    def find_channels(self):
         for stmt in self.tree.body:
             match stmt:
+                case ast.FunctionDef(name=name):
+                    if name not in self.functions:
+                        self.functions[name] = Function.from_function_def(stmt)
+
                 case ast.Assign(
                     targets=[ast.Name(id=channel)],
                     value=ast.Call(
@@ -76,70 +132,317 @@ class Program:
                 ):
                     self.threads[channel] = Target([], msg)
 
-    def find_functions(self):
-        for stmt in self.tree.body:
-            if isinstance(stmt, ast.FunctionDef):
-                self.functions.add(Function.from_function_def(stmt))
-
-    def link_threads(self):
-        for stmt in self.tree.body:
-            match stmt:
                 case ast.Expr(
                     value=ast.Call(
                         func=ast.Name(id=trigger)
                         | ast.Attribute(value=ast.Name(id=trigger), attr="receive"),
                         args=[ast.Name(id=target)],
                     )
-                ) if (
-                    trigger in self.threads
                 ):
-                    links = {func for func in self.functions if func.name == target}
-                    for func in links:
-                        self.threads[trigger].add_thread(func)
-                        self.functions.remove(func)
+                    links.append((trigger, target))
 
-    def find_vars(self):
-        for stmt in self.tree.body:
-            if isinstance(stmt, ast.ClassDef) and stmt.name == "VAR":
-                for var in stmt.body:
-                    match var:
-                        case ast.AnnAssign(
-                            target=ast.Name(id=name), annotation=ast.Name(id=datatype)
-                        ):
+                case ast.ClassDef(name="VAR", body=fields):
+                    self.collect_vars(fields)
 
-                            if "list" in datatype:
-                                self.lists.append(name)
-                            else:
-                                self.variables.append(name)
+        for trigger, target in links:
+            if trigger in self.threads and target in self.functions:
+                self.threads[trigger].add_thread(self.functions.pop(target))
+
+    def collect_vars(self, fields: list[ast.stmt]):
+        for var in fields:
+            match var:
+                case ast.AnnAssign(
+                    target=ast.Name(id=name), annotation=ast.Name(id=datatype)
+                ):
+
+                    if "list" in datatype:
+                        self.lists.append(name)
+                    else:
+                        self.variables.append(name)
+                    self.types[name] = datatype
 
 
 class Parser:
-    def __init__(self, name: str, src: str) -> None:
+    def __init__(
+        self,
+        name: str,
+        src: str,
+        options: Options | None = None,
+        cache: CompilationCache | None = None,
+        stats: Stats | None = None,
+    ) -> None:
         self.root = gen.Program(name)
+        self.options = options if options is not None else Options()
+        self.cache = cache
+        # what the optimisation passes did, e.g. "fold.nodes_removed"
+        self.report: Counter[str] = Counter()
+        self.stats = stats if stats is not None else Stats()
+        self.costs = CostReport(self.options.cost_budget, self.custom_instruction)
+        # custom instructions lowered early, to cost the calls to them
+        self.instructions: dict[str, gen.Element] = {}
+        self.leaves = Leaves() if self.options.share_leaves else None
+
+        with self.stats.phase("parse"):
+            tree = ast.parse(src)
 
-        self.program = Program(ast.parse(src))
+        with self.stats.phase("remove_global"):
+            tree = RemoveGlobal().visit(tree)
+        self.program = Program(tree, globals_removed=True)
 
-        self.program.find_channels()
-        self.program.find_functions()
-        self.program.find_vars()
+        with self.stats.phase("collect_symbols"):
+            self.program.collect_symbols()
 
-        self.program.link_threads()
+        for trigger, target in self.program.threads.items():
+            if target.threads:
+                self.stats.threads[trigger] += len(target.threads)
 
-        self.root.append(gen.Variables(self.program.variables))
+        self.inliner = Inliner(
+            self.program.functions, self.options.inline_threshold, self.report
+        )
+        # handlers that are emitted, and the helpers they need as custom instructions
+        roots = [f for t in self.program.threads.values() if t.msg for f in t.threads]
+        self.custom = self.inliner.custom_instructions(roots)
+
+        variables = self.program.variables
+        if self.options.drop_unused:
+            variables = self.drop_unused(roots)
+
+        self.root.append(gen.Variables(variables))
         self.root.append(gen.Expressions())
+        for section in self.root:
+            self.stats.count_elements(section)
 
     def generate(self):
-        for trigger, target in self.program.threads.items():  #
-            self.__generate_thread(trigger, target)
+        for thread in self.iter_threads():
+            self.root.append(thread)
+
+    def iter_threads(self) -> Iterator[gen.Element]:
+        """
+        Lower and yield the program's threads one at a time, without adding
+        them to `self.root`
+        """
+        for trigger, target in self.program.threads.items():
+            if target.threads:
+                yield from self.__generate_thread(trigger, target)
+
+        for f in self.custom:
+            yield from self.__generate_custom_instruction(f)
+
+    def threads(self, name: str) -> Iterator[gen.Element]:
+        """
+        Lower only the threads of one trigger or channel, named by its
+        variable or its message, or the custom instruction `name`, as they
+        are iterated. Raises `KeyError` if there is no such thread.
+        """
+        for trigger, target in self.program.threads.items():
+            if name in (trigger, target.msg):
+                return self.__generate_thread(trigger, target)
+
+        for f in self.custom:
+            if f.name == name:
+                return self.__generate_custom_instruction(f)
+
+        raise KeyError(name)
+
+    def thread(self, name: str) -> gen.Element:
+        """The one thread `name` starts, see `threads`"""
+        threads = list(self.threads(name))
+        if len(threads) != 1:
+            raise ValueError(f"{name} has {len(threads)} threads, not 1")
+        return threads[0]
+
+    def drop_unused(self, roots: list[Function]) -> list[str]:
+        """
+        `VAR` fields used by the emitted handlers and the helpers they call,
+        counting the unused fields and unreachable helpers in the report
+        """
+        needed = set()
+        for f in roots:
+            needed.update(self.inliner.dependencies(f))
+        self.report["dead.functions"] += len(self.program.functions) - len(needed)
 
-    def __generate_thread(self, trigger: str, t: Target):
+        used = set()
+        for f in [*roots, *(self.program.functions[name] for name in needed)]:
+            for node in ast.walk(f.source):
+                match node:
+                    case ast.Attribute(value=ast.Name(id="VAR"), attr=attr):
+                        used.add(attr)
+
+        variables = [v for v in self.program.variables if v in used]
+        self.report["dead.fields"] += len(self.program.variables) - len(variables)
+        return variables
+
+    def write(
+        self, out: BinaryIO, *, space: str | None = "  ", xml_declaration: bool = True
+    ):
+        """
+        Stream the program to `out` as it is generated. `space=None` writes
+        minified XML.
+        """
+        with self.stats.residual("emit"):
+            gen.write_program(
+                self.root,
+                self.iter_threads(),
+                out,
+                space=space,
+                xml_declaration=xml_declaration,
+            )
+
+    def __generate_thread(self, trigger: str, t: Target) -> Iterator[gen.Element]:
         # TODO: implement other triggers
 
-        threads = [
-            [m.match_statement(stmt) for stmt in body]
-            for body in [i.source.body for i in t.threads]
+        if t.msg is None:
+            # not emitted yet, but still checked
+            with self.stats.phase("match"):
+                for f in t.threads:
+                    m.match_block(f.source.body)
+            return
+
+        for f, *merged in self.receiver_groups(t):
+            if self.cache is None:
+                element = self.compile_thread(f, t.msg, *merged)
+            else:
+                element = self.cached_thread(f, t.msg, *merged)
+            self.stats.count_elements(element)
+            self.costs.add(trigger, "+".join(g.name for g in (f, *merged)), element)
+            yield element
+
+    def __generate_custom_instruction(self, f: Function) -> Iterator[gen.Element]:
+        element = self.instructions.pop(f.name, None)
+        if element is None:
+            element = self.compile_custom_instruction(f)
+        self.stats.count_elements(element)
+        yield element
+
+    def receiver_groups(self, t: Target) -> list[list[Function]]:
+        """
+        Handlers of `t` to run as one thread each. With `merge_receivers`,
+        consecutive handlers share a thread unless they use the same local
+        name, which would otherwise become one variable. Handlers that may run
+        a `while` loop, which may never end, keep a thread of their own.
+        """
+        if not self.options.merge_receivers:
+            return [[f] for f in t.threads]
+
+        groups: list[list[Function]] = []
+        used: set[str] | None = None
+        for f in t.threads:
+            names = f.local_names()
+            if self.has_while(f):
+                groups.append([f])
+                used = None
+            elif used is not None and not names & used:
+                groups[-1].append(f)
+                used |= names
+            else:
+                groups.append([f])
+                used = names
+
+        self.report["merge.threads_removed"] += len(t.threads) - len(groups)
+        return groups
+
+    def has_while(self, f: Function) -> bool:
+        """Whether `f`, or a helper it may run, contains a `while` loop"""
+        sources = [f.source]
+        sources.extend(
+            self.program.functions[h].source for h in self.inliner.dependencies(f)
+        )
+        return any(isinstance(node, ast.While) for s in sources for node in ast.walk(s))
+
+    def compile_thread(self, f: Function, msg: str, *merged: Function) -> gen.Element:
+        """Lower `f`, followed by any `merged` handlers, as one thread"""
+        body = self.match_body([stmt for g in (f, *merged) for stmt in g.source.body])
+        return self.lower_block(ir.ReceiveMessage(msg, body))
+
+    def compile_custom_instruction(self, f: Function) -> gen.Element:
+        body = self.match_body(f.source.body)
+        return self.lower_block(ir.CustomInstruction(f.name, f.params, body))
+
+    def custom_instruction(self, name: str) -> gen.Element:
+        """The thread of custom instruction `name`, lowered at most once"""
+        element = self.instructions.get(name)
+        if element is None:
+            f = self.program.functions[name]
+            element = self.instructions[name] = self.compile_custom_instruction(f)
+        return element
+
+    def match_body(self, body: list[ast.stmt]) -> list[ir.Stmt]:
+        with self.stats.phase("match"):
+            return m.match_block(self.inliner.expand_thread(body))
+
+    def lower_block(self, thread: ir.Thread) -> gen.Element:
+        with self.stats.phase("optimise"):
+            thread = self.optimise(thread)
+        self.stats.count_depth(thread)
+
+        with self.stats.phase("lower"):
+            return lower_thread(thread, self.leaves)
+
+    def source_key(self, functions: list[Function]) -> list[str]:
+        """Dumps of `functions` and of every helper they may run"""
+        helpers = sorted({h for f in functions for h in self.inliner.dependencies(f)})
+        return [
+            *(ast.dump(f.source) for f in functions),
+            *(ast.dump(self.program.functions[h].source) for h in helpers),
         ]
 
-        for thread in threads:
-            if t.msg is not None:
-                self.root.append(gen.ReceiveMessage(t.msg, thread))
+    def cached_thread(self, f: Function, msg: str, *merged: Function) -> gen.Element:
+        """
+        Look the thread up by its functions' source and the symbols it may
+        depend on, and only compile it on a miss. Entries also hold the
+        counters compiling the thread added to `report`, which a hit adds
+        again, so the report does not depend on the state of the cache.
+        """
+        key = self.cache.key(
+            *self.source_key([f, *merged]),
+            msg,
+            repr(self.program.variables),
+            repr(self.program.lists),
+            repr(self.program.types),
+            repr(self.options),
+        )
+
+        with self.stats.phase("cache"):
+            data = self.cache.get(key)
+            if data is not None:
+                self.report["cache.hits"] += 1
+                counters, xml = data.split(b"\n", 1)
+                self.report.update(json.loads(counters))
+                return ET.fromstring(xml)
+
+        self.report["cache.misses"] += 1
+        before = self.report.copy()
+        element = self.compile_thread(f, msg, *merged)
+        with self.stats.phase("cache"):
+            counters = json.dumps(self.report - before).encode()
+            xml = "".join(gen.serialize(element, None)).encode()
+            self.cache.put(key, counters + b"\n" + xml)
+        return element
+
+    def optimise(self, thread: ir.Thread) -> ir.Thread:
+        if self.options.unroll_threshold > 0:
+            thread = passes.unroll_thread(
+                thread, self.options.unroll_threshold, self.report
+            )
+
+        if self.options.vector_types:
+            thread = passes.infer_vector_types(thread, self.program.types, self.report)
+
+        if self.options.fold_constants:
+            thread = passes.fold_thread(thread, self.report)
+
+        if self.options.short_circuit_threshold is not None:
+            thread = passes.short_circuit_thread(
+                thread, self.options.short_circuit_threshold, self.report
+            )
+
+        if self.options.cse:
+            thread = passes.eliminate_common_subexpressions(thread, self.report)
+
+        if self.options.hoist_invariants:
+            thread = passes.hoist_invariants(thread, self.report)
+
+        if self.options.balance_chains:
+            thread = passes.balance_thread(thread, self.report)
+
+        return thread
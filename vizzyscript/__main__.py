@@ -0,0 +1,187 @@
+"""
+Compile VizzyScript files to Vizzy XML.
+
+    python -m vizzyscript craft/*.py -o build/ --fold-constants
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field, fields
+from functools import cache
+from pathlib import Path
+from typing import Iterable, Iterator
+from . import xml_gen as gen
+from . import CompilationCache, Options, Parser, Stats
+from .watch import watch
+
+
+@dataclass
+class Job:
+    source: Path
+    output: Path
+    options: Options
+    cache: Path | None
+    space: str | None
+
+
+@dataclass
+class Result:
+    source: Path
+    nodes: int = 0
+    error: str | None = None
+    stats: dict = field(default_factory=dict)
+    report: dict[str, int] = field(default_factory=dict)
+    costs: dict = field(default_factory=dict)
+
+
+def counted(threads: Iterable[gen.Element], result: Result) -> Iterator[gen.Element]:
+    for thread in threads:
+        result.nodes += sum(1 for _ in thread.iter())
+        yield thread
+
+
+@cache
+def open_cache(path: Path) -> CompilationCache:
+    # one per process, as opening a cache reads its whole directory
+    return CompilationCache(path)
+
+
+def compile_file(job: Job) -> Result:
+    result = Result(job.source)
+    try:
+        cached = open_cache(job.cache) if job.cache is not None else None
+        stats = Stats()
+        p = Parser(job.source.stem, job.source.read_text(), job.options, cached, stats)
+        result.nodes = sum(1 for _ in p.root.iter())
+
+        job.output.parent.mkdir(parents=True, exist_ok=True)
+        with open(job.output, "wb") as out, stats.residual("emit"):
+            threads = counted(p.iter_threads(), result)
+            gen.write_program(p.root, threads, out, space=job.space)
+        result.stats = stats.as_dict()
+        result.report = dict(p.report)
+        result.costs = p.costs.as_dict()
+    except Exception as e:
+        # recorded rather than raised, so one file cannot stop the batch
+        result.error = f"{type(e).__name__}: {e}"
+        job.output.unlink(missing_ok=True)
+
+    return result
+
+
+def find_sources(inputs: list[Path], output: Path | None) -> list[tuple[Path, Path]]:
+    """(source, output) pairs in a stable order"""
+    pairs = []
+    for path in inputs:
+        if path.is_dir():
+            for source in sorted(path.rglob("*.py")):
+                rel = source.relative_to(path).with_suffix(".xml")
+                pairs.append((source, (output or path) / rel))
+        else:
+            out = (output or path.parent) / path.with_suffix(".xml").name
+            pairs.append((path, out))
+    return pairs
+
+
+def option_flags(parser: argparse.ArgumentParser):
+    group = parser.add_argument_group("optimisations")
+    for field in fields(Options):
+        flag = "--" + field.name.replace("_", "-")
+        if field.type is bool:
+            group.add_argument(flag, action="store_true", dest=field.name)
+        elif field.type == float | None:
+            group.add_argument(flag, type=float, dest=field.name)
+        elif field.type is int:
+            group.add_argument(flag, type=int, dest=field.name, default=field.default)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m vizzyscript",
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("inputs", nargs="+", type=Path, help="files or directories")
+    parser.add_argument(
+        "-o", "--output", type=Path, help="output directory (default: beside input)"
+    )
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--cache", type=Path, help="compilation cache directory")
+    parser.add_argument("--minify", action="store_true", help="omit indentation")
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="recompile changed handlers whenever an input changes",
+    )
+    parser.add_argument(
+        "--stats", action="store_true", help="print per-phase statistics as JSON"
+    )
+    option_flags(parser)
+    args = parser.parse_args(argv)
+
+    options = Options(
+        **{
+            f.name: getattr(args, f.name)
+            for f in fields(Options)
+            if hasattr(args, f.name)
+        }
+    )
+    space = None if args.minify else "  "
+    sources = find_sources(args.inputs, args.output)
+    if args.watch:
+        watch(sources, options, space=space)
+        return 0
+
+    jobs = [
+        Job(source, output, options, args.cache, space) for source, output in sources
+    ]
+
+    start = time.perf_counter()
+    if args.jobs > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(args.jobs) as pool:
+            results = list(pool.map(compile_file, jobs, chunksize=4))
+    else:
+        results = list(map(compile_file, jobs))
+    elapsed = time.perf_counter() - start
+
+    failed = 0
+    for result in results:
+        if result.error is not None:
+            failed += 1
+            print(f"{result.source}: {result.error}", file=sys.stderr)
+
+    nodes = sum(r.nodes for r in results)
+    if args.stats:
+        stats = Stats()
+        report = Counter()
+        for result in results:
+            if result.error is None:
+                stats.merge(result.stats)
+                report.update(result.report)
+        summary = {
+            "files": len(results),
+            "failed": failed,
+            "nodes": nodes,
+            "seconds": elapsed,
+            **stats.as_dict(),
+            "report": dict(report),
+            "costs": {str(r.source): r.costs for r in results if r.error is None},
+        }
+        print(json.dumps(summary, indent=2))
+        return 1 if failed else 0
+
+    print(
+        f"compiled {len(results) - failed}/{len(results)} files, {nodes:,} nodes "
+        f"in {elapsed:.2f} s ({len(results) / elapsed:,.1f} files/s, "
+        f"{nodes / elapsed:,.0f} nodes/s)"
+    )
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
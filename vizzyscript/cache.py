@@ -0,0 +1,95 @@
+import hashlib
+import os
+from functools import cache
+from pathlib import Path
+import vizzy_api
+
+__all__ = ["CompilationCache"]
+
+
+@cache
+def compiler_fingerprint() -> str:
+    """
+    Hash of the compiler's own source and of `vizzy_api`, which the
+    matchers read, so that cached threads are never reused across changes
+    to either
+    """
+    digest = hashlib.sha256()
+    for root in (Path(__file__).parent, Path(vizzy_api.__file__).parent):
+        for path in sorted(root.rglob("*.py")):
+            digest.update(f"{root.name}/{path.relative_to(root).as_posix()}".encode())
+            digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+
+class CompilationCache:
+    """
+    Content-addressed on-disk cache of lowered threads, or any other bytes.
+
+    Entries are files named by the SHA-256 of their key in `path`. Once the
+    total size exceeds `max_bytes`, the least recently used entries are
+    deleted. Hits refresh an entry's modification time, which is the
+    recency used across processes sharing the directory.
+    """
+
+    def __init__(self, path: str | os.PathLike, max_bytes: int = 64 * 2**20) -> None:
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+        # key -> size, least recently used first
+        self.entries: dict[str, int] = {}
+        files = [e for e in os.scandir(self.path) if e.name.endswith(".xml")]
+        for entry in sorted(files, key=lambda e: e.stat().st_mtime_ns):
+            self.entries[entry.name.removesuffix(".xml")] = entry.stat().st_size
+        self.size = sum(self.entries.values())
+
+    @staticmethod
+    def key(*parts: str) -> str:
+        digest = hashlib.sha256(compiler_fingerprint().encode())
+        for part in parts:
+            digest.update(b"\0")
+            digest.update(part.encode())
+        return digest.hexdigest()
+
+    def file(self, key: str) -> Path:
+        return self.path / f"{key}.xml"
+
+    def get(self, key: str) -> bytes | None:
+        try:
+            data = self.file(key).read_bytes()
+        except FileNotFoundError:
+            self.misses += 1
+            self.size -= self.entries.pop(key, 0)
+            return None
+
+        self.hits += 1
+        os.utime(self.file(key))
+        # the entry may have been written by another instance
+        self.size += len(data) - self.entries.pop(key, 0)
+        self.entries[key] = len(data)
+        self.evict()
+        return data
+
+    def put(self, key: str, data: bytes):
+        tmp = self.file(key).with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, self.file(key))
+
+        self.size += len(data) - self.entries.pop(key, 0)
+        self.entries[key] = len(data)
+        self.evict()
+
+    def evict(self):
+        while self.size > self.max_bytes and len(self.entries) > 1:
+            key = next(iter(self.entries))
+            self.size -= self.entries.pop(key)
+            self.file(key).unlink(missing_ok=True)
+
+    def clear(self):
+        for key in list(self.entries):
+            self.file(key).unlink(missing_ok=True)
+        self.entries.clear()
+        self.size = 0
@@ -0,0 +1,214 @@
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Callable
+from . import ir
+from . import xml_gen as gen
+
+__all__ = ["Cost", "CostReport", "BudgetExceeded", "estimate", "expression_cost"]
+
+# Relative cost of evaluating each block, in instructions. Tags not listed
+# cost DEFAULT_COST. The names are shared by the IR classes and the XML tags.
+COSTS: dict[str, float] = {
+    # structure
+    "Instructions": 0,
+    "Event": 0,
+    "CustomInstruction": 0,
+    # statements
+    "SetVariable": 1,
+    "SetActivationGroup": 1,
+    "If": 1,
+    "For": 1,
+    "While": 1,
+    "Repeat": 1,
+    # expressions
+    "Constant": 0,
+    "Variable": 1,
+    "ActivationGroup": 1,
+    "BinaryOp": 1,
+    "BoolOp": 1,
+    "Comparison": 1,
+    "Not": 1,
+    "Vector": 1,
+    "VectorOp": 1,
+    "VectorOp2": 1,
+}
+DEFAULT_COST = 1
+
+# elements that may contain `If` blocks or loops
+STRUCTURE = frozenset({"Instructions", "If", "For", "Repeat", "While", "Program"})
+
+# assumed chance that an `If` body runs, for the typical estimate
+TAKEN = 0.5
+
+# assumed iterations of a loop whose trip count is not a constant
+ITERATIONS = 10
+
+
+class BudgetExceeded(ValueError):
+    pass
+
+
+@dataclass
+class Cost:
+    worst: float = 0
+    typical: float = 0
+
+    def __add__(self, other: "Cost") -> "Cost":
+        return Cost(self.worst + other.worst, self.typical + other.typical)
+
+
+def number(element: gen.Element) -> float | None:
+    if element.tag == "Constant" and "number" in element.attrib:
+        return float(element.get("number"))
+    return None
+
+
+def trip_count(loop: gen.Element) -> float:
+    match loop.tag, [number(e) for e in loop[:-1]]:
+        case "Repeat", [float(n)]:
+            return max(n, 0)
+        case "For", [float(start), float(end), float(step)]:
+            return max((end - start) // step + 1, 0)
+    return ITERATIONS
+
+
+def flat_cost(element: gen.Element, costs: dict[str, float] = COSTS) -> float:
+    """Cost of a subtree without `If` or loops, such as an expression"""
+    get = costs.get
+    return sum(get(e.tag, DEFAULT_COST) for e in element.iter())
+
+
+def estimate(
+    element: gen.Element,
+    costs: dict[str, float] = COSTS,
+    calls: Callable[[str], Cost] | None = None,
+) -> Cost:
+    """
+    Instructions needed to run `element`. For the worst case every `If` body
+    is taken; for the typical case each is taken with probability `TAKEN`.
+    Loop bodies count once per iteration, assuming `ITERATIONS` when the trip
+    count is not constant. `calls` gives the cost of running each custom
+    instruction that is called.
+    """
+    cost = Cost()
+    # (element, times it runs in the worst case, typical case)
+    stack = [(element, 1.0, 1.0)]
+    while stack:
+        node, worst, typical = stack.pop()
+        tag = node.tag
+        # only instruction lists and blocks can hold `If` and loops; anything
+        # else is summed in one pass
+        if tag not in STRUCTURE:
+            c = flat_cost(node, costs)
+            cost.worst += c * worst
+            cost.typical += c * typical
+            if tag == "CallCustomInstruction" and calls is not None:
+                callee = calls(node.get("call"))
+                cost.worst += callee.worst * worst
+                cost.typical += callee.typical * typical
+            continue
+
+        c = costs.get(tag, DEFAULT_COST)
+        cost.worst += c * worst
+        cost.typical += c * typical
+        match tag:
+            case "If":
+                test, body = node
+                stack.append((test, worst, typical))
+                stack.append((body, worst, typical * TAKEN))
+            case "For" | "Repeat" | "While":
+                *header, body = node
+                n = trip_count(node)
+                # a `while` test runs before every iteration and once more to
+                # end the loop; the other headers run once
+                k = n + 1 if tag == "While" else 1
+                stack.extend((e, worst * k, typical * k) for e in header)
+                stack.append((body, worst * n, typical * n))
+            case _:
+                stack.extend((child, worst, typical) for child in node)
+    return cost
+
+
+def expression_cost(expr: ir.Expr, costs: dict[str, float] = COSTS) -> float:
+    """Instructions needed to evaluate an IR expression"""
+    return sum(costs.get(type(node).__name__, DEFAULT_COST) for node in ir.walk(expr))
+
+
+@dataclass
+class CostReport:
+    """
+    Estimated cost of every thread, and of each trigger as the sum of the
+    threads it starts. With a `budget`, adding a thread that takes its
+    trigger's worst case over it raises `BudgetExceeded`.
+
+    A call to a custom instruction costs as much as running its thread,
+    which `definition` provides by name.
+    """
+
+    budget: float | None = None
+    definition: Callable[[str], gen.Element] | None = None
+    # trigger -> handler -> cost
+    threads: dict[str, dict[str, Cost]] = field(
+        default_factory=lambda: defaultdict(dict)
+    )
+    # custom instruction -> cost of one call
+    instructions: dict[str, Cost] = field(default_factory=dict)
+
+    def add(self, trigger: str, handler: str, thread: gen.Element) -> Cost:
+        cost = self.threads[trigger][handler] = estimate(thread, calls=self.call)
+        if self.budget is not None:
+            total = self.trigger(trigger)
+            if total.worst > self.budget:
+                raise BudgetExceeded(
+                    f"Handlers of {trigger} take up to {total.worst:g} instructions "
+                    f"(budget {self.budget:g}); {handler} alone takes {cost.worst:g}"
+                )
+        return cost
+
+    def call(self, name: str) -> Cost:
+        """
+        Cost of one call to the custom instruction `name`. An instruction
+        that can call itself is assumed to recurse `ITERATIONS` deep, like a
+        loop whose trip count is not constant.
+        """
+        return self.__call(name, frozenset())[0]
+
+    def __call(self, name: str, active: frozenset[str]) -> tuple[Cost, set[str]]:
+        # also returns the instructions in `active`, which are being costed,
+        # that `name` calls back into; the cost excludes those calls, so it is
+        # only kept once the outermost of them is done
+        if name in self.instructions:
+            return self.instructions[name], set()
+        if name in active or self.definition is None:
+            return Cost(), {name} & active
+
+        reentered: set[str] = set()
+
+        def calls(callee: str) -> Cost:
+            cost, callers = self.__call(callee, active | {name})
+            reentered.update(callers)
+            return cost
+
+        cost = estimate(self.definition(name), calls=calls)
+        if name in reentered:
+            reentered.remove(name)
+            cost = Cost(cost.worst * ITERATIONS, cost.typical * ITERATIONS)
+        if not reentered:
+            self.instructions[name] = cost
+        return cost, reentered
+
+    def trigger(self, trigger: str) -> Cost:
+        return sum(self.threads[trigger].values(), Cost())
+
+    def as_dict(self) -> dict:
+        return {
+            trigger: {
+                "worst": self.trigger(trigger).worst,
+                "typical": self.trigger(trigger).typical,
+                "threads": {
+                    name: {"worst": c.worst, "typical": c.typical}
+                    for name, c in handlers.items()
+                },
+            }
+            for trigger, handlers in self.threads.items()
+        }
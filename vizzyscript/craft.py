@@ -0,0 +1,184 @@
+"""
+Replace the Vizzy program of a part in craft XML files with a compiled one.
+
+    python -m vizzyscript.craft autopilot.py crafts/ --part 1
+
+The old `<Program>` element is found by a byte scan over the memory-mapped
+file, without parsing the craft, and every byte outside it is copied
+through unchanged.
+"""
+
+import argparse
+import io
+import mmap
+import os
+import re
+import shutil
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, fields
+from functools import partial
+from pathlib import Path
+from . import Options, Parser
+from .__main__ import option_flags
+
+__all__ = ["compile_program", "program_span", "inject", "inject_all"]
+
+PROGRAM_START = re.compile(rb"<Program\b[^>]*?(/?)>")
+PROGRAM_END = re.compile(rb"</Program\s*>")
+PART_END = re.compile(rb"</Part\s*>")
+
+
+@dataclass
+class Injection:
+    craft: Path
+    replaced: int = 0
+    error: str | None = None
+
+
+def compile_program(
+    name: str, src: str, options: Options | None = None, space: str | None = "  "
+) -> bytes:
+    """The `<Program>` element compiled from `src`, without an XML declaration"""
+    out = io.BytesIO()
+    Parser(name, src, options).write(out, space=space, xml_declaration=False)
+    return out.getvalue()
+
+
+def program_span(data: bytes | mmap.mmap, part: str | None = None) -> tuple[int, int]:
+    """
+    Byte range of the `<Program>` element in the part with id `part`, or of
+    the first one in the file
+    """
+    start, stop = 0, len(data)
+    if part is not None:
+        pattern = rb'<Part\b[^>]*?\sid="' + re.escape(part.encode()) + rb'"[^>]*?(/?)>'
+        found = re.search(pattern, data)
+        if found is None:
+            raise ValueError(f"No part with id {part}")
+        if found.group(1):
+            raise ValueError(f"Part {part} has no program")
+        start = found.end()
+        end = PART_END.search(data, start)
+        stop = end.start() if end is not None else stop
+
+    program = PROGRAM_START.search(data, start, stop)
+    if program is None:
+        where = f"part {part}" if part is not None else "the craft"
+        raise ValueError(f"No <Program> in {where}")
+    if program.group(1):
+        return program.start(), program.end()
+
+    end = PROGRAM_END.search(data, program.end(), stop)
+    if end is None:
+        raise ValueError("Unterminated <Program> element")
+    return program.start(), end.end()
+
+
+def indentation(data: bytes | mmap.mmap, start: int) -> bytes:
+    """Whitespace before `start` on its line, if nothing else precedes it"""
+    line = data.rfind(b"\n", 0, start) + 1
+    prefix = data[line:start]
+    return prefix if not prefix.strip() else b""
+
+
+def inject(craft: Path, program: bytes, part: str | None = None) -> int:
+    """
+    Replace the program of `part` in `craft` with `program`, indented to
+    match the element it replaces, and return the number of bytes replaced.
+    The file is rewritten atomically.
+    """
+    tmp = craft.with_suffix(f".{os.getpid()}.tmp")
+    try:
+        with (
+            open(craft, "rb") as f,
+            mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data,
+        ):
+            start, end = program_span(data, part)
+            indent = indentation(data, start)
+            with memoryview(data) as view, open(tmp, "wb") as out:
+                out.write(view[:start])
+                out.write(program.replace(b"\n", b"\n" + indent))
+                out.write(view[end:])
+
+        shutil.copymode(craft, tmp)
+        os.replace(tmp, craft)
+    finally:
+        # only left behind if the craft was not replaced
+        tmp.unlink(missing_ok=True)
+    return end - start
+
+
+def inject_file(craft: Path, program: bytes, part: str | None) -> Injection:
+    result = Injection(craft)
+    try:
+        result.replaced = inject(craft, program, part)
+    except Exception as e:
+        # one bad craft should not stop the others
+        result.error = f"{type(e).__name__}: {e}"
+    return result
+
+
+def find_crafts(inputs: list[Path]) -> list[Path]:
+    crafts = []
+    for path in inputs:
+        crafts.extend(sorted(path.rglob("*.xml")) if path.is_dir() else [path])
+    return crafts
+
+
+def inject_all(
+    crafts: list[Path], program: bytes, part: str | None = None, jobs: int = 1
+) -> list[Injection]:
+    """Inject `program` into every craft, in `jobs` processes"""
+    inject_one = partial(inject_file, program=program, part=part)
+    if jobs > 1 and len(crafts) > 1:
+        with ProcessPoolExecutor(jobs) as pool:
+            return list(pool.map(inject_one, crafts, chunksize=4))
+    return list(map(inject_one, crafts))
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m vizzyscript.craft",
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("source", type=Path, help="VizzyScript file")
+    parser.add_argument("crafts", nargs="+", type=Path, help="files or directories")
+    parser.add_argument("--part", help="id of the part (default: the first program)")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--minify", action="store_true", help="omit indentation")
+    option_flags(parser)
+    args = parser.parse_args(argv)
+
+    options = Options(
+        **{
+            f.name: getattr(args, f.name)
+            for f in fields(Options)
+            if hasattr(args, f.name)
+        }
+    )
+    try:
+        program = compile_program(
+            args.source.stem,
+            args.source.read_text(),
+            options,
+            None if args.minify else "  ",
+        )
+    except (SyntaxError, ValueError, OSError) as e:
+        print(f"{args.source}: {type(e).__name__}: {e}", file=sys.stderr)
+        return 1
+
+    results = inject_all(find_crafts(args.crafts), program, args.part, args.jobs)
+    failed = 0
+    for result in results:
+        if result.error is not None:
+            failed += 1
+            print(f"{result.craft}: {result.error}", file=sys.stderr)
+
+    print(f"injected {args.source} into {len(results) - failed}/{len(results)} crafts")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,475 @@
+"""
+Decompile Vizzy XML programs, or the first program in craft files, to
+VizzyScript.
+
+    python -m vizzyscript.decompile programs/ -o src/
+
+The XML is streamed: each thread is written out and freed as soon as it
+has been read, so memory use is bounded by the largest thread.
+"""
+
+import argparse
+import ast
+import keyword
+import os
+import re
+import sys
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO, Iterable, TextIO
+
+__all__ = ["Decompiler", "decompile"]
+
+# Python operator precedence, as `ast.unparse` uses it: an operand is
+# parenthesised if its own precedence is lower than its position requires
+TEST, OR, AND, NOT, CMP, ARITH, TERM, ATOM = range(8)
+
+# Vizzy operator -> (Python operator, precedence)
+binary_ops = {
+    "+": ("+", ARITH),
+    "-": ("-", ARITH),
+    "*": ("*", TERM),
+    "/": ("/", TERM),
+    "%": ("%", TERM),
+}
+bool_ops = {"and": ("and", AND), "or": ("or", OR)}
+comparison_ops = {"=": "==", "l": "<", "g": ">", "le": "<=", "ge": ">="}
+
+# `VAR` annotation for each kind of initial value in `<Variables>`
+annotations = {"number": "float", "vector": "Vec", "text": "str", "bool": "bool"}
+
+# unary vector operators written as methods; the others are attributes
+vector_methods = {"length", "norm"}
+vector_components = {"x", "y", "z"}
+
+INDENT = "    "
+
+# fixed activation groups, written as `AG1` to `AG10`
+fixed_ags = set(map(str, range(1, 11)))
+
+
+def unsupported(elem: ET.Element) -> ValueError:
+    style = elem.get("style")
+    return ValueError(f"Unsupported Vizzy block <{elem.tag} style={style!r}>")
+
+
+def identifier(name: str) -> str:
+    if not name.isidentifier() or keyword.iskeyword(name):
+        raise ValueError(f"{name!r} is not a valid Python name")
+    return name
+
+
+def python_name(text: str) -> str:
+    """An identifier made from arbitrary text, e.g. a channel's message"""
+    name = re.sub(r"\W", "_", text)
+    return name if name[:1].isalpha() else "_" + name
+
+
+def number(text: str) -> int | float:
+    try:
+        return int(text)
+    except ValueError:
+        return float(text)
+
+
+def literal(value: int | float | str | bool) -> str:
+    return ast.unparse(ast.Constant(value))
+
+
+def wrap(operand: tuple[str, int], precedence: int) -> str:
+    """The source of an operand in a position needing `precedence`"""
+    source, own = operand
+    return f"({source})" if own < precedence else source
+
+
+def name(id: str) -> ast.Name:
+    return ast.Name(id, ast.Load())
+
+
+def call(func: ast.expr, args: list[ast.expr]) -> ast.Call:
+    return ast.Call(func, args, [])
+
+
+def attribute(value: ast.expr, attr: str) -> ast.Attribute:
+    return ast.Attribute(value, attr, ast.Load())
+
+
+def unparse(node: ast.AST) -> str:
+    return ast.unparse(ast.fix_missing_locations(node))
+
+
+class Decompiler:
+    """
+    Converts the sections of a Vizzy program to VizzyScript, writing each
+    to `out` as soon as it is complete. Channels are declared and linked to
+    their handlers by `finish`.
+
+    Statements and expressions are converted from explicit stacks, so any
+    depth of nesting the compiler emits can be read back.
+    """
+
+    def __init__(self, out: TextIO) -> None:
+        self.out = out
+        self.names: set[str] = set()
+        # message -> channel variable, in order of first use
+        self.channels: dict[str, str] = {}
+        # (channel variable, handler)
+        self.links: list[tuple[str, str]] = []
+        # custom instruction -> its function, named when first called or
+        # defined, so that calls and definition agree
+        self.functions: dict[str, str] = {}
+        out.write("from vizzy_api import *\n")
+
+    def write(self, source: str) -> None:
+        self.out.write("\n\n" + source + "\n")
+
+    def unique(self, base: str) -> str:
+        name, n = base, 1
+        while name in self.names:
+            n += 1
+            name = f"{base}_{n}"
+        self.names.add(name)
+        return name
+
+    def function(self, instruction: str) -> str:
+        if instruction not in self.functions:
+            self.functions[instruction] = self.unique(identifier(instruction))
+        return self.functions[instruction]
+
+    def section(self, elem: ET.Element) -> None:
+        match elem.tag:
+            case "Variables":
+                self.variables(elem)
+            case "Instructions":
+                self.thread(elem)
+
+    def variables(self, elem: ET.Element) -> None:
+        fields: list[ast.stmt] = []
+        for var in elem:
+            kind = next((k for k in annotations if k in var.attrib), "number")
+            annotation = "list" if len(var) else annotations[kind]
+            target = ast.Name(identifier(var.get("name")), ast.Store())
+            fields.append(ast.AnnAssign(target, name(annotation), None, 1))
+        if fields:
+            self.write(unparse(ast.ClassDef("VAR", [], [], fields, [], [])))
+
+    def thread(self, elem: ET.Element) -> None:
+        header, *body = elem
+        # converted first, so the custom instructions it calls keep their
+        # names and the handler's name avoids them
+        lines = self.block(body, 1)
+        match header.tag, header.get("style"):
+            case "Event", "receive-msg":
+                msg = header[0].get("text")
+                if msg not in self.channels:
+                    self.channels[msg] = self.unique(python_name(msg) + "_channel")
+                channel = self.channels[msg]
+                handler = self.unique("on_" + python_name(msg))
+                self.links.append((channel, handler))
+                self.write(f"def {handler}():\n" + "\n".join(lines))
+
+            case "CustomInstruction", _:
+                fn = self.function(header.get("name"))
+                params = re.findall(r"\|([^|]*)\|", header.get("format", ""))
+                args = ", ".join(map(identifier, params))
+                self.write(f"def {fn}({args}):\n" + "\n".join(lines))
+
+            case _:
+                raise unsupported(header)
+
+    def finish(self) -> None:
+        if not self.links:
+            return
+        lines = []
+        for msg, channel in self.channels.items():
+            target = ast.Name(channel, ast.Store())
+            channel_type = call(name("DatalessChannel"), [ast.Constant(msg)])
+            lines.append(unparse(ast.Assign([target], channel_type)))
+        lines.append("")
+        for channel, handler in self.links:
+            receive = call(attribute(name(channel), "receive"), [name(handler)])
+            lines.append(ast.unparse(receive))
+        self.out.write("\n\n" + "\n".join(lines) + "\n")
+
+    def block(self, statements: Iterable[ET.Element], depth: int) -> list[str]:
+        """Source lines of `statements`, indented `depth` levels"""
+        lines: list[str] = []
+        stack = [(s, depth) for s in reversed(list(statements))]
+        if not stack:
+            lines.append(INDENT * depth + "pass")
+        while stack:
+            elem, depth = stack.pop()
+            line, body = self.statement(elem)
+            lines.append(INDENT * depth + line)
+            if body is not None:
+                if len(body) == 0:
+                    lines.append(INDENT * (depth + 1) + "pass")
+                stack.extend((s, depth + 1) for s in reversed(body))
+        return lines
+
+    def statement(self, elem: ET.Element) -> tuple[str, ET.Element | None]:
+        """The first line of a statement, and the block it contains if any"""
+        match elem.tag:
+            case "SetVariable":
+                var, value = elem
+                return f"{self.expr(var)} = {self.expr(value)}", None
+
+            case "SetActivationGroup":
+                ag, value = elem
+                return f"AG.set({self.expr(ag)}, {self.expr(value)})", None
+
+            case "If":
+                test, body = elem
+                return f"if {self.expr(test)}:", body
+
+            case "While":
+                test, body = elem
+                return f"while {self.expr(test)}:", body
+
+            case "Repeat":
+                count, body = elem
+                return f"for _ in range({self.expr(count)}):", body
+
+            case "For":
+                start, end, step, body = elem
+                var = identifier(elem.get("var"))
+                args = ", ".join(self.range_args(start, end, step))
+                return f"for {var} in range({args}):", body
+
+            case "CallCustomInstruction":
+                fn = self.function(elem.get("call"))
+                args = ", ".join(self.expr(arg) for arg in elem)
+                return f"{fn}({args})", None
+
+        raise unsupported(elem)
+
+    def range_args(
+        self, start: ET.Element, end: ET.Element, step: ET.Element
+    ) -> list[str]:
+        """`range()` arguments for Vizzy's `for`, which includes its end"""
+        if step.tag != "Constant" or "number" not in step.attrib:
+            raise ValueError("Only `for` loops with a constant step are supported")
+        s = number(step.get("number"))
+        delta, inverse = (1, "-") if s > 0 else (-1, "+")
+
+        match end.tag, end.get("op"), list(end):
+            case "Constant", _, _ if "number" in end.attrib:
+                stop = literal(number(end.get("number")) + delta)
+            case "BinaryOp", op, [left, one] if op == inverse and (
+                one.get("number") == "1"
+            ):
+                # written by `range(x)` as `x - 1`
+                stop = self.expr(left)
+            case _:
+                op = "+" if delta > 0 else "-"
+                stop = f"{wrap(self.operand(end), ARITH)} {op} 1"
+
+        if s != 1:
+            return [self.expr(start), stop, literal(s)]
+        if start.tag == "Constant" and start.get("number") == "0":
+            return [stop]
+        return [self.expr(start), stop]
+
+    def expr(self, elem: ET.Element) -> str:
+        return self.operand(elem)[0]
+
+    def operand(self, root: ET.Element) -> tuple[str, int]:
+        """The source of an expression, and the precedence of its operator"""
+        stack: list[ET.Element | tuple[ET.Element, int]] = [root]
+        results: list[tuple[str, int]] = []
+
+        while stack:
+            item = stack.pop()
+
+            if type(item) is tuple:
+                elem, n = item
+                operands = results[-n:]
+                del results[-n:]
+                results.append(self.combine(elem, operands))
+                continue
+
+            if item.tag in ("Constant", "Variable") or (
+                item.tag == "ActivationGroup" and self.fixed_ag(item)
+            ):
+                results.append(self.combine(item, []))
+                continue
+
+            stack.append((item, len(item)))
+            stack.extend(reversed(item))
+
+        return results[0]
+
+    def fixed_ag(self, elem: ET.Element) -> bool:
+        (n,) = elem
+        return n.tag == "Constant" and n.get("number") in fixed_ags
+
+    def combine(
+        self, elem: ET.Element, operands: list[tuple[str, int]]
+    ) -> tuple[str, int]:
+        """The source of `elem`, given the source of each of its operands"""
+        match elem.tag, operands:
+            case "Constant", []:
+                return self.constant(elem), ATOM
+
+            case "Variable", [] if elem.get("list") != "true":
+                var = identifier(elem.get("variableName"))
+                return (var if elem.get("local") == "true" else f"VAR.{var}"), ATOM
+
+            case "ActivationGroup", []:
+                return "AG" + elem[0].get("number"), ATOM
+
+            case "ActivationGroup", [n]:
+                return f"AG({n[0]})", ATOM
+
+            case "BinaryOp", [left, right] if elem.get("op") in binary_ops:
+                op, own = binary_ops[elem.get("op")]
+                return f"{wrap(left, own)} {op} {wrap(right, own + 1)}", own
+
+            case "BoolOp", [_, *_] if elem.get("op") in bool_ops:
+                op, own = bool_ops[elem.get("op")]
+                # as `ast.unparse` does, each operand needs a higher precedence
+                # than the one before
+                parts = (wrap(x, own + 1 + i) for i, x in enumerate(operands))
+                return f" {op} ".join(parts), own
+
+            case "Comparison", [left, right] if elem.get("op") in comparison_ops:
+                op = comparison_ops[elem.get("op")]
+                return f"{wrap(left, CMP + 1)} {op} {wrap(right, CMP + 1)}", CMP
+
+            case "Not", [inner]:
+                return f"not {wrap(inner, NOT)}", NOT
+
+            case "Vector", [_, _, _]:
+                return f"Vec({', '.join(x for x, _ in operands)})", ATOM
+
+            case "VectorOp", [inner] if elem.get("style") == "vec-op-1":
+                op = elem.get("op")
+                if op in vector_methods:
+                    return f"{wrap(inner, ATOM)}.{op}()", ATOM
+                if op in vector_components:
+                    return f"{wrap(inner, ATOM)}.{op}", ATOM
+
+            case "VectorOp", [left, right] if elem.get("style") == "vec-op-2":
+                fn = identifier(elem.get("op"))
+                return f"VectorMath.{fn}({left[0]}, {right[0]})", ATOM
+
+        raise unsupported(elem)
+
+    def constant(self, elem: ET.Element) -> str:
+        attrs = elem.attrib
+        if "number" in attrs:
+            return literal(number(attrs["number"]))
+        if "text" in attrs:
+            return literal(attrs["text"])
+        if "bool" in attrs:
+            return literal(attrs["bool"] == "true")
+        if "vector" in attrs:
+            parts = attrs["vector"].strip("()").split(",")
+            return f"Vec({', '.join(literal(number(p)) for p in parts)})"
+        raise unsupported(elem)
+
+
+def decompile(source: str | Path | BinaryIO, out: TextIO) -> str | None:
+    """
+    Stream the first Vizzy `<Program>` in `source`, a program or craft file,
+    to `out` as VizzyScript, and return the program's name, or `None` if
+    there is no program.
+    """
+    decompiler = Decompiler(out)
+    program: ET.Element | None = None
+    depth = 0
+    for event, elem in ET.iterparse(source, events=("start", "end")):
+        if event == "start":
+            depth += 1
+            if program is None and elem.tag == "Program":
+                program, program_depth = elem, depth
+            continue
+
+        depth -= 1
+        if program is None:
+            # the rest of a craft before its program is not needed
+            elem.clear()
+        elif elem is program:
+            decompiler.finish()
+            return program.get("name")
+        elif depth == program_depth:
+            decompiler.section(elem)
+            program.remove(elem)
+    return None
+
+
+@dataclass
+class Result:
+    source: Path
+    error: str | None = None
+
+
+def decompile_file(source: Path, output: Path) -> Result:
+    result = Result(source)
+    try:
+        output.parent.mkdir(parents=True, exist_ok=True)
+        with open(output, "w") as out:
+            if decompile(source, out) is None:
+                raise ValueError("no <Program> element")
+    except Exception as e:
+        # recorded rather than raised, so one file cannot stop the batch
+        result.error = f"{type(e).__name__}: {e}"
+        output.unlink(missing_ok=True)
+    return result
+
+
+def find_programs(inputs: list[Path], output: Path | None) -> list[tuple[Path, Path]]:
+    """(program, output) pairs in a stable order"""
+    pairs = []
+    for path in inputs:
+        if path.is_dir():
+            for source in sorted(path.rglob("*.xml")):
+                rel = source.relative_to(path).with_suffix(".py")
+                pairs.append((source, (output or path) / rel))
+        else:
+            out = (output or path.parent) / path.with_suffix(".py").name
+            pairs.append((path, out))
+    return pairs
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m vizzyscript.decompile",
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("inputs", nargs="+", type=Path, help="files or directories")
+    parser.add_argument(
+        "-o", "--output", type=Path, help="output directory (default: beside input)"
+    )
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args(argv)
+
+    pairs = find_programs(args.inputs, args.output)
+    sources, outputs = [s for s, _ in pairs], [o for _, o in pairs]
+    start = time.perf_counter()
+    if args.jobs > 1 and len(sources) > 1:
+        with ProcessPoolExecutor(args.jobs) as pool:
+            results = list(pool.map(decompile_file, sources, outputs, chunksize=16))
+    else:
+        results = list(map(decompile_file, sources, outputs))
+    elapsed = time.perf_counter() - start
+
+    failed = 0
+    for result in results:
+        if result.error is not None:
+            failed += 1
+            print(f"{result.source}: {result.error}", file=sys.stderr)
+
+    print(
+        f"decompiled {len(results) - failed}/{len(results)} files "
+        f"in {elapsed:.2f} s ({len(results) / max(elapsed, 1e-9):,.1f} files/s)"
+    )
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,179 @@
+import ast
+from collections import Counter
+from itertools import count
+from typing import TYPE_CHECKING, Iterable
+
+if TYPE_CHECKING:
+    from . import Function
+
+__all__ = ["Inliner"]
+
+
+def copy_node(node: ast.AST) -> ast.AST:
+    new = type(node)()
+    for attr in node._attributes:
+        if hasattr(node, attr):
+            setattr(new, attr, getattr(node, attr))
+    return new
+
+
+def renamed_copy(root: ast.AST, names: dict[str, str]) -> ast.AST:
+    """
+    Deep copy of `root` with every `ast.Name` in `names` renamed. Iterative,
+    unlike `copy.deepcopy`, so expressions of any depth can be copied.
+    """
+    new_root = copy_node(root)
+    stack = [(root, new_root)]
+    while stack:
+        src, dst = stack.pop()
+        for name, value in ast.iter_fields(src):
+            if isinstance(value, list):
+                items = []
+                for item in value:
+                    if isinstance(item, ast.AST):
+                        new = copy_node(item)
+                        stack.append((item, new))
+                        item = new
+                    items.append(item)
+                value = items
+            elif isinstance(value, ast.AST):
+                new = copy_node(value)
+                stack.append((value, new))
+                value = new
+            setattr(dst, name, value)
+
+        if isinstance(dst, ast.Name) and dst.id in names:
+            dst.id = names[dst.id]
+    return new_root
+
+
+def call_of(stmt: ast.stmt) -> ast.Call | None:
+    match stmt:
+        case ast.Expr(value=ast.Call(func=ast.Name()) as call):
+            return call
+    return None
+
+
+def statement_count(f: "Function") -> int:
+    return sum(isinstance(node, ast.stmt) for node in ast.walk(f.source)) - 1
+
+
+class Inliner:
+    """
+    Expands calls to the helper functions that are not linked to a trigger.
+
+    A helper of at most `threshold` statements that cannot reach itself is
+    inlined: arguments are assigned to local temporaries named
+    `__{helper}{n}_{param}`, and the body follows with its locals renamed
+    the same way. Calls to any other helper stay calls, and the helper is
+    emitted once as a Vizzy custom instruction.
+
+    The calls in a helper are only checked once it is found to be reachable,
+    so helpers that are never run may call anything.
+    """
+
+    def __init__(
+        self, helpers: dict[str, "Function"], threshold: int, report: Counter[str]
+    ) -> None:
+        self.helpers = helpers
+        self.threshold = threshold
+        self.report = report
+        self.calls = {
+            name: [call for call in map(call_of, ast.walk(f.source)) if call]
+            for name, f in helpers.items()
+        }
+        # helper -> the helpers it calls, once its calls are checked
+        self.checked: dict[str, list[str]] = {}
+        self.inlinable: dict[str, bool] = {}
+        self.temps = count()
+
+    def check(self, call: ast.Call) -> str:
+        name = call.func.id
+        f = self.helpers.get(name)
+        if f is None:
+            raise SyntaxError(f"Call to unknown function:\n{ast.unparse(call)}")
+        if len(call.args) != len(f.params) or call.keywords:
+            raise SyntaxError(
+                f"{name} takes {len(f.params)} positional arguments:\n"
+                f"{ast.unparse(call)}"
+            )
+        return name
+
+    def callees(self, body: Iterable[ast.stmt]) -> list[str]:
+        return [
+            self.check(call)
+            for stmt in body
+            for call in map(call_of, ast.walk(stmt))
+            if call
+        ]
+
+    def called_by(self, name: str) -> list[str]:
+        if name not in self.checked:
+            self.checked[name] = [self.check(call) for call in self.calls[name]]
+        return self.checked[name]
+
+    def reachable(self, names: Iterable[str]) -> set[str]:
+        """Helpers called, directly or not, by the helpers in `names`"""
+        seen: set[str] = set()
+        stack = [callee for name in names for callee in self.called_by(name)]
+        while stack:
+            name = stack.pop()
+            if name not in seen:
+                seen.add(name)
+                stack.extend(self.called_by(name))
+        return seen
+
+    def is_inlinable(self, name: str) -> bool:
+        if name not in self.inlinable:
+            short = statement_count(self.helpers[name]) <= self.threshold
+            self.inlinable[name] = short and name not in self.reachable([name])
+        return self.inlinable[name]
+
+    def dependencies(self, f: "Function") -> list[str]:
+        """Every helper `f` may run, in a stable order"""
+        called = self.callees(f.source.body)
+        return sorted(set(called) | self.reachable(called))
+
+    def custom_instructions(self, roots: list["Function"]) -> list["Function"]:
+        """Helpers reachable from `roots` that must be custom instructions"""
+        used = set()
+        for f in roots:
+            used.update(self.dependencies(f))
+        return [
+            f
+            for name, f in self.helpers.items()
+            if name in used and not self.is_inlinable(name)
+        ]
+
+    def expand_thread(self, body: list[ast.stmt]) -> list[ast.stmt]:
+        # numbered per thread, so a thread's output does not depend on others
+        self.temps = count()
+        return self.expand(body)
+
+    def expand(self, body: list[ast.stmt]) -> list[ast.stmt]:
+        result: list[ast.stmt] = []
+        for stmt in body:
+            call = call_of(stmt)
+            if call is not None and self.is_inlinable(self.check(call)):
+                result.extend(self.inline(self.helpers[call.func.id], call.args))
+            elif isinstance(stmt, ast.If | ast.For | ast.While):
+                new = copy_node(stmt)
+                for name, value in ast.iter_fields(stmt):
+                    setattr(new, name, value)
+                new.body = self.expand(stmt.body)
+                result.append(new)
+            else:
+                result.append(stmt)
+        return result
+
+    def inline(self, f: "Function", args: list[ast.expr]) -> list[ast.stmt]:
+        n = next(self.temps)
+        names = {name: f"__{f.name}{n}_{name}" for name in f.local_names()}
+        self.report["inline.calls"] += 1
+
+        body: list[ast.stmt] = [
+            ast.Assign([ast.Name(names[param], ast.Store())], arg)
+            for param, arg in zip(f.params, args)
+        ]
+        body += (renamed_copy(stmt, names) for stmt in f.source.body)
+        return self.expand(body)
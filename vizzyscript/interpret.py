@@ -0,0 +1,389 @@
+"""
+Reference interpreter for the Vizzy programs `Parser` generates, for
+testing them without the game.
+
+    vm = Interpreter.from_source(src)
+    vm.broadcast("launch")
+    assert vm.variables["stage"] == 1
+
+Each thread is compiled once into a tree of closures, so a handler can be
+run many times cheaply. Values are floats, bools, strings and `(x, y, z)`
+tuples for vectors.
+"""
+
+import math
+import re
+import xml.etree.ElementTree as ET
+from collections import defaultdict
+from typing import Any, Callable, Iterable, Self
+from . import Options, Parser
+
+__all__ = ["Interpreter", "LoopLimitExceeded"]
+
+type Frame = dict[str, Any]
+type Eval = Callable[[Frame], Any]
+type Run = Callable[[Frame], None]
+
+# iterations of one loop after which the program is assumed not to end
+LOOP_LIMIT = 1_000_000
+
+
+class LoopLimitExceeded(RuntimeError):
+    pass
+
+
+def div(a: float, b: float) -> float:
+    # IEEE 754 division, as in Vizzy, rather than ZeroDivisionError
+    if b:
+        return a / b
+    if a == 0 or math.isnan(a):
+        return math.nan
+    return math.copysign(math.inf, a) * math.copysign(1, b)
+
+
+def mod(a: float, b: float) -> float:
+    # NaN for a zero divisor or an infinite dividend, rather than ValueError
+    if not b or math.isinf(a):
+        return math.nan
+    return math.fmod(a, b)
+
+
+def vectorised(fn: Callable[[float, float], float]) -> Callable[[Any, Any], Any]:
+    """`fn` extended to vectors, component-wise or with a number"""
+
+    def apply(a: Any, b: Any) -> Any:
+        match a, b:
+            case tuple(), tuple():
+                return tuple(map(fn, a, b))
+            case tuple(), _:
+                return tuple(fn(x, b) for x in a)
+            case _, tuple():
+                return tuple(fn(a, y) for y in b)
+        return fn(a, b)
+
+    return apply
+
+
+binary_ops: dict[str, Callable[[Any, Any], Any]] = {
+    "+": vectorised(lambda a, b: a + b),
+    "-": vectorised(lambda a, b: a - b),
+    "*": vectorised(lambda a, b: a * b),
+    "/": vectorised(div),
+    "%": mod,
+    "=": lambda a, b: a == b,
+    "l": lambda a, b: a < b,
+    "g": lambda a, b: a > b,
+    "le": lambda a, b: a <= b,
+    "ge": lambda a, b: a >= b,
+}
+
+
+# Vector operators are implemented here rather than shared with the
+# constant folder, so that the interpreter can check its results.
+
+
+def length(v: tuple) -> float:
+    return math.sqrt(dot(v, v))
+
+
+def norm(v: tuple) -> tuple:
+    # Vizzy leaves the zero vector as it is
+    n = length(v)
+    return (v[0] / n, v[1] / n, v[2] / n) if n else v
+
+
+def dot(a: tuple, b: tuple) -> float:
+    return a[0] * b[0] + a[1] * b[1] + a[2] * b[2]
+
+
+def cross(a: tuple, b: tuple) -> tuple:
+    return (
+        a[1] * b[2] - a[2] * b[1],
+        a[2] * b[0] - a[0] * b[2],
+        a[0] * b[1] - a[1] * b[0],
+    )
+
+
+def dist(a: tuple, b: tuple) -> float:
+    return length((a[0] - b[0], a[1] - b[1], a[2] - b[2]))
+
+
+def angle(a: tuple, b: tuple) -> float:
+    lengths = length(a) * length(b)
+    if not lengths:
+        return 0.0
+    cos = dot(a, b) / lengths
+    return math.degrees(math.acos(max(-1.0, min(1.0, cos))))
+
+
+def project(a: tuple, b: tuple) -> tuple:
+    square = dot(b, b)
+    if not square:
+        return (0.0, 0.0, 0.0)
+    k = dot(a, b) / square
+    return (k * b[0], k * b[1], k * b[2])
+
+
+def clamp(a: tuple, b: tuple) -> tuple:
+    # the length of `a` limited to the length of `b`
+    n, limit = length(a), length(b)
+    return tuple(x * limit / n for x in a) if n > limit else a
+
+
+unary_vector_ops: dict[str, Callable[[tuple], Any]] = {
+    "length": length,
+    "norm": norm,
+    "x": lambda v: v[0],
+    "y": lambda v: v[1],
+    "z": lambda v: v[2],
+}
+
+binary_vector_ops: dict[str, Callable[[tuple, tuple], Any]] = {
+    "dot": dot,
+    "cross": cross,
+    "dist": dist,
+    "scale": vectorised(lambda a, b: a * b),
+    "min": vectorised(min),
+    "max": vectorised(max),
+    "angle": angle,
+    "project": project,
+    "clamp": clamp,
+}
+
+
+def number(text: str) -> float:
+    return float(text)
+
+
+def constant(elem: ET.Element) -> Any:
+    attrs = elem.attrib
+    if "number" in attrs:
+        return number(attrs["number"])
+    if "bool" in attrs:
+        return attrs["bool"] == "true"
+    if "vector" in attrs:
+        return tuple(map(number, attrs["vector"].strip("()").split(",")))
+    if "text" in attrs:
+        return attrs["text"]
+    raise ValueError(f"Unsupported constant {attrs}")
+
+
+def sequence(statements: list[Run]) -> Run:
+    match statements:
+        case []:
+            return lambda frame: None
+        case [only]:
+            return only
+
+    def run(frame: Frame) -> None:
+        for statement in statements:
+            statement(frame)
+
+    return run
+
+
+class Interpreter:
+    """
+    Runs the threads of loaded Vizzy programs: `broadcast` runs every
+    handler of a message to completion, in the order they were loaded, and
+    `call` runs a custom instruction.
+
+    Threads run one at a time rather than interleaved frame by frame, so a
+    `while` loop waiting for another thread never ends; after `loop_limit`
+    iterations of one loop `LoopLimitExceeded` is raised.
+    """
+
+    def __init__(self, loop_limit: int = LOOP_LIMIT) -> None:
+        self.loop_limit = loop_limit
+        self.variables: dict[str, Any] = {}
+        self.ags: defaultdict[int, bool] = defaultdict(bool)
+        self.handlers: defaultdict[str, list[Run]] = defaultdict(list)
+        self.custom: dict[str, tuple[list[str], Run]] = {}
+
+    @classmethod
+    def from_source(
+        cls, src: str, options: Options | None = None, loop_limit: int = LOOP_LIMIT
+    ) -> Self:
+        """Compile VizzyScript `src` with `Parser` and load the result"""
+        parser = Parser("interpreted", src, options)
+        vm = cls(loop_limit)
+        vm.load(parser.root)
+        vm.load_all(parser.iter_threads())
+        return vm
+
+    def load_all(self, elements: Iterable[ET.Element]) -> None:
+        for elem in elements:
+            self.load(elem)
+
+    def load(self, elem: ET.Element) -> None:
+        """Load a `Program`, its `Variables`, or one thread"""
+        match elem.tag:
+            case "Program":
+                self.load_all(elem)
+            case "Variables":
+                for var in elem:
+                    value = constant(var) if len(var.attrib) > 1 else 0.0
+                    self.variables.setdefault(var.get("name"), value)
+            case "Instructions":
+                self.load_thread(elem)
+
+    def load_thread(self, elem: ET.Element) -> None:
+        header, *body = elem
+        run = self.block(body)
+        match header.tag, header.get("style"):
+            case "Event", "receive-msg":
+                self.handlers[header[0].get("text")].append(run)
+            case "CustomInstruction", _:
+                params = re.findall(r"\|([^|]*)\|", header.get("format", ""))
+                self.custom[header.get("name")] = (params, run)
+            case _:
+                raise ValueError(f"Unsupported thread <{header.tag}>")
+
+    def broadcast(self, msg: str, data: Any = 0.0) -> None:
+        """Run every handler of `msg`, with its `data` local set to `data`"""
+        for handler in self.handlers.get(msg, ()):
+            handler({"data": data})
+
+    def call(self, name: str, *args: Any) -> None:
+        params, run = self.custom[name]
+        run(dict(zip(params, args)))
+
+    def block(self, elements: Iterable[ET.Element]) -> Run:
+        return sequence([self.statement(e) for e in elements])
+
+    def statement(self, elem: ET.Element) -> Run:
+        match elem.tag:
+            case "SetVariable":
+                target, value = elem
+                name, expr = target.get("variableName"), self.expr(value)
+                if target.get("local") == "true":
+
+                    def run(frame: Frame) -> None:
+                        frame[name] = expr(frame)
+
+                else:
+                    variables = self.variables
+
+                    def run(frame: Frame) -> None:
+                        variables[name] = expr(frame)
+
+                return run
+
+            case "SetActivationGroup":
+                ag, value = map(self.expr, elem)
+                ags = self.ags
+
+                def run(frame: Frame) -> None:
+                    ags[int(ag(frame))] = bool(value(frame))
+
+                return run
+
+            case "If":
+                test, body = self.expr(elem[0]), self.block(elem[1])
+
+                def run(frame: Frame) -> None:
+                    if test(frame):
+                        body(frame)
+
+                return run
+
+            case "While":
+                test, body = self.expr(elem[0]), self.block(elem[1])
+                limit = self.loop_limit
+
+                def run(frame: Frame) -> None:
+                    n = 0
+                    while test(frame):
+                        n += 1
+                        if n > limit:
+                            raise LoopLimitExceeded(f"while loop ran {limit} times")
+                        body(frame)
+
+                return run
+
+            case "Repeat":
+                count, body = self.expr(elem[0]), self.block(elem[1])
+
+                def run(frame: Frame) -> None:
+                    for _ in range(int(count(frame))):
+                        body(frame)
+
+                return run
+
+            case "For":
+                start, end, step = map(self.expr, elem[:3])
+                body, var = self.block(elem[3]), elem.get("var")
+                limit = self.loop_limit
+
+                def run(frame: Frame) -> None:
+                    i, stop, by = start(frame), end(frame), step(frame)
+                    n = 0
+                    while i <= stop if by > 0 else i >= stop:
+                        n += 1
+                        if n > limit:
+                            raise LoopLimitExceeded(f"for loop ran {limit} times")
+                        frame[var] = i
+                        body(frame)
+                        i += by
+
+                return run
+
+            case "CallCustomInstruction":
+                name, args = elem.get("call"), [self.expr(a) for a in elem]
+                custom = self.custom
+
+                def run(frame: Frame) -> None:
+                    # looked up when called, as custom instructions are
+                    # loaded after the threads that call them
+                    params, body = custom[name]
+                    body(dict(zip(params, [a(frame) for a in args])))
+
+                return run
+
+        raise ValueError(f"Unsupported instruction <{elem.tag}>")
+
+    def expr(self, elem: ET.Element) -> Eval:
+        match elem.tag:
+            case "Constant":
+                value = constant(elem)
+                return lambda frame: value
+
+            case "Variable":
+                name = elem.get("variableName")
+                if elem.get("local") == "true":
+                    return lambda frame: frame.get(name, 0.0)
+                variables = self.variables
+                return lambda frame: variables.get(name, 0.0)
+
+            case "ActivationGroup":
+                n, ags = self.expr(elem[0]), self.ags
+                return lambda frame: ags[int(n(frame))]
+
+            case "BinaryOp" | "Comparison":
+                op, (left, right) = binary_ops[elem.get("op")], map(self.expr, elem)
+                return lambda frame: op(left(frame), right(frame))
+
+            case "BoolOp":
+                left, right = map(self.expr, elem)
+                if elem.get("op") == "and":
+                    return lambda frame: bool(left(frame) and right(frame))
+                return lambda frame: bool(left(frame) or right(frame))
+
+            case "Not":
+                inner = self.expr(elem[0])
+                return lambda frame: not inner(frame)
+
+            case "Vector":
+                x, y, z = map(self.expr, elem)
+                return lambda frame: (x(frame), y(frame), z(frame))
+
+            case "VectorOp" if elem.get("style") == "vec-op-1":
+                op, inner = unary_vector_ops[elem.get("op")], self.expr(elem[0])
+                return lambda frame: op(inner(frame))
+
+            case "VectorOp" if elem.get("style") == "vec-op-2":
+                op = binary_vector_ops[elem.get("op")]
+                left, right = map(self.expr, elem)
+                return lambda frame: op(left(frame), right(frame))
+
+        raise ValueError(f"Unsupported expression <{elem.tag}>")
@@ -0,0 +1,11 @@
+"""
+Typed intermediate representation between the Python AST and Vizzy XML.
+
+The matchers emit these nodes, optimisation passes rewrite them, and
+`lower` turns them into `xml_gen` elements as the last step.
+"""
+
+from .common import *
+from .expr import *
+from .statements import *
+from .triggers import *
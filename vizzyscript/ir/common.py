@@ -0,0 +1,75 @@
+from dataclasses import replace
+from typing import Callable, ClassVar, Iterator, Self
+
+
+class Expr:
+    """
+    Base class of IR expressions. Subclasses are slotted dataclasses that list
+    the names of their sub-expression fields in `operand_fields`, which gives
+    passes generic, cheap structural access.
+    """
+
+    __slots__ = ()
+    operand_fields: ClassVar[tuple[str, ...]] = ()
+
+    def operands(self) -> tuple["Expr", ...]:
+        return tuple(getattr(self, name) for name in self.operand_fields)
+
+    def with_operands(self, operands: tuple["Expr", ...] | list["Expr"]) -> Self:
+        return replace(self, **dict(zip(self.operand_fields, operands)))
+
+
+class Stmt:
+    __slots__ = ()
+
+
+def walk(root: Expr) -> Iterator[Expr]:
+    """Pre-order iteration over `root` and all of its sub-expressions"""
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        yield node
+        stack.extend(reversed(node.operands()))
+
+
+def depth(root: Expr) -> int:
+    """Number of nodes on the longest path from `root` to a leaf"""
+    deepest = 0
+    stack = [(root, 1)]
+    while stack:
+        node, d = stack.pop()
+        deepest = max(deepest, d)
+        stack.extend((o, d + 1) for o in node.operands())
+    return deepest
+
+
+def transform(root: Expr, fn: Callable[[Expr], Expr]) -> Expr:
+    """
+    Rebuild `root` bottom-up, calling `fn` on every node once its operands
+    have been transformed. Nodes whose operands are unchanged are passed to
+    `fn` as-is rather than copied.
+    """
+    stack: list[Expr | tuple[Expr, int]] = [root]
+    results: list[Expr] = []
+
+    while stack:
+        item = stack.pop()
+
+        if type(item) is tuple:
+            node, n = item
+            operands = results[-n:]
+            del results[-n:]
+            if any(new is not old for new, old in zip(operands, node.operands())):
+                node = node.with_operands(operands)
+            results.append(fn(node))
+            continue
+
+        operands = item.operands()
+        if not operands:
+            results.append(fn(item))
+            continue
+
+        stack.append((item, len(operands)))
+        stack.extend(reversed(operands))
+
+    return results[0]
@@ -0,0 +1,147 @@
+from dataclasses import dataclass
+from typing import Self, Sequence
+from ..xml_gen.common import reduce_chain
+from .common import Expr
+
+
+@dataclass(slots=True)
+class Constant(Expr):
+    value: int | float | str | bool | tuple[int | float, int | float, int | float]
+    data_type: str
+
+    @classmethod
+    def from_number(cls, x: int | float) -> Self:
+        return cls(x, "number")
+
+    @classmethod
+    def from_text(cls, s: str) -> Self:
+        return cls(s, "text")
+
+    @classmethod
+    def from_vector(cls, x: int | float, y: int | float, z: int | float) -> Self:
+        return cls((x, y, z), "vector")
+
+    @classmethod
+    def from_bool(cls, b: bool) -> Self:
+        return cls(b, "bool")
+
+
+@dataclass(slots=True)
+class Variable(Expr):
+    name: str
+    is_local: bool = False
+    is_list: bool = False
+
+
+@dataclass(slots=True)
+class ActivationGroup(Expr):
+    n: Expr
+    operand_fields = ("n",)
+
+    @classmethod
+    def fixed(cls, n: int) -> Self:
+        return cls(Constant.from_number(n))
+
+
+@dataclass(slots=True)
+class BinaryOp(Expr):
+    # `op` names the matching `xml_gen` constructor, e.g. "add" or "and_"
+    op: str
+    left: Expr
+    right: Expr
+    operand_fields = ("left", "right")
+
+    @classmethod
+    def add(cls, left: Expr, right: Expr) -> Self:
+        return cls("add", left, right)
+
+    @classmethod
+    def sub(cls, left: Expr, right: Expr) -> Self:
+        return cls("sub", left, right)
+
+    @classmethod
+    def mul(cls, left: Expr, right: Expr) -> Self:
+        return cls("mul", left, right)
+
+    @classmethod
+    def div(cls, left: Expr, right: Expr) -> Self:
+        return cls("div", left, right)
+
+    @classmethod
+    def mod(cls, left: Expr, right: Expr) -> Self:
+        return cls("mod", left, right)
+
+    @classmethod
+    def reduce(
+        cls, op: str, operands: Sequence[Expr], *, balanced: bool = False
+    ) -> Expr:
+        """
+        Combine `operands` in order with the associative constructor `op`,
+        see `reduce_chain`
+        """
+        return reduce_chain(getattr(cls, op), operands, balanced=balanced)
+
+
+@dataclass(slots=True)
+class BoolOp(BinaryOp):
+    @classmethod
+    def and_(cls, left: Expr, right: Expr) -> Self:
+        return cls("and_", left, right)
+
+    @classmethod
+    def or_(cls, left: Expr, right: Expr) -> Self:
+        return cls("or_", left, right)
+
+
+@dataclass(slots=True)
+class Comparison(BinaryOp):
+    @classmethod
+    def eq(cls, left: Expr, right: Expr) -> Self:
+        return cls("eq", left, right)
+
+    @classmethod
+    def lt(cls, left: Expr, right: Expr) -> Self:
+        return cls("lt", left, right)
+
+    @classmethod
+    def gt(cls, left: Expr, right: Expr) -> Self:
+        return cls("gt", left, right)
+
+    @classmethod
+    def lte(cls, left: Expr, right: Expr) -> Self:
+        return cls("lte", left, right)
+
+    @classmethod
+    def gte(cls, left: Expr, right: Expr) -> Self:
+        return cls("gte", left, right)
+
+
+@dataclass(slots=True)
+class Not(Expr):
+    inner: Expr
+    operand_fields = ("inner",)
+
+
+@dataclass(slots=True)
+class Vector(Expr):
+    x: Expr
+    y: Expr
+    z: Expr
+    operand_fields = ("x", "y", "z")
+
+
+@dataclass(slots=True)
+class VectorOp(Expr):
+    # one of Vizzy's unary vector operators, e.g. "length", "norm" or "x"
+    op: str
+    inner: Expr
+    operand_fields = ("inner",)
+
+
+@dataclass(slots=True)
+class VectorOp2(Expr):
+    # one of Vizzy's binary vector operators, e.g. "dot" or "cross"
+    op: str
+    left: Expr
+    right: Expr
+    operand_fields = ("left", "right")
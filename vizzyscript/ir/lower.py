@@ -0,0 +1,162 @@
+from typing import Callable
+from .. import xml_gen as gen
+from . import expr as ir
+from .common import Expr, Stmt
+from .statements import (
+    CallCustomInstruction,
+    For,
+    If,
+    Repeat,
+    SetActivationGroup,
+    SetVariable,
+    While,
+)
+from .triggers import CustomInstruction, ReceiveMessage
+
+
+def lower_constant(c: ir.Constant, _: list[gen.Element]) -> gen.Element:
+    match c.data_type:
+        case "number":
+            return gen.Constant.from_number(c.value)
+        case "text":
+            return gen.Constant.from_text(c.value)
+        case "bool":
+            return gen.Constant.from_bool(c.value)
+        case "vector":
+            return gen.Constant.from_vector(*c.value)
+        case _:
+            return gen.Constant(c.value, c.data_type)
+
+
+builders: dict[type[Expr], Callable[[Expr, list[gen.Element]], gen.Element]] = {
+    ir.Constant: lower_constant,
+    ir.Variable: lambda v, _: gen.Variable(
+        v.name, is_list=v.is_list, is_local=v.is_local
+    ),
+    ir.ActivationGroup: lambda _, operands: gen.ActivationGroup(*operands),
+    ir.BinaryOp: lambda e, operands: getattr(gen.BinaryOp, e.op)(*operands),
+    ir.BoolOp: lambda e, operands: getattr(gen.BoolOp, e.op)(*operands),
+    ir.Comparison: lambda e, operands: getattr(gen.Comparison, e.op)(*operands),
+    ir.Not: lambda _, operands: gen.Not(*operands),
+    ir.Vector: lambda _, operands: gen.Vector(*operands),
+    ir.VectorOp: lambda e, operands: gen.VectorOp(e.op, *operands),
+    ir.VectorOp2: lambda e, operands: gen.VectorOp(e.op, *operands),
+}
+
+
+class Leaves:
+    """
+    Hash-consing factory for the leaves of expression trees: each distinct
+    variable read or constant is built once and the element is shared by
+    every tree it appears in. Shared elements must not be modified, which
+    `gen.serialize` never does.
+    """
+
+    def __init__(self) -> None:
+        self.elements: dict[tuple, gen.Element] = {}
+
+    def key(self, leaf: Expr) -> tuple:
+        match leaf:
+            case ir.Variable(name=name, is_local=is_local, is_list=is_list):
+                return ir.Variable, name, is_local, is_list
+            case ir.Constant(value=tuple() as value, data_type=data_type):
+                # 1 == 1.0, but they are written differently
+                return ir.Constant, data_type, value, tuple(map(type, value))
+            case ir.Constant(value=value, data_type=data_type):
+                return ir.Constant, data_type, value, type(value)
+        return type(leaf), id(leaf)
+
+    def lower(self, leaf: Expr) -> gen.Element:
+        key = self.key(leaf)
+        element = self.elements.get(key)
+        if element is None:
+            element = self.elements[key] = builders[type(leaf)](leaf, [])
+        return element
+
+
+def lower_expr(root: Expr, leaves: Leaves | None = None) -> gen.Element:
+    stack: list[Expr | tuple[Expr, int]] = [root]
+    results: list[gen.Element] = []
+
+    while stack:
+        item = stack.pop()
+
+        if type(item) is tuple:
+            node, n = item
+            operands = results[-n:]
+            del results[-n:]
+            results.append(builders[type(node)](node, operands))
+            continue
+
+        operands = item.operands()
+        if not operands:
+            if leaves is not None:
+                results.append(leaves.lower(item))
+            else:
+                results.append(builders[type(item)](item, []))
+            continue
+
+        stack.append((item, len(operands)))
+        stack.extend(reversed(operands))
+
+    return results[0]
+
+
+def inclusive_end(stop: Expr, step: ir.Constant) -> Expr:
+    """Last value of an integer range, as Vizzy's `for` includes its end"""
+    delta = -1 if step.value > 0 else 1
+    if isinstance(stop, ir.Constant) and stop.data_type == "number":
+        return ir.Constant.from_number(stop.value + delta)
+    op = "sub" if delta < 0 else "add"
+    return ir.BinaryOp(op, stop, ir.Constant.from_number(1))
+
+
+def lower_statement(stmt: Stmt, leaves: Leaves | None = None) -> gen.Element:
+    def expr(e: Expr) -> gen.Element:
+        return lower_expr(e, leaves)
+
+    def block(body: list[Stmt]) -> list[gen.Element]:
+        return [lower_statement(s, leaves) for s in body]
+
+    match stmt:
+        case SetVariable(name=name, expr=e, is_local=is_local):
+            return gen.SetVariable(name, expr(e), is_local=is_local)
+
+        case SetActivationGroup(ag=ag, value=value):
+            return gen.SetActivationGroup(expr(ag), expr(value))
+
+        case If(test=test, body=body):
+            return gen.If(expr(test), block(body))
+
+        case CallCustomInstruction(name=name, args=args):
+            return gen.CallCustomInstruction(name, [expr(a) for a in args])
+
+        case For(var=var, start=start, stop=stop, step=step, body=body):
+            return gen.For(
+                var,
+                expr(start),
+                expr(inclusive_end(stop, step)),
+                expr(step),
+                block(body),
+            )
+
+        case While(test=test, body=body):
+            return gen.While(expr(test), block(body))
+
+        case Repeat(count=count, body=body):
+            return gen.Repeat(expr(count), block(body))
+
+        case _:
+            raise TypeError(f"Cannot lower {stmt!r}")
+
+
+def lower_thread(
+    thread: ReceiveMessage | CustomInstruction, leaves: Leaves | None = None
+) -> gen.Element:
+    """Lower `thread`, sharing its leaf elements through `leaves` if given"""
+    body = [lower_statement(s, leaves) for s in thread.body]
+    match thread:
+        case ReceiveMessage(msg=msg):
+            return gen.ReceiveMessage(msg, body)
+        case CustomInstruction(name=name, params=params):
+            return gen.DefineCustomInstruction(name, params, body)
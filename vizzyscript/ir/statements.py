@@ -0,0 +1,75 @@
+from dataclasses import dataclass
+from .common import Expr, Stmt
+
+
+@dataclass(slots=True)
+class If(Stmt):
+    test: Expr
+    body: list[Stmt]
+
+
+@dataclass(slots=True)
+class SetActivationGroup(Stmt):
+    ag: Expr
+    value: Expr
+
+
+@dataclass(slots=True)
+class SetVariable(Stmt):
+    name: str
+    expr: Expr
+    is_local: bool = False
+
+
+@dataclass(slots=True)
+class For(Stmt):
+    """`for var in range(start, stop, step)`, with `stop` exclusive"""
+
+    var: str
+    start: Expr
+    stop: Expr
+    step: Expr
+    body: list[Stmt]
+
+
+@dataclass(slots=True)
+class While(Stmt):
+    test: Expr
+    body: list[Stmt]
+
+
+@dataclass(slots=True)
+class Repeat(Stmt):
+    count: Expr
+    body: list[Stmt]
+
+
+# statements with a nested body
+Block = If | For | While | Repeat
+
+
+@dataclass(slots=True)
+class CallCustomInstruction(Stmt):
+    name: str
+    args: list[Expr]
+
+
+def evaluated(stmt: Stmt) -> list[Expr]:
+    """The expressions `stmt` evaluates itself, in order"""
+    match stmt:
+        case SetVariable(expr=expr):
+            return [expr]
+        case SetActivationGroup(ag=ag, value=value):
+            return [ag, value]
+        case If(test=test):
+            return [test]
+        case CallCustomInstruction(args=args):
+            return list(args)
+        case For(start=start, stop=stop, step=step):
+            return [start, stop, step]
+        case Repeat(count=count):
+            return [count]
+        case _:
+            # a `while` test is evaluated again after every iteration, so it
+            # is not counted as evaluated once by the statement
+            return []
@@ -0,0 +1,19 @@
+from dataclasses import dataclass
+from .common import Stmt
+
+
+@dataclass(slots=True)
+class ReceiveMessage:
+    msg: str
+    body: list[Stmt]
+
+
+@dataclass(slots=True)
+class CustomInstruction:
+    name: str
+    params: list[str]
+    body: list[Stmt]
+
+
+# top-level blocks of instructions, which the optimisation passes rewrite
+Thread = ReceiveMessage | CustomInstruction
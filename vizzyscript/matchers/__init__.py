@@ -1,49 +1,149 @@
 import ast
+from typing import Callable
 from vizzy_api import activation_groups
-from ..xml_gen import (
-    Element,
+from vizzy_api.operators import VectorMath
+from ..ir import (
+    Expr,
+    Stmt,
     BinaryOp,
     BoolOp,
+    CallCustomInstruction,
     Comparison,
     Constant,
+    For,
     If,
+    Repeat,
+    While,
     Not,
     SetActivationGroup,
     Variable,
     SetVariable,
     Vector,
+    VectorOp,
+    VectorOp2,
     ActivationGroup,
 )
+from .registry import Registry
 
+statements: Registry[Stmt] = Registry("syntax")
+expressions: Registry[Expr] = Registry("expression syntax")
 
-def match_statement(stmt: ast.stmt):
+# AG1..AG10; `AG` itself is the dynamic form and is lowered as a call
+FIXED_AGS = frozenset(activation_groups.__all__) - {"AG"}
+
+# `VectorMath.dot(a, b)`, ...
+VECTOR_OPS_2 = frozenset(name for name in vars(VectorMath) if not name.startswith("_"))
+# `v.length()` and `v.norm()`
+VECTOR_METHODS = frozenset({"length", "norm"})
+# `v.x`, `v.y` and `v.z`
+VECTOR_COMPONENTS = frozenset({"x", "y", "z"})
+
+
+def is_call_to(expr: ast.expr, name: str, n_args: int) -> bool:
+    return (
+        isinstance(expr, ast.Call)
+        and isinstance(expr.func, ast.Name)
+        and expr.func.id == name
+        and len(expr.args) == n_args
+    )
+
+
+def is_method_call(expr: ast.expr, obj: str, attr: str, n_args: int) -> bool:
+    return (
+        isinstance(expr, ast.Call)
+        and isinstance(expr.func, ast.Attribute)
+        and isinstance(expr.func.value, ast.Name)
+        and expr.func.value.id == obj
+        and expr.func.attr == attr
+        and len(expr.args) == n_args
+    )
+
+
+def match_statement(stmt: ast.stmt) -> Stmt:
+    return statements.lower(stmt)
+
+
+def match_block(body: list[ast.stmt]) -> list[Stmt]:
+    # `pass` only stands for an empty block
+    return [match_statement(s) for s in body if not isinstance(s, ast.Pass)]
+
+
+@statements.register(
+    ast.Expr, guard=lambda stmt: is_method_call(stmt.value, "AG", "set", 2)
+)
+def match_ag_set(stmt: ast.Expr) -> Stmt:
+    ag, expr = stmt.value.args
+    return SetActivationGroup(match_expr(ag), match_expr(expr))
+
+
+@statements.register(
+    ast.Expr,
+    guard=lambda stmt: isinstance(stmt.value, ast.Call)
+    and isinstance(stmt.value.func, ast.Name),
+)
+def match_call(stmt: ast.Expr) -> Stmt:
+    # calls left after inlining are to helpers emitted as custom instructions
+    call = stmt.value
+    return CallCustomInstruction(call.func.id, [match_expr(a) for a in call.args])
+
+
+@statements.register(ast.If)
+def match_if_stmt(stmt: ast.If) -> Stmt:
+    return match_if(stmt.test, stmt.body)
+
+
+def match_if(test: ast.expr, body: list[ast.stmt]) -> Stmt:
+    return If(match_expr(test), match_block(body))
+
+
+def range_step(step: ast.expr) -> Expr:
+    # the sign decides how the loop ends, so it must be known
+    match step:
+        case ast.Constant(value=int(n)) if n:
+            return Constant.from_number(n)
+        case ast.UnaryOp(op=ast.USub(), operand=ast.Constant(value=int(n))) if n:
+            return Constant.from_number(-n)
+    raise SyntaxError(f"range() step must be a non-zero integer:\n{ast.unparse(step)}")
+
+
+@statements.register(ast.For)
+def match_for(stmt: ast.For) -> Stmt:
     match stmt:
-        case ast.Assign():
-            return match_assign(stmt)
-        case ast.AugAssign():
-            return match_aug_assign(stmt)
-        case ast.If(test=test, body=body):
-            return match_if(test, body)
-        case ast.Expr(
-            value=ast.Call(
-                func=ast.Attribute(value=ast.Name(id="AG"), attr="set"),
-                args=[ag, expr],
-            )
+        case ast.For(
+            target=ast.Name(id=var),
+            iter=ast.Call(func=ast.Name(id="range"), args=args, keywords=[]),
+            orelse=[],
+        ) if (
+            1 <= len(args) <= 3
         ):
-            return SetActivationGroup(match_expr(ag), match_expr(expr))
+            pass
         case _:
             raise SyntaxError(
-                f"Unexpected syntax:\n{ast.unparse(stmt)}\n{ast.dump(stmt)}"
+                f"Unexpected loop syntax, only `for x in range(...)` is supported:\n"
+                f"{ast.unparse(stmt)}"
             )
 
+    body = match_block(stmt.body)
+    if var == "_" and len(args) == 1:
+        return Repeat(match_expr(args[0]), body)
 
-def match_if(test: ast.expr, body: list[ast.stmt]):
-    return If(match_expr(test), [match_statement(s) for s in body])
+    start = match_expr(args[0]) if len(args) > 1 else Constant.from_number(0)
+    stop = match_expr(args[1] if len(args) > 1 else args[0])
+    step = range_step(args[2]) if len(args) > 2 else Constant.from_number(1)
+    return For(var, start, stop, step, body)
 
 
-def match_assign(node: ast.Assign) -> Element:
+@statements.register(ast.While)
+def match_while(stmt: ast.While) -> Stmt:
+    if stmt.orelse:
+        raise SyntaxError(f"Unexpected loop syntax:\n{ast.unparse(stmt)}")
+    return While(match_expr(stmt.test), match_block(stmt.body))
+
+
+@statements.register(ast.Assign)
+def match_assign(node: ast.Assign) -> Stmt:
     match node.targets, node.value:
-        case [ast.Name(id=ag)], val if ag in activation_groups.__all__:
+        case [ast.Name(id=ag)], val if ag in FIXED_AGS:
             ag = int(ag.lstrip("AG"))
             return SetActivationGroup(Constant.from_number(ag), match_expr(val))
 
@@ -59,7 +159,8 @@ def match_assign(node: ast.Assign) -> Element:
             )
 
 
-def match_aug_assign(node: ast.AugAssign) -> Element:
+@statements.register(ast.AugAssign)
+def match_aug_assign(node: ast.AugAssign) -> Stmt:
     match node.target, node.op, node.value:
         case ast.Attribute(value=ast.Name(id="VAR")) as target, op, expr:
             return match_assign(ast.Assign([target], ast.BinOp(target, op, expr)))
@@ -73,45 +174,91 @@ def match_aug_assign(node: ast.AugAssign) -> Element:
             )
 
 
-def match_expr(expr: ast.expr) -> Element:
-    match expr:
-        case ast.Attribute(value=ast.Name(id="VAR"), attr=name):
-            return Variable(name)
+def match_expr(expr: ast.expr) -> Expr:
+    return expressions.lower(expr)
 
-        case ast.Name(id=ag) if "AG" in activation_groups.__all__:
-            ag = int(ag.lstrip("AG"))
-            return ActivationGroup.fixed(ag)
 
-        case ast.Name(id=name):
-            return Variable(name, is_local=True)
+@expressions.register(
+    ast.Attribute,
+    guard=lambda expr: isinstance(expr.value, ast.Name) and expr.value.id == "VAR",
+)
+def match_global(expr: ast.Attribute) -> Expr:
+    return Variable(expr.attr)
+
 
-        case ast.Call(func=ast.Name(id="AG"), args=[n]):
-            return ActivationGroup(match_expr(n))
+@expressions.register(ast.Name, guard=lambda expr: expr.id in FIXED_AGS)
+def match_fixed_ag(expr: ast.Name) -> Expr:
+    return ActivationGroup.fixed(int(expr.id.lstrip("AG")))
 
-        case ast.Call(func=ast.Name(id="Vec"), args=[x, y, z]):
-            return Vector(match_expr(x), match_expr(y), match_expr(z))
 
-        case ast.Constant(value=bool() as val):
-            return Constant.from_bool(val)
+@expressions.register(ast.Name)
+def match_local(expr: ast.Name) -> Expr:
+    return Variable(expr.id, is_local=True)
 
-        # int must remain after bool, because it is the superclass of bool
-        case ast.Constant(value=int() | float() as val):
-            return Constant.from_number(val)
 
-        case ast.Constant(value=str() as val):
-            return Constant.from_text(val)
+@expressions.register(
+    ast.Call,
+    guard=lambda expr: is_call_to(expr, "AG", 1),
+    children=lambda expr: expr.args,
+)
+def match_dynamic_ag(expr: ast.Call, operands: list[Expr]) -> Expr:
+    return ActivationGroup(*operands)
+
 
-        case ast.BinOp(left=left, op=op, right=right):
-            return match_binary_op(left, op, right)
+@expressions.register(
+    ast.Call,
+    guard=lambda expr: is_call_to(expr, "Vec", 3),
+    children=lambda expr: expr.args,
+)
+def match_vector(expr: ast.Call, operands: list[Expr]) -> Expr:
+    return Vector(*operands)
 
-        case ast.Compare(left=left, ops=ops, comparators=right):
-            return match_comparison(left, ops, right)
 
-        case ast.BoolOp(op=op, values=values):
-            return match_bool_ops(op, values)
+@expressions.register(
+    ast.Call,
+    guard=lambda expr: any(
+        is_method_call(expr, "VectorMath", op, 2) for op in VECTOR_OPS_2
+    ),
+    children=lambda expr: expr.args,
+)
+def match_vector_op_2(expr: ast.Call, operands: list[Expr]) -> Expr:
+    return VectorOp2(expr.func.attr, *operands)
 
-        case ast.UnaryOp(op=ast.Not(), operand=operand):
-            return Not(match_expr(operand))
+
+@expressions.register(
+    ast.Call,
+    guard=lambda expr: isinstance(expr.func, ast.Attribute)
+    and expr.func.attr in VECTOR_METHODS
+    and not expr.args
+    and not expr.keywords,
+    children=lambda expr: (expr.func.value,),
+)
+def match_vector_method(expr: ast.Call, operands: list[Expr]) -> Expr:
+    return VectorOp(expr.func.attr, *operands)
+
+
+# registered after `match_global`, so `VAR.x` stays the field `x`
+@expressions.register(
+    ast.Attribute,
+    guard=lambda expr: expr.attr in VECTOR_COMPONENTS,
+    children=lambda expr: (expr.value,),
+)
+def match_vector_component(expr: ast.Attribute, operands: list[Expr]) -> Expr:
+    return VectorOp(expr.attr, *operands)
+
+
+@expressions.register(ast.Constant)
+def match_constant(expr: ast.Constant) -> Expr:
+    match expr.value:
+        case bool() as val:
+            return Constant.from_bool(val)
+
+        # int must remain after bool, because it is the superclass of bool
+        case int() | float() as val:
+            return Constant.from_number(val)
+
+        case str() as val:
+            return Constant.from_text(val)
 
         case _:
             raise SyntaxError(
@@ -119,76 +266,99 @@ def match_expr(expr: ast.expr) -> Element:
             )
 
 
-def match_binary_op(left: ast.expr, op: ast.operator, right: ast.expr) -> Element:
-    operands = (match_expr(left), match_expr(right))
-    match op:
-        case ast.Add():
-            return BinaryOp.add(*operands)
-        case ast.Sub():
-            return BinaryOp.sub(*operands)
-        case ast.Mult():
-            return BinaryOp.mul(*operands)
-        case ast.Div():
-            return BinaryOp.div(*operands)
-        case ast.Mod():
-            return BinaryOp.mod(*operands)
-        case _:
+def comparison_operands(expr: ast.Compare) -> list[ast.expr]:
+    # each comparison in a chain lowers its own copy of the shared operand
+    operands = [expr.left]
+    for comparator in expr.comparators[:-1]:
+        operands += [comparator, comparator]
+    operands.append(expr.comparators[-1])
+    return operands
+
+
+@expressions.register(
+    ast.UnaryOp,
+    guard=lambda expr: isinstance(expr.op, ast.USub)
+    and isinstance(expr.operand, ast.Constant)
+    and type(expr.operand.value) in (int, float),
+)
+def match_negative_number(expr: ast.UnaryOp) -> Expr:
+    return Constant.from_number(-expr.operand.value)
+
+
+@expressions.register(ast.BinOp, children=lambda expr: (expr.left, expr.right))
+def match_binop(expr: ast.BinOp, operands: list[Expr]) -> Expr:
+    fn = binary_ops.get(type(expr.op))
+    if fn is None:
+        raise SyntaxError(
+            f"Unsupported operation '{ast.unparse(expr.op)}' in\n{ast.unparse(expr)}\n{ast.dump(expr)}"
+        )
+
+    return fn(*operands)
+
+
+@expressions.register(ast.Compare, children=comparison_operands)
+def match_compare(expr: ast.Compare, operands: list[Expr]) -> Expr:
+    fns = [comparison_ops.get(type(op)) for op in expr.ops]
+    for op, fn in zip(expr.ops, fns):
+        if fn is None:
             raise SyntaxError(
-                f"Unsupported operation '{ast.unparse(op)}' in\n{ast.unparse((node := ast.BinOp(left, op, right)))}\n{ast.dump(node)}"
+                f"Unsupported operation '{ast.unparse(op)}' in\n{ast.unparse(expr)}\n{ast.dump(expr)}"
             )
 
+    comparisons = [fn(operands[2 * i], operands[2 * i + 1]) for i, fn in enumerate(fns)]
+    return BoolOp.reduce("and_", comparisons)
 
-def match_comparison(left: ast.expr, ops: list[ast.cmpop], comparators: list[ast.expr]):
-    def get_func(op):
-        match op:
-            case ast.Lt():
-                return Comparison.lt
-            case ast.LtE():
-                return Comparison.lte
-            case ast.Gt():
-                return Comparison.gt
-            case ast.GtE():
-                return Comparison.gte
-            case ast.Eq():
-                return Comparison.eq
-            case ast.NotEq():
-                return lambda left, right: Not(Comparison.eq(left, right))
-            case _:
-                raise SyntaxError(
-                    f"Unsupported operation '{ast.unparse(op)}' in\n{ast.unparse(node := ast.Compare(left, ops, comparators))}\n{ast.dump(node)}"
-                )
-
-    comparisons = [
-        get_func(ops[i])(
-            match_expr(left if i == 0 else comparators[i - 1]),
-            match_expr(comparators[i]),
+
+@expressions.register(ast.BoolOp, children=lambda expr: expr.values)
+def match_boolop(expr: ast.BoolOp, operands: list[Expr]) -> Expr:
+    op = bool_ops.get(type(expr.op))
+    if op is None:
+        raise SyntaxError(
+            f"Unsupported operation '{ast.unparse(expr.op)}' in\n{ast.unparse(expr)}\n{ast.dump(expr)}"
         )
-        for i in range(len(ops))
-    ]
 
-    result = comparisons[0]
-    for comp in comparisons[1:]:
-        result = BoolOp.and_(result, comp)
+    return BoolOp.reduce(op, operands)
+
+
+@expressions.register(
+    ast.UnaryOp,
+    guard=lambda expr: isinstance(expr.op, ast.Not),
+    children=lambda expr: (expr.operand,),
+)
+def match_not(expr: ast.UnaryOp, operands: list[Expr]) -> Expr:
+    return Not(*operands)
+
+
+binary_ops: dict[type[ast.operator], Callable[[Expr, Expr], Expr]] = {
+    ast.Add: BinaryOp.add,
+    ast.Sub: BinaryOp.sub,
+    ast.Mult: BinaryOp.mul,
+    ast.Div: BinaryOp.div,
+    ast.Mod: BinaryOp.mod,
+}
+
+comparison_ops: dict[type[ast.cmpop], Callable[[Expr, Expr], Expr]] = {
+    ast.Lt: Comparison.lt,
+    ast.LtE: Comparison.lte,
+    ast.Gt: Comparison.gt,
+    ast.GtE: Comparison.gte,
+    ast.Eq: Comparison.eq,
+    ast.NotEq: lambda left, right: Not(Comparison.eq(left, right)),
+}
+
+bool_ops: dict[type[ast.boolop], str] = {
+    ast.Or: "or_",
+    ast.And: "and_",
+}
 
-    return result
+
+def match_binary_op(left: ast.expr, op: ast.operator, right: ast.expr) -> Expr:
+    return match_expr(ast.BinOp(left, op, right))
+
+
+def match_comparison(left: ast.expr, ops: list[ast.cmpop], comparators: list[ast.expr]):
+    return match_expr(ast.Compare(left, ops, comparators))
 
 
 def match_bool_ops(op: ast.boolop, values: list[ast.expr]):
-    def get_func():
-        match op:
-            case ast.Or():
-                return BoolOp.or_
-            case ast.And():
-                return BoolOp.and_
-            case _:
-                raise SyntaxError(
-                    f"Unsupported operation '{ast.unparse(op)}' in\n{ast.unparse(node := ast.BoolOp(op, values))}\n{ast.dump(node)}"
-                )
-
-    fn = get_func()
-
-    result = fn(match_expr(values[0]), match_expr(values[1]))
-    for expr in values[2:]:
-        result = fn(result, match_expr(expr))
-
-    return result
+    return match_expr(ast.BoolOp(op, values))
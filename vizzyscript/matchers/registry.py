@@ -0,0 +1,106 @@
+import ast
+from typing import Callable, Sequence
+
+type Lowering[R] = Callable[..., R]
+type Guard = Callable[[ast.AST], bool]
+type Children = Callable[[ast.AST], Sequence[ast.AST]]
+type Entry[R] = tuple[Lowering[R], Children | None]
+
+
+class Registry[R]:
+    """
+    Dispatch table from Python AST node types to lowering functions.
+
+    Lookups are keyed on `type(node)`. Node types that need to look deeper
+    than their type (`VAR.x`, `AG(n)`, `Vec(x, y, z)`, ...) register guarded
+    lowerings, which are tried in registration order before the unguarded
+    lowering for that type.
+
+    A lowering registered with `children` is called as `fn(node, lowered)`,
+    where `lowered` holds the already lowered results of `children(node)`.
+    These are driven from an explicit stack, so arbitrarily deep trees never
+    hit the recursion limit. A lowering without `children` is called as
+    `fn(node)` and is free to lower its own operands.
+
+    ```
+    @expressions.register(
+        ast.Call,
+        guard=lambda n: is_call_to(n, "sqrt", 1),
+        children=lambda n: n.args,
+    )
+    def lower_sqrt(node: ast.Call, lowered: list[Expr]) -> Expr: ...
+    ```
+    """
+
+    def __init__(self, kind: str) -> None:
+        self.kind = kind
+        self.lowerings: dict[type[ast.AST], Entry[R]] = {}
+        self.guarded: dict[type[ast.AST], list[tuple[Guard, Entry[R]]]] = {}
+
+    def register(
+        self,
+        node_type: type[ast.AST],
+        *,
+        guard: Guard | None = None,
+        children: Children | None = None,
+    ) -> Callable[[Lowering[R]], Lowering[R]]:
+        """
+        Register a lowering for `node_type`. Registering an unguarded lowering
+        for a type that already has one replaces it.
+        """
+
+        def decorator(fn: Lowering[R]) -> Lowering[R]:
+            if guard is None:
+                self.lowerings[node_type] = (fn, children)
+            else:
+                self.guarded.setdefault(node_type, []).append((guard, (fn, children)))
+            return fn
+
+        return decorator
+
+    def resolve(self, node: ast.AST) -> Entry[R]:
+        node_type = type(node)
+
+        if node_type in self.guarded:
+            for guard, entry in self.guarded[node_type]:
+                if guard(node):
+                    return entry
+
+        entry = self.lowerings.get(node_type)
+        if entry is None:
+            raise SyntaxError(
+                f"Unexpected {self.kind}:\n{ast.unparse(node)}\n{ast.dump(node)}"
+            )
+
+        return entry
+
+    def lower(self, node: ast.AST) -> R:
+        # Post-order walk: a node is pushed back as a (node, fn, n) build
+        # marker underneath its children, and built once the n results on
+        # top of `results` are its lowered children.
+        stack: list[ast.AST | tuple[ast.AST, Lowering[R], int]] = [node]
+        results: list[R] = []
+
+        while stack:
+            item = stack.pop()
+
+            if type(item) is tuple:
+                parent, fn, n = item
+                if n:
+                    lowered = results[-n:]
+                    del results[-n:]
+                else:
+                    lowered = []
+                results.append(fn(parent, lowered))
+                continue
+
+            fn, children = self.resolve(item)
+            if children is None:
+                results.append(fn(item))
+                continue
+
+            operands = children(item)
+            stack.append((item, fn, len(operands)))
+            stack.extend(reversed(operands))
+
+        return results[0]
@@ -0,0 +1,50 @@
+from dataclasses import dataclass
+
+
+@dataclass
+class Options:
+    """
+    Optimisations applied by `Parser`. Everything is off by default, so the
+    generated program mirrors the source one to one.
+    """
+
+    # fold constant sub-expressions and apply algebraic identities
+    fold_constants: bool = False
+
+    # evaluate repeated subexpressions once into local temporaries
+    cse: bool = False
+
+    # emit chains of `and`, `or`, `+` and `*` as balanced trees
+    balance_chains: bool = False
+
+    # in `if` tests, only evaluate `and`/`or` operands estimated to cost more
+    # than this many instructions when the result is still undecided
+    short_circuit_threshold: float | None = None
+
+    # run all handlers of a channel in one thread where their locals allow
+    merge_receivers: bool = False
+
+    # helpers of at most this many statements are inlined into their callers,
+    # larger ones become custom instructions
+    inline_threshold: int = 8
+
+    # leave `VAR` fields that no emitted code uses out of the program
+    drop_unused: bool = False
+
+    # unroll loops over constant ranges of at most this many iterations
+    unroll_threshold: int = 0
+
+    # evaluate loop-invariant expressions once before the loop; assumes no
+    # other thread writes what the loop reads while it runs
+    hoist_invariants: bool = False
+
+    # infer which values are vectors, to use Vizzy's vector operators where the
+    # source works on components, and reject mixed vector and number arithmetic
+    vector_types: bool = False
+
+    # build each distinct variable read and constant once, and share the
+    # element between every tree that uses it
+    share_leaves: bool = False
+
+    # fail when a trigger's handlers may run more estimated instructions
+    cost_budget: float | None = None
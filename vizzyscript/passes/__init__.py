@@ -0,0 +1,11 @@
+"""
+Optimisation passes over the Vizzy IR. Each pass takes a thread and a
+`Counter` it records what it did in, and returns the rewritten thread.
+"""
+
+from .fold import fold_thread
+from .cse import eliminate_common_subexpressions
+from .balance import balance_thread
+from .loops import hoist_invariants, unroll_thread
+from .shortcircuit import short_circuit_thread
+from .vectors import infer_vector_types
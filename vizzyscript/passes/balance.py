@@ -0,0 +1,95 @@
+from collections import Counter
+from dataclasses import replace
+from ..ir import Expr, Stmt, BinaryOp, BoolOp, If, Thread
+from ..ir import (
+    CallCustomInstruction,
+    For,
+    Repeat,
+    SetActivationGroup,
+    SetVariable,
+    While,
+)
+
+associative = {(BinaryOp, "add"), (BinaryOp, "mul"), (BoolOp, "and_"), (BoolOp, "or_")}
+
+
+def chain(node: Expr) -> list[Expr]:
+    """The operands of the run of `node`'s associative operator, in order"""
+    kind = (type(node), node.op)
+    operands: list[Expr] = []
+    stack = [node]
+    while stack:
+        e = stack.pop()
+        if (type(e), getattr(e, "op", None)) == kind:
+            stack += [e.right, e.left]
+        else:
+            operands.append(e)
+    return operands
+
+
+def balance(root: Expr, report: Counter[str]) -> Expr:
+    stack: list[Expr | tuple[Expr, list[Expr] | None, int]] = [root]
+    results: list[Expr] = []
+
+    while stack:
+        item = stack.pop()
+
+        if type(item) is tuple:
+            node, run, n = item
+            operands = results[-n:] if n else []
+            if n:
+                del results[-n:]
+            if run is not None:
+                node = type(node).reduce(node.op, operands, balanced=True)
+            elif any(new is not old for new, old in zip(operands, node.operands())):
+                node = node.with_operands(operands)
+            results.append(node)
+            continue
+
+        run = None
+        if (type(item), getattr(item, "op", None)) in associative:
+            run = chain(item)
+            if len(run) > 2:
+                report["balance.chains"] += 1
+            operands = run
+        else:
+            operands = item.operands()
+
+        stack.append((item, run, len(operands)))
+        stack.extend(reversed(operands))
+
+    return results[0]
+
+
+def balance_statements(body: list[Stmt], report: Counter[str]) -> list[Stmt]:
+    result: list[Stmt] = []
+    for stmt in body:
+        match stmt:
+            case SetVariable(name=name, expr=expr, is_local=is_local):
+                stmt = SetVariable(name, balance(expr, report), is_local)
+            case SetActivationGroup(ag=ag, value=value):
+                stmt = SetActivationGroup(balance(ag, report), balance(value, report))
+            case If(test=test, body=inner):
+                stmt = If(balance(test, report), balance_statements(inner, report))
+            case CallCustomInstruction(name=name, args=args):
+                stmt = CallCustomInstruction(name, [balance(a, report) for a in args])
+            case For(var=var, start=start, stop=stop, step=step, body=inner):
+                start, stop = balance(start, report), balance(stop, report)
+                stmt = For(var, start, stop, step, balance_statements(inner, report))
+            case While(test=test, body=inner):
+                stmt = While(balance(test, report), balance_statements(inner, report))
+            case Repeat(count=count, body=inner):
+                stmt = Repeat(balance(count, report), balance_statements(inner, report))
+        result.append(stmt)
+    return result
+
+
+def balance_thread(thread: Thread, report: Counter[str]) -> Thread:
+    """
+    Rebuild every chain of one associative operator (`and`, `or`, `+`, `*`)
+    as a balanced tree, so `a or b or ... z` is log2(n) deep instead of n.
+    Floating point `+` and `*` may round differently once regrouped.
+
+    Chains of three or more operands are counted in `report["balance.chains"]`.
+    """
+    return replace(thread, body=balance_statements(thread.body, report))
@@ -0,0 +1,257 @@
+from collections import Counter
+from dataclasses import fields, replace
+from itertools import count
+from ..ir import (
+    Expr,
+    Stmt,
+    ActivationGroup,
+    CallCustomInstruction,
+    For,
+    If,
+    Repeat,
+    SetActivationGroup,
+    Thread,
+    SetVariable,
+    Variable,
+    While,
+    evaluated,
+)
+
+# smallest subtree worth a temporary: hoisting a single variable read or
+# `AG(n)` would replace one block with another
+MIN_SIZE = 3
+
+AG_STATE = ("ag",)
+# written by custom instructions, which may change any global state
+EVERYTHING = ("*",)
+
+
+def variable_key(name: str, is_local: bool) -> tuple:
+    return ("var", name, is_local)
+
+
+class Interner:
+    """
+    Numbers structurally equal expressions with the same id, bottom-up, so
+    that comparing or hashing a subtree is O(1) however deep it is. Also
+    records each id's size and the variables it reads.
+    """
+
+    def __init__(self) -> None:
+        self.ids: dict[tuple, int] = {}
+        self.sizes: list[int] = []
+        self.reads: list[frozenset[tuple]] = []
+        self.attrs: dict[type, tuple[str, ...]] = {}
+        # id(node) -> interned id, valid while the nodes are alive
+        self.nodes: dict[int, int] = {}
+
+    def attributes(self, node: Expr) -> tuple:
+        names = self.attrs.get(type(node))
+        if names is None:
+            operands = set(node.operand_fields)
+            names = tuple(f.name for f in fields(node) if f.name not in operands)
+            self.attrs[type(node)] = names
+        return tuple(getattr(node, name) for name in names)
+
+    def intern(self, root: Expr) -> int:
+        stack: list[tuple[Expr, bool]] = [(root, False)]
+        while stack:
+            node, ready = stack.pop()
+            if id(node) in self.nodes:
+                continue
+
+            operands = node.operands()
+            if not ready and operands:
+                stack.append((node, True))
+                stack.extend((o, False) for o in operands)
+                continue
+
+            children = tuple(self.nodes[id(o)] for o in operands)
+            key = (type(node), self.attributes(node), children)
+            i = self.ids.get(key)
+            if i is None:
+                i = self.ids[key] = len(self.sizes)
+                self.sizes.append(1 + sum(self.sizes[c] for c in children))
+                reads = frozenset().union(*(self.reads[c] for c in children))
+                match node:
+                    case Variable(name=name, is_local=is_local):
+                        reads = frozenset([variable_key(name, is_local)])
+                    case ActivationGroup():
+                        reads |= {AG_STATE}
+                self.reads.append(reads)
+            self.nodes[id(node)] = i
+
+        return self.nodes[id(root)]
+
+
+def writes(stmt: Stmt) -> set[tuple]:
+    match stmt:
+        case SetVariable(name=name, is_local=is_local):
+            return {variable_key(name, is_local)}
+        case SetActivationGroup():
+            return {AG_STATE}
+        case If(body=body) | While(body=body) | Repeat(body=body):
+            return set().union(*map(writes, body))
+        case For(var=var, body=body):
+            return {variable_key(var, True)}.union(*map(writes, body))
+        case CallCustomInstruction():
+            return {EVERYTHING}
+        case _:
+            return set()
+
+
+class Block:
+    """
+    CSE over one straight-line block of statements. An expression stays
+    available from its first evaluation until a statement writes one of the
+    variables it reads, and every run of occurrences in between shares a
+    temporary.
+    """
+
+    def __init__(self, interner: Interner, temps: count, report: Counter[str]):
+        self.interner = interner
+        self.temps = temps
+        self.report = report
+        self.next_group = 0
+
+    def candidates(self, root: Expr, visit) -> None:
+        """
+        Pre-order walk calling `visit(node, i)` on every subtree big enough to
+        hoist. Operands are only walked if `visit` returns True.
+        """
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            i = self.interner.nodes[id(node)]
+            if self.interner.sizes[i] < MIN_SIZE or visit(node, i):
+                stack.extend(reversed(node.operands()))
+
+    def kill(self, live: dict[int, int], stmt: Stmt):
+        written = writes(stmt)
+        if EVERYTHING in written:
+            live.clear()
+        elif written:
+            for i in [i for i in live if self.interner.reads[i] & written]:
+                del live[i]
+
+    def count(self, body: list[Stmt]) -> list[int]:
+        occurrences: list[int] = []
+        live: dict[int, int] = {}
+
+        def visit(_: Expr, i: int) -> bool:
+            if i in live:
+                occurrences[live[i]] += 1
+                return False
+            live[i] = len(occurrences)
+            occurrences.append(1)
+            return True
+
+        for stmt in body:
+            for expr in evaluated(stmt):
+                self.interner.intern(expr)
+                self.candidates(expr, visit)
+            self.kill(live, stmt)
+
+        return occurrences
+
+    def rewrite_expr(
+        self, root: Expr, live: dict[int, int], groups: list[int], names: dict, defs
+    ) -> Expr:
+        # Pre-order decisions, post-order rebuild. Groups are numbered in the
+        # same order as in `count`, because the same subtrees are descended.
+        stack: list[tuple[Expr, int | None] | tuple[Expr, int | None, int]] = [
+            (root, None)
+        ]
+        results: list[Expr] = []
+
+        while stack:
+            item = stack.pop()
+            if len(item) == 3:
+                node, group, n = item
+                operands = results[-n:] if n else []
+                if n:
+                    del results[-n:]
+                if any(new is not old for new, old in zip(operands, node.operands())):
+                    node = node.with_operands(operands)
+                if group is not None and groups[group] > 1:
+                    name = names[group] = f"__cse_{next(self.temps)}"
+                    defs.append(SetVariable(name, node, is_local=True))
+                    self.report["cse.temporaries"] += 1
+                    node = Variable(name, is_local=True)
+                results.append(node)
+                continue
+
+            node, _ = item
+            i = self.interner.nodes[id(node)]
+            group = None
+            if self.interner.sizes[i] >= MIN_SIZE:
+                if i in live:
+                    self.report["cse.occurrences_replaced"] += 1
+                    results.append(Variable(names[live[i]], is_local=True))
+                    continue
+                group = live[i] = self.next_group
+                self.next_group += 1
+
+            operands = node.operands()
+            stack.append((node, group, len(operands)))
+            stack.extend((o, None) for o in reversed(operands))
+
+        return results[0]
+
+    def run(self, body: list[Stmt]) -> list[Stmt]:
+        groups = self.count(body)
+        if all(n == 1 for n in groups):
+            return [self.nested(stmt) for stmt in body]
+
+        live: dict[int, int] = {}
+        names: dict[int, str] = {}
+        result: list[Stmt] = []
+
+        for stmt in body:
+            defs: list[Stmt] = []
+
+            def rewrite(e: Expr) -> Expr:
+                return self.rewrite_expr(e, live, groups, names, defs)
+
+            match stmt:
+                case SetVariable(name=name, expr=expr, is_local=is_local):
+                    new = SetVariable(name, rewrite(expr), is_local)
+                case SetActivationGroup(ag=ag, value=value):
+                    ag = rewrite(ag)
+                    new = SetActivationGroup(ag, rewrite(value))
+                case If(test=test, body=inner):
+                    new = If(rewrite(test), inner)
+                case CallCustomInstruction(name=name, args=args):
+                    new = CallCustomInstruction(name, [rewrite(a) for a in args])
+                case For(var=var, start=start, stop=stop, step=step, body=inner):
+                    start, stop = rewrite(start), rewrite(stop)
+                    new = For(var, start, stop, rewrite(step), inner)
+                case Repeat(count=count, body=inner):
+                    new = Repeat(rewrite(count), inner)
+                case _:
+                    new = stmt
+
+            result.extend(defs)
+            result.append(self.nested(new))
+            self.kill(live, stmt)
+
+        return result
+
+    def nested(self, stmt: Stmt) -> Stmt:
+        if isinstance(stmt, If | For | While | Repeat):
+            block = Block(self.interner, self.temps, self.report)
+            return replace(stmt, body=block.run(stmt.body))
+        return stmt
+
+
+def eliminate_common_subexpressions(thread: Thread, report: Counter[str]) -> Thread:
+    """
+    Evaluate repeated pure subexpressions once into local temporaries
+    (`__cse_0`, `__cse_1`, ...) and read the temporary at every later
+    occurrence, until a statement writes something the subexpression reads.
+
+    Temporaries created and occurrences replaced are added to
+    `report["cse.temporaries"]` and `report["cse.occurrences_replaced"]`.
+    """
+    block = Block(Interner(), count(), report)
+    return replace(thread, body=block.run(thread.body))
@@ -0,0 +1,291 @@
+import math
+from collections import Counter
+from dataclasses import replace
+from ..ir import (
+    Expr,
+    Stmt,
+    ActivationGroup,
+    BinaryOp,
+    BoolOp,
+    CallCustomInstruction,
+    Comparison,
+    Constant,
+    For,
+    If,
+    Not,
+    Repeat,
+    Thread,
+    SetActivationGroup,
+    SetVariable,
+    Vector,
+    VectorOp,
+    VectorOp2,
+    While,
+    transform,
+    walk,
+)
+
+arithmetic = {
+    "add": lambda a, b: a + b,
+    "sub": lambda a, b: a - b,
+    "mul": lambda a, b: a * b,
+    "div": lambda a, b: a / b if b else None,
+    # Vizzy follows C#, where the remainder takes the sign of the dividend
+    "mod": lambda a, b: math.fmod(a, b) if b else None,
+}
+
+comparisons = {
+    "eq": lambda a, b: a == b,
+    "lt": lambda a, b: a < b,
+    "gt": lambda a, b: a > b,
+    "lte": lambda a, b: a <= b,
+    "gte": lambda a, b: a >= b,
+}
+
+negated = {"lt": "gte", "gte": "lt", "gt": "lte", "lte": "gt"}
+
+# (op, type of the right operand) -> result, for a constant vector on the left
+vector_arithmetic = {
+    ("add", "vector"): lambda a, b: tuple(x + y for x, y in zip(a, b)),
+    ("sub", "vector"): lambda a, b: tuple(x - y for x, y in zip(a, b)),
+    ("mul", "number"): lambda a, b: tuple(x * b for x in a),
+    ("div", "number"): lambda a, b: tuple(x / b for x in a) if b else None,
+}
+
+vector_ops = {
+    "length": lambda v: math.hypot(*v),
+    "norm": lambda v: tuple(x / math.hypot(*v) for x in v) if any(v) else None,
+    "x": lambda v: v[0],
+    "y": lambda v: v[1],
+    "z": lambda v: v[2],
+}
+
+vector_ops_2 = {
+    "dot": lambda a, b: sum(x * y for x, y in zip(a, b)),
+    "cross": lambda a, b: (
+        a[1] * b[2] - a[2] * b[1],
+        a[2] * b[0] - a[0] * b[2],
+        a[0] * b[1] - a[1] * b[0],
+    ),
+    "dist": math.dist,
+    "scale": lambda a, b: tuple(x * y for x, y in zip(a, b)),
+    "min": lambda a, b: tuple(map(min, a, b)),
+    "max": lambda a, b: tuple(map(max, a, b)),
+}
+
+# (op, constant on the left, constant on the right) identities: x op c == x
+right_identities = {("add", 0), ("sub", 0), ("mul", 1), ("div", 1)}
+left_identities = {("add", 0), ("mul", 1)}
+
+
+def is_number(e: Expr) -> bool:
+    return type(e) is Constant and e.data_type == "number"
+
+
+def is_bool(e: Expr) -> bool:
+    return type(e) is Constant and e.data_type == "bool"
+
+
+def is_vector(e: Expr) -> bool:
+    return type(e) is Constant and e.data_type == "vector"
+
+
+def has_bool_value(e: Expr) -> bool:
+    """Whether `e` is known to evaluate to a bool"""
+    return is_bool(e) or type(e) in (BoolOp, Comparison, Not, ActivationGroup)
+
+
+def finite(value: float) -> bool:
+    try:
+        return math.isfinite(value)
+    except OverflowError:
+        # an int too large for a float, e.g. `10**400`
+        return False
+
+
+def compute(fn, *args):
+    """
+    `fn(*args)`, or None if an operand does not fit in a float or `fn` is
+    not defined for it, as `math.fmod` is not for an infinite dividend
+    """
+    try:
+        return fn(*args)
+    except (OverflowError, ValueError):
+        return None
+
+
+def from_value(value: float | tuple[float, float, float] | None) -> Constant | None:
+    """The constant for a folded number or vector, unless it is not finite"""
+    if value is None:
+        return None
+    if isinstance(value, tuple):
+        return Constant.from_vector(*value) if all(map(finite, value)) else None
+    return Constant.from_number(value) if finite(value) else None
+
+
+def fold_expr(e: Expr) -> Expr:
+    """Fold a single node whose operands have already been folded"""
+    match e:
+        case BoolOp(op=op, left=left, right=right):
+            absorbing = op == "or_"  # True absorbs `or`, False absorbs `and`
+            for const, other in ((left, right), (right, left)):
+                if is_bool(const) and const.value == absorbing:
+                    return const
+                # `False or x` is only `x` if `x` is a bool, not e.g. a number
+                if is_bool(const) and has_bool_value(other):
+                    return other
+
+        case Comparison(op=op, left=left, right=right):
+            if (
+                type(left) is Constant
+                and type(right) is Constant
+                and left.data_type == right.data_type
+                and (op == "eq" or left.data_type == "number")
+            ):
+                return Constant.from_bool(comparisons[op](left.value, right.value))
+
+        case BinaryOp(op=op, left=left, right=right) if is_vector(left) or is_vector(
+            right
+        ):
+            if op == "mul" and is_number(left):
+                left, right = right, left
+            # `right` may be any expression, which has no `data_type`
+            if is_vector(left) and type(right) is Constant:
+                fn = vector_arithmetic.get((op, right.data_type))
+                if fn is not None:
+                    folded = from_value(compute(fn, left.value, right.value))
+                    if folded is not None:
+                        return folded
+
+        case VectorOp(op=op, inner=inner) if is_vector(inner) and op in vector_ops:
+            folded = from_value(compute(vector_ops[op], inner.value))
+            if folded is not None:
+                return folded
+
+        case VectorOp2(op=op, left=left, right=right) if (
+            is_vector(left) and is_vector(right) and op in vector_ops_2
+        ):
+            folded = from_value(compute(vector_ops_2[op], left.value, right.value))
+            if folded is not None:
+                return folded
+
+        case BinaryOp(op=op, left=left, right=right):
+            if is_number(left) and is_number(right):
+                value = compute(arithmetic[op], left.value, right.value)
+                folded = from_value(value)
+                if folded is not None:
+                    return folded
+            elif is_number(right) and (op, right.value) in right_identities:
+                return left
+            elif is_number(left) and (op, left.value) in left_identities:
+                return right
+
+        case Not(inner=inner):
+            match inner:
+                case Constant(data_type="bool", value=value):
+                    return Constant.from_bool(not value)
+                case Not(inner=x):
+                    return x
+                case Comparison(op=op) if op in negated:
+                    return Comparison(negated[op], inner.left, inner.right)
+
+        case Vector(x=x, y=y, z=z) if is_number(x) and is_number(y) and is_number(z):
+            folded = from_value((x.value, y.value, z.value))
+            if folded is not None:
+                return folded
+
+    return e
+
+
+def size(e: Expr) -> int:
+    return sum(1 for _ in walk(e))
+
+
+def fold(e: Expr, report: Counter[str]) -> Expr:
+    folded = transform(e, fold_expr)
+    if folded is not e:
+        report["fold.nodes_removed"] += size(e) - size(folded)
+    return folded
+
+
+def fold_statements(body: list[Stmt], report: Counter[str]) -> list[Stmt]:
+    result: list[Stmt] = []
+
+    for stmt in body:
+        match stmt:
+            case SetVariable(expr=expr):
+                result.append(SetVariable(stmt.name, fold(expr, report), stmt.is_local))
+
+            case SetActivationGroup(ag=ag, value=value):
+                result.append(SetActivationGroup(fold(ag, report), fold(value, report)))
+
+            case If(test=test, body=inner):
+                test = fold(test, report)
+                inner = fold_statements(inner, report)
+                if is_bool(test):
+                    # the If block and its condition disappear
+                    report["fold.nodes_removed"] += 2
+                    if test.value:
+                        result.extend(inner)
+                    else:
+                        report["fold.nodes_removed"] += sum(map(stmt_size, inner))
+                else:
+                    result.append(If(test, inner))
+
+            case CallCustomInstruction(name=name, args=args):
+                result.append(
+                    CallCustomInstruction(name, [fold(a, report) for a in args])
+                )
+
+            case For(var=var, start=start, stop=stop, step=step, body=inner):
+                start, stop = fold(start, report), fold(stop, report)
+                inner = fold_statements(inner, report)
+                result.append(For(var, start, stop, step, inner))
+
+            case While(test=test, body=inner):
+                test = fold(test, report)
+                inner = fold_statements(inner, report)
+                if is_bool(test) and not test.value:
+                    report["fold.nodes_removed"] += stmt_size(While(test, inner))
+                else:
+                    result.append(While(test, inner))
+
+            case Repeat(count=count, body=inner):
+                result.append(
+                    Repeat(fold(count, report), fold_statements(inner, report))
+                )
+
+            case _:
+                result.append(stmt)
+
+    return result
+
+
+def stmt_size(stmt: Stmt) -> int:
+    match stmt:
+        case SetVariable(expr=expr):
+            return 1 + size(expr)
+        case SetActivationGroup(ag=ag, value=value):
+            return 1 + size(ag) + size(value)
+        case If(test=test, body=body):
+            return 1 + size(test) + sum(map(stmt_size, body))
+        case CallCustomInstruction(args=args):
+            return 1 + sum(map(size, args))
+        case For(start=start, stop=stop, step=step, body=body):
+            exprs = size(start) + size(stop) + size(step)
+            return 1 + exprs + sum(map(stmt_size, body))
+        case While(test=e, body=body) | Repeat(count=e, body=body):
+            return 1 + size(e) + sum(map(stmt_size, body))
+        case _:
+            return 1
+
+
+def fold_thread(thread: Thread, report: Counter[str]) -> Thread:
+    """
+    Fold constant arithmetic, comparisons, boolean operations, constant
+    vectors and the vector operators on them, and simplify `x + 0`, `x * 1`,
+    `not not x`, `not (a < b)` and `if` blocks with constant conditions.
+
+    The number of IR nodes removed is added to `report["fold.nodes_removed"]`.
+    """
+    return replace(thread, body=fold_statements(thread.body, report))
@@ -0,0 +1,237 @@
+from collections import Counter
+from dataclasses import replace
+from itertools import count
+from typing import Callable, Iterator
+from ..ir import (
+    Expr,
+    Stmt,
+    Block,
+    CallCustomInstruction,
+    Constant,
+    For,
+    If,
+    Repeat,
+    SetActivationGroup,
+    SetVariable,
+    Thread,
+    Variable,
+    While,
+    evaluated,
+    transform,
+    walk,
+)
+from .cse import EVERYTHING, Interner, variable_key, writes
+
+
+def map_expressions(stmt: Stmt, fn: Callable[[Expr], Expr]) -> Stmt:
+    """`stmt` with `fn` applied to every expression in it, nested ones included"""
+    match stmt:
+        case SetVariable(expr=expr):
+            return replace(stmt, expr=fn(expr))
+        case SetActivationGroup(ag=ag, value=value):
+            return SetActivationGroup(fn(ag), fn(value))
+        case CallCustomInstruction(name=name, args=args):
+            return CallCustomInstruction(name, [fn(a) for a in args])
+        case If(test=test, body=body):
+            return If(fn(test), [map_expressions(s, fn) for s in body])
+        case While(test=test, body=body):
+            return While(fn(test), [map_expressions(s, fn) for s in body])
+        case Repeat(count=n, body=body):
+            return Repeat(fn(n), [map_expressions(s, fn) for s in body])
+        case For(var=var, start=start, stop=stop, step=step, body=body):
+            body = [map_expressions(s, fn) for s in body]
+            return For(var, fn(start), fn(stop), fn(step), body)
+        case _:
+            return stmt
+
+
+def expressions(body: list[Stmt], tests: bool = True) -> Iterator[Expr]:
+    """Every expression evaluated anywhere in `body`, `while` tests optional"""
+    stack = list(body)
+    while stack:
+        stmt = stack.pop()
+        yield from evaluated(stmt)
+        if tests and isinstance(stmt, While):
+            yield stmt.test
+        if isinstance(stmt, Block):
+            stack.extend(stmt.body)
+
+
+def local_reads(body: list[Stmt]) -> Counter[str]:
+    return Counter(
+        node.name
+        for root in expressions(body)
+        for node in walk(root)
+        if isinstance(node, Variable) and node.is_local
+    )
+
+
+def int_constant(e: Expr) -> int | None:
+    if isinstance(e, Constant) and e.data_type == "number" and e.value == int(e.value):
+        return int(e.value)
+    return None
+
+
+def trip_count(trips: range) -> int:
+    # `len` raises OverflowError for ranges such as `range(10**20)`
+    return max(-((trips.start - trips.stop) // trips.step), 0)
+
+
+class Unroller:
+    def __init__(self, threshold: int, reads: Counter[str], report: Counter[str]):
+        self.threshold = threshold
+        # local reads in the whole thread, to tell if a loop variable is read
+        # after its loop
+        self.reads = reads
+        self.report = report
+
+    def trips(self, stmt: Stmt) -> range | None:
+        match stmt:
+            case For(start=start, stop=stop, step=step):
+                bounds = [int_constant(e) for e in (start, stop, step)]
+                if None not in bounds:
+                    return range(*bounds)
+            case Repeat(count=n) if int_constant(n) is not None:
+                return range(max(int_constant(n), 0))
+        return None
+
+    def statements(self, body: list[Stmt]) -> list[Stmt]:
+        result: list[Stmt] = []
+        for stmt in body:
+            # counted before inner loops are unrolled, which copies their reads
+            body_reads = local_reads(stmt.body) if isinstance(stmt, For) else None
+            if isinstance(stmt, Block):
+                stmt = replace(stmt, body=self.statements(stmt.body))
+
+            trips = self.trips(stmt)
+            if trips is None or trip_count(trips) > self.threshold:
+                result.append(stmt)
+                continue
+
+            self.report["loops.unrolled"] += 1
+            if isinstance(stmt, Repeat):
+                for _ in trips:
+                    result.extend(stmt.body)
+            else:
+                result.extend(self.unroll_for(stmt, trips, body_reads))
+        return result
+
+    def unroll_for(
+        self, loop: For, trips: range, body_reads: Counter[str]
+    ) -> list[Stmt]:
+        var = loop.var
+        result: list[Stmt] = []
+        if variable_key(var, True) in set().union(*map(writes, loop.body)):
+            # the body changes the variable, so it must really be assigned
+            for i in trips:
+                result.append(SetVariable(var, Constant.from_number(i), True))
+                result.extend(loop.body)
+            return result
+
+        for i in trips:
+            value = Constant.from_number(i)
+
+            def substitute(e: Expr) -> Expr:
+                return transform(
+                    e,
+                    lambda n: (
+                        value
+                        if isinstance(n, Variable) and n.is_local and n.name == var
+                        else n
+                    ),
+                )
+
+            result.extend(map_expressions(s, substitute) for s in loop.body)
+
+        if trips and self.reads[var] > body_reads[var]:
+            # read after the loop, which leaves it at its last value
+            result.append(SetVariable(var, Constant.from_number(trips[-1]), True))
+        return result
+
+
+def unroll_thread(thread: Thread, threshold: int, report: Counter[str]) -> Thread:
+    """
+    Unroll `for` loops over constant ranges, and `Repeat` loops with a
+    constant count, of at most `threshold` iterations. Reads of the loop
+    variable become constants where the body does not assign it.
+
+    Unrolled loops are counted in `report["loops.unrolled"]`.
+    """
+    unroller = Unroller(threshold, local_reads(thread.body), report)
+    return replace(thread, body=unroller.statements(thread.body))
+
+
+class Hoister:
+    def __init__(self, report: Counter[str]) -> None:
+        self.temps = count()
+        self.report = report
+
+    def statements(self, body: list[Stmt]) -> list[Stmt]:
+        result: list[Stmt] = []
+        for stmt in body:
+            if isinstance(stmt, Block):
+                # innermost loops first, so invariants move out level by level
+                stmt = replace(stmt, body=self.statements(stmt.body))
+            if isinstance(stmt, For | While | Repeat):
+                defs, stmt = self.hoist(stmt)
+                result.extend(defs)
+            result.append(stmt)
+        return result
+
+    def hoist(self, loop: For | While | Repeat) -> tuple[list[Stmt], Stmt]:
+        written = writes(loop)
+        if EVERYTHING in written:
+            return [], loop
+
+        interner = Interner()
+        names: dict[int, str] = {}
+        # id of each hoisted node -> its temporary
+        chosen: dict[int, str] = {}
+        defs: list[Stmt] = []
+
+        # `while` tests are left alone, as another thread may be what ends
+        # the loop
+        for root in expressions(loop.body, tests=False):
+            interner.intern(root)
+            stack = [root]
+            while stack:
+                node = stack.pop()
+                i = interner.nodes[id(node)]
+                worth = interner.sizes[i] > 1 or (
+                    isinstance(node, Variable) and not node.is_local
+                )
+                if not worth or interner.reads[i] & written:
+                    stack.extend(node.operands())
+                    continue
+
+                if i not in names:
+                    names[i] = f"__loop_{next(self.temps)}"
+                    defs.append(SetVariable(names[i], node, is_local=True))
+                    self.report["loops.hoisted"] += 1
+                chosen[id(node)] = names[i]
+
+        if not defs:
+            return [], loop
+
+        def rewrite(e: Expr) -> Expr:
+            return transform(
+                e,
+                lambda n: (
+                    Variable(chosen[id(n)], is_local=True) if id(n) in chosen else n
+                ),
+            )
+
+        body = [map_expressions(s, rewrite) for s in loop.body]
+        return defs, replace(loop, body=body)
+
+
+def hoist_invariants(thread: Thread, report: Counter[str]) -> Thread:
+    """
+    Evaluate expressions in loop bodies that read nothing the loop writes,
+    including global variable reads, once into local temporaries (`__loop_0`,
+    `__loop_1`, ...) before the loop.
+
+    This assumes no other thread writes what the loop reads while it runs.
+    Hoisted expressions are counted in `report["loops.hoisted"]`.
+    """
+    return replace(thread, body=Hoister(report).statements(thread.body))
@@ -0,0 +1,76 @@
+from collections import Counter
+from dataclasses import replace
+from itertools import count
+from ..cost import expression_cost
+from ..ir import Expr, Stmt, Block, BoolOp, If, Not, SetVariable, Thread, Variable
+from .balance import chain
+
+
+class ShortCircuit:
+    def __init__(self, threshold: float, report: Counter[str]) -> None:
+        self.threshold = threshold
+        self.report = report
+        self.temps = count()
+
+    def statements(self, body: list[Stmt]) -> list[Stmt]:
+        result: list[Stmt] = []
+        for stmt in body:
+            if isinstance(stmt, Block):
+                stmt = replace(stmt, body=self.statements(stmt.body))
+            if isinstance(stmt, If) and isinstance(stmt.test, BoolOp):
+                result.extend(self.lower_if(stmt))
+            else:
+                result.append(stmt)
+        return result
+
+    def groups(self, operands: list[Expr]) -> list[list[Expr]]:
+        """
+        Split `operands` before each expensive one, so that it is only
+        evaluated once everything before it has been
+        """
+        groups = [[operands[0]]]
+        for operand in operands[1:]:
+            if expression_cost(operand) > self.threshold:
+                groups.append([operand])
+            else:
+                groups[-1].append(operand)
+        return groups
+
+    def lower_if(self, stmt: If) -> list[Stmt]:
+        op = stmt.test.op
+        groups = self.groups(chain(stmt.test))
+        if len(groups) == 1:
+            return [stmt]
+
+        self.report["short_circuit.ifs"] += 1
+        if op == "and_":
+            # if a and b: ... -> if a: if b: ...
+            body = stmt.body
+            for group in reversed(groups):
+                body = [If(BoolOp.reduce(op, group), body)]
+            return body
+
+        # if a or b: ... -> t = a; if not t: t = b; if t: ...
+        name = f"__sc_{next(self.temps)}"
+        t = Variable(name, is_local=True)
+        result: list[Stmt] = [SetVariable(name, BoolOp.reduce(op, groups[0]), True)]
+        for group in groups[1:]:
+            result.append(
+                If(Not(t), [SetVariable(name, BoolOp.reduce(op, group), True)])
+            )
+        result.append(If(t, stmt.body))
+        return result
+
+
+def short_circuit_thread(
+    thread: Thread, threshold: float, report: Counter[str]
+) -> Thread:
+    """
+    Vizzy evaluates both sides of `and` and `or`. In `if` tests, evaluate
+    each operand costing more than `threshold` instructions only when the
+    ones before it have not decided the result: `and` becomes nested `If`
+    blocks, and `or` a local temporary (`__sc_0`, ...) set in steps.
+
+    Rewritten `if` statements are counted in `report["short_circuit.ifs"]`.
+    """
+    return replace(thread, body=ShortCircuit(threshold, report).statements(thread.body))
@@ -0,0 +1,248 @@
+from collections import Counter
+from dataclasses import replace
+from typing import Iterator
+from ..ir import (
+    Expr,
+    Stmt,
+    ActivationGroup,
+    BinaryOp,
+    BoolOp,
+    Block,
+    Comparison,
+    Constant,
+    For,
+    Not,
+    SetVariable,
+    Thread,
+    Variable,
+    Vector,
+    VectorOp,
+    VectorOp2,
+    transform,
+)
+from .loops import map_expressions
+
+# `VAR` annotations -> the type of the field
+ANNOTATIONS = {
+    "Vec": "vector",
+    "float": "number",
+    "int": "number",
+    "Rad": "number",
+    "Deg": "number",
+    "bool": "bool",
+    "str": "text",
+}
+
+# type of each vector operator's result
+VECTOR_OP_TYPES = {
+    "length": "number",
+    "norm": "vector",
+    "x": "number",
+    "y": "number",
+    "z": "number",
+    "angle": "number",
+    "dot": "number",
+    "dist": "number",
+    "clamp": "vector",
+    "cross": "vector",
+    "min": "vector",
+    "max": "vector",
+    "project": "vector",
+    "scale": "vector",
+}
+
+# a local assigned values of different types
+MIXED = "mixed"
+
+COMPONENTS = ("x", "y", "z")
+
+
+def join(old: str | None, new: str | None) -> str | None:
+    if new is None or old == new:
+        return old
+    return new if old is None else MIXED
+
+
+def assignments(body: list[Stmt]) -> Iterator[SetVariable]:
+    """Every variable assignment in `body`, `for` loop variables included"""
+    stack = list(body)
+    while stack:
+        stmt = stack.pop()
+        match stmt:
+            case SetVariable():
+                yield stmt
+            case For(var=var):
+                yield SetVariable(var, Constant.from_number(0), True)
+        if isinstance(stmt, Block):
+            stack.extend(stmt.body)
+
+
+def whole(parts: list[Expr]) -> Expr | None:
+    """A vector expression whose x, y and z are `parts`, if there is one"""
+    match parts:
+        case [
+            VectorOp(op="x", inner=a),
+            VectorOp(op="y", inner=b),
+            VectorOp(op="z", inner=c),
+        ] if (
+            a == b == c
+        ):
+            return a
+
+    if not all(type(p) is BinaryOp and p.op == parts[0].op for p in parts):
+        return None
+
+    op = parts[0].op
+    lefts = [p.left for p in parts]
+    rights = [p.right for p in parts]
+    if op in ("add", "sub", "mul"):
+        left, right = whole(lefts), whole(rights)
+        if left is not None and right is not None:
+            # a.x * b.x, ... -> scale(a, b)
+            if op == "mul":
+                return VectorOp2("scale", left, right)
+            return BinaryOp(op, left, right)
+    if op in ("mul", "div") and rights[0] == rights[1] == rights[2]:
+        # a.x * s, a.y * s, a.z * s -> a * s
+        left = whole(lefts)
+        if left is not None:
+            return BinaryOp(op, left, rights[0])
+    if op == "mul" and lefts[0] == lefts[1] == lefts[2]:
+        right = whole(rights)
+        if right is not None:
+            return BinaryOp(op, right, lefts[0])
+    return None
+
+
+class VectorTypes:
+    def __init__(self, fields: dict[str, str], report: Counter[str]) -> None:
+        self.fields = {name: ANNOTATIONS.get(t) for name, t in fields.items()}
+        self.report = report
+        self.locals: dict[str, str | None] = {}
+        # id(node) -> type, for the expression being rewritten
+        self.types: dict[int, str | None] = {}
+
+    def variable_type(self, v: Variable) -> str | None:
+        if v.is_list:
+            return None
+        t = self.locals.get(v.name) if v.is_local else self.fields.get(v.name)
+        return None if t == MIXED else t
+
+    def infer_locals(self, body: list[Stmt]) -> None:
+        """Type each local by every value assigned to it, until none changes"""
+        local = [s for s in assignments(body) if s.is_local]
+        changed = True
+        while changed:
+            changed = False
+            for stmt in local:
+                old = self.locals.get(stmt.name)
+                new = join(old, self.type_of(stmt.expr))
+                if new != old:
+                    self.locals[stmt.name] = new
+                    changed = True
+
+    def type_of(self, e: Expr) -> str | None:
+        self.types = {}
+        return self.types.get(id(transform(e, self.record)))
+
+    def record(self, node: Expr) -> Expr:
+        self.types[id(node)] = self.result_type(node)
+        return node
+
+    def result_type(self, node: Expr) -> str | None:
+        types = [self.types.get(id(o)) for o in node.operands()]
+        match node:
+            case Constant(data_type=t):
+                return t
+            case Variable():
+                return self.variable_type(node)
+            case ActivationGroup() | BoolOp() | Comparison() | Not():
+                return "bool"
+            case Vector():
+                if "vector" in types:
+                    raise SyntaxError("Vector components must be numbers, not vectors")
+                return "vector"
+            case VectorOp(op=op) | VectorOp2(op=op):
+                for t in types:
+                    if t not in (None, "vector"):
+                        raise SyntaxError(f"Vector operator {op} used on a {t}")
+                return VECTOR_OP_TYPES.get(op)
+            case BinaryOp(op=op):
+                return arithmetic_type(op, *types)
+        return None
+
+    def rewrite(self, node: Expr) -> Expr:
+        t = self.result_type(node)
+        new = node
+        match node:
+            case BinaryOp(op="mul", left=left, right=right) if type(node) is BinaryOp:
+                if self.types.get(id(left)) == self.types.get(id(right)) == "vector":
+                    new = VectorOp2("scale", left, right)
+            case Vector(x=x, y=y, z=z):
+                new = whole([x, y, z]) or node
+            case VectorOp(op=op, inner=Vector() as v) if op in COMPONENTS:
+                new = v.operands()[COMPONENTS.index(op)]
+                t = self.types.get(id(new))
+
+        if new is not node:
+            self.report["vectors.rewritten"] += 1
+        self.types[id(new)] = t
+        return new
+
+    def expression(self, e: Expr) -> Expr:
+        self.types = {}
+        return transform(e, self.rewrite)
+
+    def statements(self, body: list[Stmt]) -> list[Stmt]:
+        result = [map_expressions(stmt, self.expression) for stmt in body]
+        for stmt in assignments(result):
+            if not stmt.is_local:
+                self.check_field(stmt)
+        return result
+
+    def check_field(self, stmt: SetVariable) -> None:
+        declared = self.fields.get(stmt.name)
+        assigned = self.type_of(stmt.expr)
+        if (
+            declared
+            and assigned
+            and declared != assigned
+            and "vector" in (declared, assigned)
+        ):
+            raise SyntaxError(
+                f"VAR.{stmt.name} is a {declared}, but is assigned a {assigned}"
+            )
+
+
+def arithmetic_type(op: str, left: str | None, right: str | None) -> str | None:
+    if "vector" not in (left, right):
+        return "number" if left == right == "number" else None
+
+    scalar = right if left == "vector" else left
+    match op, left, right:
+        case "add" | "sub", _, _ if scalar in (None, "vector"):
+            return "vector"
+        case "mul", _, _ if scalar in (None, "vector", "number"):
+            return "vector"
+        case "div", "vector", None | "number":
+            return "vector"
+    raise SyntaxError(f"Unsupported operation '{op}' between {left} and {right}")
+
+
+def infer_vector_types(
+    thread: Thread, fields: dict[str, str], report: Counter[str]
+) -> Thread:
+    """
+    Infer which expressions are vectors, from the annotations of the `VAR`
+    `fields`, the values assigned to locals and `Vec(...)`, and use Vizzy's
+    vector operators where the source works on components: `a * b` of two
+    vectors becomes `scale`, `Vec(a.x + b.x, a.y + b.y, a.z + b.z)` becomes
+    `a + b`, and `Vec(x, y, z).x` becomes `x`.
+
+    Mixing vectors with numbers where Vizzy cannot, e.g. `v + 1`, or
+    assigning a vector to a number field, raises `SyntaxError`. Rewritten
+    nodes are counted in `report["vectors.rewritten"]`.
+    """
+    types = VectorTypes(fields, report)
+    types.infer_locals(thread.body)
+    return replace(thread, body=types.statements(thread.body))
@@ -0,0 +1,180 @@
+"""
+Long-lived compile server, so that editors pay for interpreter start-up and
+imports once.
+
+    python -m vizzyscript.server --socket /tmp/vizzyscript.sock
+    python -m vizzyscript.server --port 7465
+
+Requests and responses are JSON objects, one per line:
+
+    {"id": 1, "name": "craft", "source": "...", "options": {"cse": true}}
+    {"id": 1, "ok": true, "xml": "<?xml ...", "rebuilt": ["f"], "reused": 3}
+    {"id": 1, "ok": false, "error": {"type": "SyntaxError", "message": "...",
+                                     "line": 4, "column": 8}}
+
+Each worker process keeps an `IncrementalBuild` per program name and
+options, and requests for one name always go to the same worker, so
+resubmitting an edited program only lowers the handlers that changed.
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import os
+import threading
+import zlib
+from collections import OrderedDict
+from concurrent.futures import Executor, ProcessPoolExecutor
+from dataclasses import fields
+from pathlib import Path
+from .options import Options
+from .watch import IncrementalBuild
+
+__all__ = ["compile_request", "CompileServer"]
+
+# most programs whose builds each worker keeps warm
+MAX_BUILDS = 64
+
+# builds of this process, each with a lock as a worker may run requests on
+# several threads
+builds: OrderedDict[tuple[str, str], tuple[IncrementalBuild, threading.Lock]] = (
+    OrderedDict()
+)
+builds_lock = threading.Lock()
+
+
+def build_for(name: str, options: Options) -> tuple[IncrementalBuild, threading.Lock]:
+    key = (name, repr(options))
+    with builds_lock:
+        entry = builds.pop(key, None)
+        if entry is None:
+            entry = (IncrementalBuild(name, options), threading.Lock())
+        builds[key] = entry
+        while len(builds) > MAX_BUILDS:
+            builds.popitem(last=False)
+    return entry
+
+
+def error(e: Exception) -> dict:
+    err = {"type": type(e).__name__, "message": str(e)}
+    if isinstance(e, SyntaxError):
+        err["message"] = e.msg
+        err["line"] = e.lineno
+        err["column"] = e.offset
+    return err
+
+
+def compile_request(request: dict) -> dict:
+    """Compile one decoded request in this process, returning the response"""
+    response = {"id": request.get("id")}
+    try:
+        names = {f.name for f in fields(Options)}
+        given = request.get("options", {})
+        if not isinstance(given, dict):
+            raise ValueError("options must be a JSON object")
+        unknown = given.keys() - names
+        if unknown:
+            raise ValueError(f"Unknown options: {', '.join(sorted(unknown))}")
+
+        build, lock = build_for(request.get("name", "program"), Options(**given))
+        with lock:
+            report = build.update(request["source"])
+            out = io.BytesIO()
+            build.write(out, space=None if request.get("minify") else "  ")
+    except Exception as e:
+        response.update(ok=False, error=error(e))
+    else:
+        response.update(
+            ok=True,
+            xml=out.getvalue().decode(),
+            rebuilt=report.rebuilt,
+            reused=report.reused,
+            seconds=report.seconds,
+        )
+    return response
+
+
+class CompileServer:
+    """
+    Accepts connections and hands each request to one of `executors`, the
+    same one for every request naming the same program, so its build stays
+    warm in that worker. Requests on one connection may complete out of
+    order; match responses by `id`.
+    """
+
+    def __init__(self, executors: list[Executor]) -> None:
+        self.executors = executors
+
+    def executor(self, request: dict) -> Executor:
+        name = str(request.get("name", "program"))
+        return self.executors[zlib.crc32(name.encode()) % len(self.executors)]
+
+    async def respond(self, line: bytes, writer: asyncio.StreamWriter, lock):
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("Request must be a JSON object")
+        except ValueError as e:
+            response = {"id": None, "ok": False, "error": error(e)}
+        else:
+            loop = asyncio.get_running_loop()
+            response = await loop.run_in_executor(
+                self.executor(request), compile_request, request
+            )
+
+        async with lock:
+            writer.write(json.dumps(response).encode() + b"\n")
+            await writer.drain()
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        lock = asyncio.Lock()
+        pending = set()
+        try:
+            while line := await reader.readline():
+                if line.strip():
+                    task = asyncio.create_task(self.respond(line, writer, lock))
+                    pending.add(task)
+                    task.add_done_callback(pending.discard)
+            await asyncio.gather(*pending)
+        finally:
+            writer.close()
+
+    async def serve_unix(self, path: str | os.PathLike):
+        Path(path).unlink(missing_ok=True)
+        server = await asyncio.start_unix_server(self.handle, path, limit=64 * 2**20)
+        async with server:
+            await server.serve_forever()
+
+    async def serve_tcp(self, host: str, port: int):
+        server = await asyncio.start_server(self.handle, host, port, limit=64 * 2**20)
+        async with server:
+            await server.serve_forever()
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(prog="python -m vizzyscript.server")
+    where = parser.add_mutually_exclusive_group(required=True)
+    where.add_argument("--socket", type=Path, help="Unix domain socket path")
+    where.add_argument("--port", type=int, help="localhost TCP port")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args(argv)
+
+    # one process per pool, so each program name maps to one worker
+    pools = [ProcessPoolExecutor(1) for _ in range(args.jobs)]
+    server = CompileServer(pools)
+    if args.socket is not None:
+        run = server.serve_unix(args.socket)
+    else:
+        run = server.serve_tcp("127.0.0.1", args.port)
+    try:
+        asyncio.run(run)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for pool in pools:
+            pool.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Callable, Iterator
+from . import ir
+from . import xml_gen as gen
+
+__all__ = ["Stats"]
+
+# called with the phase name and its duration in seconds whenever one ends
+Hook = Callable[[str, float], None]
+
+
+def max_depth(body: list[ir.Stmt]) -> int:
+    """Depth of the deepest expression evaluated anywhere in `body`"""
+    deepest = 0
+    stack = list(body)
+    while stack:
+        stmt = stack.pop()
+        for expr in ir.evaluated(stmt):
+            deepest = max(deepest, ir.depth(expr))
+        match stmt:
+            case ir.While(test=test):
+                deepest = max(deepest, ir.depth(test))
+                stack.extend(stmt.body)
+            case ir.If() | ir.For() | ir.Repeat():
+                stack.extend(stmt.body)
+    return deepest
+
+
+class Stats:
+    """
+    Timings and counters for one or more compilations.
+
+    Phases are `parse`, `remove_global`, `collect_symbols`, `match`,
+    `optimise`, `lower`, `cache` and `emit`, each the total seconds spent in
+    it. `elements` counts the emitted XML elements by tag, `threads` the
+    handlers per trigger, and `max_depth` is the deepest expression in the
+    optimised IR.
+    """
+
+    def __init__(self, hooks: list[Hook] | None = None) -> None:
+        self.hooks = hooks if hooks is not None else []
+        self.phases: Counter[str] = Counter()
+        self.elements: Counter[str] = Counter()
+        self.threads: Counter[str] = Counter()
+        self.max_depth = 0
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    @contextmanager
+    def residual(self, name: str) -> Iterator[None]:
+        """
+        Like `phase`, but excluding time recorded by other phases meanwhile,
+        for work interleaved with generation such as streaming output
+        """
+        before = self.phases.total()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.add_time(name, elapsed - (self.phases.total() - before))
+
+    def add_time(self, name: str, seconds: float):
+        self.phases[name] += seconds
+        for hook in self.hooks:
+            hook(name, seconds)
+
+    def count_elements(self, element: gen.Element):
+        self.elements.update(e.tag for e in element.iter())
+
+    def count_depth(self, thread: ir.ReceiveMessage):
+        self.max_depth = max(self.max_depth, max_depth(thread.body))
+
+    def merge(self, other: "Stats | dict"):
+        if isinstance(other, Stats):
+            other = other.as_dict()
+        self.phases.update(other["phases"])
+        self.elements.update(other["elements"])
+        self.threads.update(other["threads"])
+        self.max_depth = max(self.max_depth, other["max_depth"])
+
+    def as_dict(self) -> dict:
+        """JSON-serialisable summary"""
+        return {
+            "phases": dict(self.phases),
+            "elements": dict(self.elements),
+            "threads": dict(self.threads),
+            "max_depth": self.max_depth,
+        }
@@ -0,0 +1,160 @@
+import os
+import sys
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import BinaryIO
+from . import xml_gen as gen
+from . import Function, Parser
+from .options import Options
+
+__all__ = ["IncrementalBuild", "Rebuild", "watch"]
+
+
+@dataclass
+class Rebuild:
+    rebuilt: list[str] = field(default_factory=list)
+    reused: int = 0
+    removed: int = 0
+    seconds: float = 0
+
+    def __str__(self) -> str:
+        total = len(self.rebuilt) + self.reused
+        changed = f" ({', '.join(self.rebuilt)})" if self.rebuilt else ""
+        return (
+            f"rebuilt {len(self.rebuilt)}/{total} threads{changed}, "
+            f"removed {self.removed}, in {self.seconds * 1e3:.1f} ms"
+        )
+
+
+class IncrementalBuild:
+    """
+    Keeps the symbol table and every handler's lowered thread between
+    builds of one program. `update` compares the new module with the
+    previous one per function, `VAR` class and channel, and only lowers
+    the threads that changed.
+    """
+
+    def __init__(self, name: str, options: Options | None = None) -> None:
+        self.name = name
+        self.options = options if options is not None else Options()
+        self.parser = None
+        # (trigger, handlers) -> (source of the handlers, channel message, thread);
+        # custom instructions are keyed by an empty trigger
+        self.threads: dict[tuple[str, str], tuple[str, str, gen.Element]] = {}
+        self.context: tuple[list[str], list[str], dict[str, str]] | None = None
+
+    def update(self, src: str) -> Rebuild:
+        start = time.perf_counter()
+        parser = Parser(self.name, src, self.options)
+        program = parser.program
+        report = Rebuild()
+
+        # everything depends on the VAR fields, so a change there is global
+        context = (program.variables, program.lists, program.types)
+        if context != self.context:
+            self.threads.clear()
+        self.context = context
+
+        threads = {}
+
+        def reuse(key: tuple[str, str], sources: list[Function], msg: str, compile):
+            # sources include the helpers the thread runs
+            dump = "\n".join(parser.source_key(sources))
+            previous = self.threads.get(key)
+            if previous is not None and previous[:2] == (dump, msg):
+                threads[key] = previous
+                report.reused += 1
+            else:
+                threads[key] = (dump, msg, compile())
+                report.rebuilt.append(key[1])
+            return threads[key][2]
+
+        # custom instructions first, so the handlers calling them are costed
+        # with the reused threads
+        for f in parser.custom:
+            parser.instructions[f.name] = reuse(
+                ("", f.name),
+                [f],
+                "",
+                lambda: parser.compile_custom_instruction(f),
+            )
+        instructions = threads
+        threads = {}
+
+        for trigger, target in program.threads.items():
+            if target.msg is None:
+                # not emitted yet, but checked as `Parser` does
+                list(parser.threads(trigger))
+                continue
+            for f, *merged in parser.receiver_groups(target):
+                name = "+".join(g.name for g in (f, *merged))
+                element = reuse(
+                    (trigger, name),
+                    [f, *merged],
+                    target.msg,
+                    lambda: parser.compile_thread(f, target.msg, *merged),
+                )
+                parser.costs.add(trigger, name, element)
+        threads.update(instructions)
+
+        report.removed = len(self.threads.keys() - threads.keys())
+        self.threads = threads
+        self.parser = parser
+        report.seconds = time.perf_counter() - start
+        return report
+
+    def write(self, out: BinaryIO, *, space: str | None = "  "):
+        threads = (element for _, _, element in self.threads.values())
+        gen.write_program(self.parser.root, threads, out, space=space)
+
+
+def write_atomic(build: IncrementalBuild, output: Path, space: str | None):
+    output.parent.mkdir(parents=True, exist_ok=True)
+    tmp = output.with_suffix(f".{os.getpid()}.tmp")
+    try:
+        with open(tmp, "wb") as out:
+            build.write(out, space=space)
+        os.replace(tmp, output)
+    finally:
+        tmp.unlink(missing_ok=True)
+
+
+def watch(
+    files: list[tuple[Path, Path]],
+    options: Options | None = None,
+    *,
+    space: str | None = "  ",
+    interval: float = 0.2,
+):
+    """
+    Poll each (source, output) pair and rewrite the output whenever its
+    source changes, printing the rebuild latency. Runs until interrupted.
+    """
+    builds = {source: IncrementalBuild(source.stem, options) for source, _ in files}
+    mtimes: dict[Path, int] = {}
+
+    try:
+        while True:
+            for source, output in files:
+                try:
+                    mtime = source.stat().st_mtime_ns
+                except FileNotFoundError:
+                    continue
+                if mtimes.get(source) == mtime:
+                    continue
+                mtimes[source] = mtime
+
+                try:
+                    report = builds[source].update(source.read_text())
+                    write_atomic(builds[source], output, space)
+                except Exception as e:
+                    # reported rather than raised, so a bad save cannot stop
+                    # the watcher
+                    print(f"{source}: {type(e).__name__}: {e}", file=sys.stderr)
+                    continue
+                print(f"{source}: {report}", flush=True)
+
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
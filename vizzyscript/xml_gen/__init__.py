@@ -3,3 +3,4 @@ from .common import *
 from .expr import *
 from .top_level import *
 from .statements import *
+from .writer import *
@@ -1,4 +1,5 @@
 import xml.etree.ElementTree as ET
+from typing import Callable, Sequence
 
 
 class Element(ET.Element):
@@ -17,3 +18,27 @@ class WithStyle(Element):
         if attrib is not None:
             base |= attrib
         super().__init__(base)
+
+
+def reduce_chain[T](
+    fn: Callable[[T, T], T], operands: Sequence[T], *, balanced: bool = False
+) -> T:
+    """
+    Combine `operands` in order with the associative constructor `fn`. By
+    default the tree is left-deep, as Python groups `a + b + c`. With
+    `balanced` its depth is only log2(len(operands)), which keeps long
+    chains shallow.
+    """
+    if not balanced:
+        result = operands[0]
+        for operand in operands[1:]:
+            result = fn(result, operand)
+        return result
+
+    level = list(operands)
+    while len(level) > 1:
+        paired = [fn(level[i], level[i + 1]) for i in range(0, len(level) - 1, 2)]
+        if len(level) % 2:
+            paired.append(level[-1])
+        level = paired
+    return level[0]
@@ -1,5 +1,5 @@
-from typing import Any, Self
-from .common import WithStyle, Element
+from typing import Any, Self, Sequence
+from .common import WithStyle, Element, reduce_chain
 
 
 class Constant(Element):
@@ -18,6 +18,10 @@ class Constant(Element):
     def from_text(cls, s: str) -> Self:
         return cls(s, "text")
 
+    @classmethod
+    def from_vector(cls, x: int | float, y: int | float, z: int | float) -> Self:
+        return cls(f"({x}, {y}, {z})", "vector")
+
     @classmethod
     def from_bool(cls, b: bool) -> Self:
         bool_const = cls(str(b).lower(), "bool")
@@ -61,6 +65,16 @@ class BinaryOp(WithStyle):
     def mod(cls, left: Element, right: Element) -> Self:
         return cls("op-mod", "%", left, right)
 
+    @classmethod
+    def reduce(
+        cls, op: str, operands: Sequence[Element], *, balanced: bool = False
+    ) -> Element:
+        """
+        Combine `operands` in order with the associative constructor `op`
+        ("add", "mul", "and_" or "or_"), see `reduce_chain`
+        """
+        return reduce_chain(getattr(cls, op), operands, balanced=balanced)
+
 
 class BoolOp(BinaryOp):
     # inheritance automatically sets self.__class__.__name__ to BoolOp
@@ -115,8 +129,15 @@ class Variable(Element):
     def __init__(self, name: str, *, is_list: bool = False, is_local: bool = False):
         super().__init__(
             {
-                "list": str(is_list).lower(),
-                "local": str(is_local).lower(),
+                "list": "true" if is_list else "false",
+                "local": "true" if is_local else "false",
                 "variableName": name,
             }
         )
+
+
+class VectorOp(WithStyle):
+    def __init__(self, op: str, *operands: Element) -> None:
+        super().__init__(f"vec-op-{len(operands)}", {"op": op})
+        for operand in operands:
+            self.append(operand)
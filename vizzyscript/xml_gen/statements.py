@@ -14,6 +14,48 @@ class If(WithStyle):
         self.append(bd)
 
 
+class For(WithStyle):
+    """Counts `var` from `start` to `end` inclusive"""
+
+    def __init__(
+        self, var: str, start: Element, end: Element, step: Element, body: list[Element]
+    ):
+        super().__init__("for", {"var": var})
+        self.append(start)
+        self.append(end)
+        self.append(step)
+
+        bd = Instructions()
+        for stmt in body:
+            bd.append(stmt)
+
+        self.append(bd)
+
+
+class While(WithStyle):
+    def __init__(self, test: Element, body: list[Element]):
+        super().__init__("while")
+        self.append(test)
+
+        bd = Instructions()
+        for stmt in body:
+            bd.append(stmt)
+
+        self.append(bd)
+
+
+class Repeat(WithStyle):
+    def __init__(self, count: Element, body: list[Element]):
+        super().__init__("repeat")
+        self.append(count)
+
+        bd = Instructions()
+        for stmt in body:
+            bd.append(stmt)
+
+        self.append(bd)
+
+
 class SetActivationGroup(WithStyle):
     def __init__(self, ag: Element, value: Element) -> None:
         super().__init__("set-ag")
@@ -26,3 +68,10 @@ class SetVariable(WithStyle):
         super().__init__("set-variable")
         self.append(Variable(name, is_local=is_local))
         self.append(expr)
+
+
+class CallCustomInstruction(WithStyle):
+    def __init__(self, name: str, args: list[Element]) -> None:
+        super().__init__("call-custom-instruction", {"call": name})
+        for arg in args:
+            self.append(arg)
@@ -17,3 +17,25 @@ def ReceiveMessage(msg: str, body: list[Element]):
         root.append(stmt)
 
     return root
+
+
+class CustomInstruction(WithStyle):
+    def __init__(self, name: str, params: list[str]) -> None:
+        super().__init__(
+            "custom-instruction",
+            {
+                "callFormat": " ".join([name, *(f"({i})" for i in range(len(params)))]),
+                "format": " ".join([name, *(f"|{p}|" for p in params)]),
+                "name": name,
+            },
+        )
+
+
+def DefineCustomInstruction(name: str, params: list[str], body: list[Element]):
+    root = Instructions()
+    root.append(CustomInstruction(name, params))
+
+    for stmt in body:
+        root.append(stmt)
+
+    return root
@@ -0,0 +1,107 @@
+from itertools import chain
+from typing import BinaryIO, Iterable, Iterator
+import xml.etree.ElementTree as ET
+
+__all__ = ["serialize", "write_program"]
+
+
+def escape_text(text: str) -> str:
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+
+def escape_attrib(text: str) -> str:
+    return (
+        escape_text(text)
+        .replace('"', "&quot;")
+        .replace("\r", "&#13;")
+        .replace("\n", "&#10;")
+        .replace("\t", "&#09;")
+    )
+
+
+def start_tag(elem: ET.Element, close: str = ">") -> str:
+    attrs = "".join(f' {k}="{escape_attrib(v)}"' for k, v in elem.attrib.items())
+    return f"<{elem.tag}{attrs}{close}"
+
+
+def is_blank(text: str | None) -> bool:
+    return not text or not text.strip()
+
+
+def serialize(
+    elem: ET.Element, space: str | None = "  ", level: int = 0
+) -> Iterator[str]:
+    """
+    Yield the XML text of `elem` and its subtree without modifying it.
+
+    With `space` set, the output is indented exactly as `ET.indent(root,
+    space)` followed by `ET.tostring` would indent `elem` at depth `level`.
+    With `space=None` no whitespace is added. Unlike `ET.indent` the tree is
+    never mutated, so subtrees shared between several parents are written
+    correctly, and the walk uses an explicit stack, so depth is unbounded.
+    """
+    pretty = space is not None
+    # (element, depth, whitespace after it) or a closing tag
+    stack: list[tuple[ET.Element, int, str] | str] = [(elem, level, "")]
+
+    while stack:
+        item = stack.pop()
+        if type(item) is str:
+            yield item
+            continue
+
+        node, depth, tail = item
+        if not is_blank(node.tail):
+            tail = escape_text(node.tail)
+
+        if not len(node):
+            if node.text:
+                yield f"{start_tag(node)}{escape_text(node.text)}</{node.tag}>{tail}"
+            else:
+                yield f"{start_tag(node, ' />')}{tail}"
+            continue
+
+        yield start_tag(node)
+        if not is_blank(node.text):
+            yield escape_text(node.text)
+        elif pretty:
+            yield "\n" + space * (depth + 1)
+
+        stack.append(f"</{node.tag}>{tail}")
+        inner = "\n" + space * (depth + 1) if pretty else ""
+        outer = "\n" + space * depth if pretty else ""
+        children = list(node)
+        stack.append((children[-1], depth + 1, outer))
+        for child in reversed(children[:-1]):
+            stack.append((child, depth + 1, inner))
+
+
+def write_program(
+    root: ET.Element,
+    threads: Iterable[ET.Element],
+    out: BinaryIO,
+    *,
+    space: str | None = "  ",
+    xml_declaration: bool = True,
+) -> None:
+    """
+    Stream a Vizzy program to the binary file-like `out` (a file, or a
+    socket via `socket.makefile("wb")`).
+
+    `root` is the `Program` element holding the `Variables` and `Expressions`
+    sections. Each element of `threads` is serialized and written as soon as
+    it is produced, so only one thread is held in memory at a time.
+    """
+    nl = "\n" if space is not None else ""
+    indent = nl + (space or "")
+
+    if xml_declaration:
+        out.write(b"<?xml version='1.0' encoding='utf-8'?>\n")
+    out.write(start_tag(root).encode())
+
+    for section in chain(root, threads):
+        chunks = [indent]
+        chunks.extend(serialize(section, space, 1))
+        out.write("".join(chunks).encode())
+
+    out.write(f"{nl}</{root.tag}>".encode())